@@ -0,0 +1,150 @@
+import os
+import hmac
+import json
+import time
+import base64
+import heapq
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# 签名密钥，多进程/多节点部署时必须配置为相同的值；未配置时每次启动随机生成（只适合单进程开发）
+SECRET_KEY = os.getenv("SECRET_KEY", "").encode("utf-8")
+if not SECRET_KEY:
+    logger.warning("未设置 SECRET_KEY，使用随机密钥：重启或多进程部署时已发出的题目将无法校验")
+    SECRET_KEY = os.urandom(32)
+
+# 题目令牌的有效期（秒）
+TOKEN_TTL = int(os.getenv("ANSWER_TOKEN_TTL", "7200"))
+
+# 签名和答案摘要截断后的字节数，以及每个令牌的随机数的字节数
+SIGNATURE_BYTES = 16
+ANSWER_DIGEST_BYTES = 12
+NONCE_BYTES = 12
+
+EXERCISES = ("blanks", "typing", "choice")
+
+Challenge = namedtuple("Challenge", ["nonce", "word_id", "exercise", "positions", "expires", "answer_digest", "sealed"])
+
+# 本进程中已经作答过的令牌：随机数集合，以及按过期时间排列的 (过期时间, 随机数) 堆，过期后从集合中清理
+_redeemed = set()
+_redeemed_expiry = []
+_redeemed_lock = threading.Lock()
+
+
+class InvalidToken(ValueError):
+    """令牌格式错误、签名不符或已过期"""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _mac(purpose, message):
+    return hmac.new(SECRET_KEY, purpose + b":" + message, hashlib.sha256).digest()
+
+
+def normalize_answer(exercise, answer):
+    """答案的规范形式：不区分大小写；填空题为各空字母按顺序用分隔符连接"""
+    if exercise == "blanks":
+        return "\x1f".join(str(part).strip().lower() for part in answer)
+    return str(answer).strip().lower()
+
+
+def answer_digest(exercise, nonce, word_id, expires, answer):
+    """正确答案的带密钥摘要，令牌中只保存摘要，不保存单词本身
+
+    摘要同时绑定令牌的随机数、单词id和过期时间：同一个答案在每个令牌中的摘要都不同，
+    无法通过比较不同题目的摘要推断答案，也不能把摘要挪到别的令牌中使用。
+    """
+    message = json.dumps([nonce, word_id, expires, normalize_answer(exercise, answer)], separators=(",", ":"))
+    return _b64encode(_mac(exercise.encode("ascii"), message.encode("utf-8"))[:ANSWER_DIGEST_BYTES])
+
+
+def _keystream(nonce, length):
+    """由密钥和令牌随机数生成的密钥流（HMAC-SHA256 计数器模式），用于加密令牌中的正确答案"""
+    stream = bytearray()
+    counter = 0
+    while len(stream) < length:
+        stream += _mac(b"seal", f"{nonce}:{counter}".encode("ascii"))
+        counter += 1
+    return bytes(stream[:length])
+
+
+def _seal(nonce, text):
+    data = text.encode("utf-8")
+    return _b64encode(bytes(a ^ b for a, b in zip(data, _keystream(nonce, len(data)))))
+
+
+def reveal(challenge):
+    """令牌中加密保存的正确答案（签发时传入 sealed），没有时返回 None"""
+    if not challenge.sealed:
+        return None
+    data = _b64decode(challenge.sealed)
+    return bytes(a ^ b for a, b in zip(data, _keystream(challenge.nonce, len(data)))).decode("utf-8")
+
+
+def issue(exercise, word_id, answer, positions=None, ttl=None, sealed=None):
+    """生成题目令牌：[随机数, 单词id, 练习类型, 挖空位置, 过期时间, 答案摘要, 加密的单词]，后附 HMAC 签名
+
+    sealed 是作答后需要告诉用户的单词，用只有服务端知道的密钥流加密后放入令牌，由 reveal 取回；
+    适用于没有学习记录id、无法从数据库取回单词的题目。
+    """
+    if exercise not in EXERCISES:
+        raise ValueError(f"未知的练习类型: {exercise}")
+    nonce = _b64encode(os.urandom(NONCE_BYTES))
+    expires = int(time.time()) + (TOKEN_TTL if ttl is None else ttl)
+    digest = answer_digest(exercise, nonce, word_id, expires, answer)
+    payload = json.dumps([nonce, word_id, exercise, list(positions or []), expires, digest,
+                          _seal(nonce, sealed) if sealed else ""], separators=(",", ":"))
+    encoded = _b64encode(payload.encode("utf-8"))
+    signature = _b64encode(_mac(b"token", encoded.encode("ascii"))[:SIGNATURE_BYTES])
+    return f"{encoded}.{signature}"
+
+
+def verify(token, exercise):
+    """校验令牌的签名、练习类型和有效期，返回 Challenge；不通过时抛出 InvalidToken"""
+    try:
+        encoded, signature = token.split(".")
+        expected = _b64encode(_mac(b"token", encoded.encode("ascii"))[:SIGNATURE_BYTES])
+        if not hmac.compare_digest(signature, expected):
+            raise InvalidToken("题目签名无效")
+        nonce, word_id, token_exercise, positions, expires, digest, sealed = json.loads(_b64decode(encoded))
+    except InvalidToken:
+        raise
+    except (AttributeError, TypeError, ValueError, UnicodeError) as e:
+        raise InvalidToken("无效的题目") from e
+    if token_exercise != exercise:
+        raise InvalidToken("题目类型不符")
+    if expires < time.time():
+        raise InvalidToken("题目已过期，请换一题")
+    return Challenge(nonce, word_id, token_exercise, positions, expires, digest, sealed)
+
+
+def redeem(challenge):
+    """把令牌标记为已作答，同一个令牌再次作答时抛出 InvalidToken
+
+    只记录到令牌过期为止（过期的令牌本来就无法通过校验），内存占用以有效期内发出的题目数为上限。
+    记录只在本进程内，多进程部署时由复习计划拒绝提前复习兜底（见 WordModel.record_review）。
+    """
+    now = time.time()
+    with _redeemed_lock:
+        while _redeemed_expiry and _redeemed_expiry[0][0] < now:
+            _redeemed.discard(heapq.heappop(_redeemed_expiry)[1])
+        if challenge.nonce in _redeemed:
+            raise InvalidToken("题目已经作答过，请换一题")
+        _redeemed.add(challenge.nonce)
+        heapq.heappush(_redeemed_expiry, (challenge.expires, challenge.nonce))
+
+
+def check(challenge, answer):
+    """作答是否与令牌中的答案摘要一致"""
+    digest = answer_digest(challenge.exercise, challenge.nonce, challenge.word_id, challenge.expires, answer)
+    return hmac.compare_digest(digest, challenge.answer_digest)
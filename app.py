@@ -1,17 +1,125 @@
-from flask import Flask, render_template, request, jsonify, session, send_file
+from flask import Flask, render_template, request, jsonify, session, send_file, stream_with_context, abort, make_response
 from flask_cors import CORS
 import random
 import os
 import json
+import secrets
+import logging
 import init_db
-from models import WordModel
+import vocab_cache
+import vocab_snapshot
+import meaning_index
+import word_index
+import spelling_index
+import attribute_index
+import distractor_index
+import translate_parser
+import progress_writer
+from models import WordModel, READ_ONLY_RESULT, INVALID_STAGE_RESULT, progress_store_ready, valid_stage
 from sqlalchemy import text
-import tempfile
-import requests
+import tts_cache
+import tts_warm
+import scheduler
+import metrics
+import storage
+import answer_token
 
 app = Flask(__name__)
 CORS(app)  # 启用跨域支持
-app.secret_key = os.urandom(24)  # 设置会话密钥
+app.secret_key = answer_token.SECRET_KEY  # 会话和题目令牌共用 SECRET_KEY，多进程部署时必须设置
+metrics.init_app(app)  # 记录每个路由的延迟和数据库查询
+
+logger = logging.getLogger(__name__)
+
+# 语音文件内容固定，允许浏览器长期缓存
+TTS_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# 批量取词接口一次最多返回的数量，以及 exclude 参数中最多接受的学习记录id数
+BATCH_MAX_COUNT = 20
+BATCH_MAX_EXCLUDE = 100
+
+# 盲打答错时最多返回几个与答案相近的真实单词
+SPELLING_SUGGESTIONS = 5
+
+# 多选题的选项数（1个正确答案和若干干扰项）及出题方向：word 看单词选释义，meaning 看释义选单词
+CHOICE_OPTIONS = 4
+CHOICE_DIRECTIONS = ('word', 'meaning')
+
+# 取词后在后台为同一牌堆接下来的若干个单词预生成发音，0 表示关闭
+TTS_PREFETCH_WORDS = int(os.getenv('TTS_PREFETCH_WORDS', '0'))
+
+# 由前置的反向代理完成登录后传入用户标识的请求头，为空时不读取（应用直接对外时不要设置，否则任何人都能冒充）
+USER_ID_HEADER = os.getenv('USER_ID_HEADER', '').strip()
+# 没有用户请求头时是否为每个浏览器会话分配一个匿名用户；关闭时所有请求共用默认用户（单用户部署）
+ANONYMOUS_USERS = os.getenv('ANONYMOUS_USERS', 'false').strip().lower() in ('1', 'true', 'yes', 'on')
+
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    """请求结束时释放本线程的数据库会话，把连接归还连接池"""
+    if init_db.session is not None:
+        init_db.session.remove()
+
+def blanks_token(word, word_with_blanks, blanks):
+    """填空题的令牌：学习记录id、挖空位置和正确字母的摘要"""
+    positions = [i for i, char in enumerate(word_with_blanks) if char == '_']
+    return answer_token.issue("blanks", word.get("id"), blanks, positions)
+
+def typing_token(word):
+    """盲打题的令牌：学习记录id、单词的摘要和加密的单词（作答后告诉用户正确答案，词汇中的单词没有学习记录id）"""
+    return answer_token.issue("typing", word.get("id"), word["word"], sealed=word["word"])
+
+def current_user_id():
+    """当前请求的用户：依次取用户请求头、会话中的匿名用户，否则为默认用户"""
+    if USER_ID_HEADER:
+        user_id = request.headers.get(USER_ID_HEADER, '').strip()
+        if user_id:
+            if len(user_id) > init_db.USER_ID_MAX_LENGTH:
+                abort(make_response(jsonify({"error": "无效的用户标识"}), 400))
+            return user_id
+    if ANONYMOUS_USERS:
+        user_id = session.get('user_id')
+        if not user_id:
+            user_id = session['user_id'] = 'anon-' + secrets.token_hex(8)
+        return user_id
+    return init_db.DEFAULT_USER_ID
+
+def typing_feedback(user_answer, correct_word):
+    """盲打答错时的拼写反馈：与正确单词的编辑距离、是否只是拼错了个别字母，以及与答案相近的真实单词"""
+    neighbours = spelling_index.nearest(user_answer, limit=None)
+    distance = spelling_index.edit_distance(user_answer, correct_word.lower())
+    target_length = len(correct_word)
+    return {
+        "distance": distance,
+        "almost_correct": distance is not None and 0 < distance <= spelling_index.typo_tolerance(target_length),
+        "suggestions": [candidate for d, candidate in neighbours if candidate != user_answer][:SPELLING_SUGGESTIONS]
+    }
+
+def word_filters():
+    """取词接口的筛选参数：pos（词性，逗号分隔，满足其一即可）、min_len 和 max_len（单词长度，包含两端）
+
+    参数无效时直接返回 400。
+    """
+    pos = []
+    for tag in request.args.get('pos', '').split(','):
+        tag = tag.strip().lower().rstrip('.')
+        if not tag:
+            continue
+        tag = translate_parser.POS_ALIASES.get(tag, tag)
+        if tag not in translate_parser.POS_TAGS:
+            abort(make_response(jsonify({"error": f"未知的词性: {tag}"}), 400))
+        pos.append(tag)
+    min_length = request.args.get('min_len', None, type=int)
+    max_length = request.args.get('max_len', None, type=int)
+    if min_length is not None and max_length is not None and min_length > max_length:
+        abort(make_response(jsonify({"error": "min_len 不能大于 max_len"}), 400))
+    return {"pos": pos, "min_length": min_length, "max_length": max_length}
+
+def session_decks():
+    """当前会话中每个词汇表的洗牌状态"""
+    decks = session.setdefault('decks', {})
+    # 牌堆状态会被原地修改，需要显式标记会话已变更
+    session.modified = True
+    return decks
 
 @app.route('/')
 def index():
@@ -33,6 +141,11 @@ def chinese_typing():
     """中文盲打页面"""
     return render_template('typing.html')
 
+@app.route('/choice')
+def multiple_choice():
+    """多选题页面"""
+    return render_template('choice.html')
+
 @app.route('/review')
 def review_words():
     """复习单词页面"""
@@ -46,24 +159,51 @@ def get_levels():
 
 @app.route('/api/random-word', methods=['GET'])
 def get_random_word():
-    """获取随机单词API"""
+    """获取随机单词API，可以按级别、词性和长度筛选（见 word_filters）"""
     level = request.args.get('level', None)
-    word = WordModel.get_random_word(level)
+    decks = session_decks()
+    word = WordModel.get_random_word(level, decks, **word_filters())
     if not word:
         return jsonify({"error": "没有找到单词"}), 404
+
+    if TTS_PREFETCH_WORDS > 0:
+        try:
+            tts_warm.warm_upcoming(decks, word['source_table'], TTS_PREFETCH_WORDS)
+        except Exception as e:
+            logger.warning("预热发音时出错: %s", e)
     
     # 自动添加到学习记录，阶段为1（认识单词）
-    WordModel.add_learned_word(word, stage=1)
+    WordModel.add_learned_word(word, stage=1, user_id=current_user_id())
     
     return jsonify(word)
 
+@app.route('/api/search-meaning', methods=['GET'])
+def search_meaning():
+    """按中文释义查找单词API"""
+    meaning = request.args.get('q', '').strip()
+    if not meaning:
+        return jsonify({"error": "未提供释义"}), 400
+    level = request.args.get('level', None)
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    
+    words = WordModel.search_by_meaning(meaning, level, limit)
+    return jsonify({"words": words})
+
+@app.route('/api/word-suggest', methods=['GET'])
+def word_suggest():
+    """单词前缀补全API"""
+    prefix = request.args.get('prefix', '').strip()
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({"words": WordModel.suggest_words(prefix, limit)})
+
 @app.route('/api/word-with-blanks', methods=['GET'])
 def get_word_with_blanks():
     """获取带空白的单词API"""
     num_blanks = request.args.get('blanks', None, type=int)
+    user_id = current_user_id()
     
     # 获取第二阶段（填空）的单词，即从第一阶段（认识）中获取
-    word = WordModel.get_words_by_stage(stage=2)
+    word = WordModel.get_words_by_stage(stage=2, user_id=user_id)
     
     if not word:
         # 如果没有找到第一阶段的单词，返回提示信息
@@ -80,21 +220,23 @@ def get_word_with_blanks():
     
     # 更新单词的学习阶段为2（填空）
     if 'id' in word:
-        WordModel.update_word_stage(word['id'], 2)
+        WordModel.update_word_stage(word['id'], 2, word['word'], user_id)
     
     return jsonify({
         "success": True,
         "word": word["word"],
         "word_with_blanks": word_with_blanks,
         "blanks": blanks,
-        "meaning": word["meaning"]
+        "meaning": word["meaning"],
+        "token": blanks_token(word, word_with_blanks, blanks)
     })
 
 @app.route('/api/typing-word', methods=['GET'])
 def get_typing_word():
     """获取中文盲打单词API"""
+    user_id = current_user_id()
     # 获取第三阶段（盲打）的单词，即从第二阶段（填空）中获取
-    word = WordModel.get_words_by_stage(stage=3)
+    word = WordModel.get_words_by_stage(stage=3, user_id=user_id)
     
     if not word:
         # 如果没有找到第二阶段的单词，返回提示信息
@@ -105,83 +247,258 @@ def get_typing_word():
     
     # 更新单词的学习阶段为3（盲打）
     if 'id' in word:
-        WordModel.update_word_stage(word['id'], 3)
+        WordModel.update_word_stage(word['id'], 3, word['word'], user_id)
     
     return jsonify({
         "success": True,
         "word": word["word"],
-        "meaning": word["meaning"]
+        "meaning": word["meaning"],
+        "token": typing_token(word)
+    })
+
+def batch_count():
+    """批量接口的 count 参数，限制在 1 到 BATCH_MAX_COUNT 之间"""
+    count = request.args.get('count', 5, type=int)
+    return max(1, min(count, BATCH_MAX_COUNT))
+
+def batch_exclude_ids():
+    """批量接口的 exclude 参数：前端已经缓冲、不需要再返回的学习记录id（逗号分隔），无效时返回 400"""
+    try:
+        ids = [int(word_id) for word_id in request.args.get('exclude', '').split(',') if word_id.strip()]
+    except ValueError:
+        abort(make_response(jsonify({"error": "无效的 exclude 参数"}), 400))
+    return ids[-BATCH_MAX_EXCLUDE:]
+
+def stage_words(stage, count):
+    """从当前用户的学习记录中取若干个可以进入该阶段的单词（跳过 exclude 中的），总是返回列表"""
+    words = WordModel.get_words_by_stage(stage=stage, limit=count, exclude_ids=batch_exclude_ids(),
+                                         user_id=current_user_id())
+    if not words:
+        return []
+    return words if isinstance(words, list) else [words]
+
+@app.route('/api/random-words', methods=['GET'])
+def get_random_words():
+    """一次获取多个随机单词，供前端预取
+
+    与 /api/random-word 不同，这里不会自动加入学习记录，前端显示单词时再调用 /api/learned-word。
+    筛选参数与 /api/random-word 相同，指定筛选条件时同一批中的单词互不相同。
+    """
+    level = request.args.get('level', None)
+    words = WordModel.get_random_words(level, batch_count(), session_decks(), **word_filters())
+    if not words:
+        return jsonify({"error": "没有找到单词"}), 404
+    
+    if TTS_PREFETCH_WORDS > 0:
+        try:
+            tts_warm.warm_words([word['word'] for word in words])
+        except Exception as e:
+            logger.warning("预热发音时出错: %s", e)
+    
+    return jsonify({"words": words})
+
+@app.route('/api/words-with-blanks', methods=['GET'])
+def get_words_with_blanks():
+    """一次获取多个已经挖好空的单词，前端显示时再把学习阶段更新为2
+
+    到期的单词按固定顺序返回，前端补充缓冲时用 exclude 传入已经缓冲的学习记录id，避免重复。
+    """
+    num_blanks = request.args.get('blanks', None, type=int)
+    words = stage_words(2, batch_count())
+    if not words:
+        return jsonify({
+            "success": False,
+            "message": "您还没有学习过任何单词，请先在'认识单词'模块学习一些单词。"
+        }), 404
+    
+    items = []
+    for word in words:
+        word_with_blanks, blanks = WordModel.create_word_with_blanks(word, num_blanks)
+        if not word_with_blanks:
+            continue
+        items.append({
+            "id": word["id"],
+            "word": word["word"],
+            "word_with_blanks": word_with_blanks,
+            "blanks": blanks,
+            "meaning": word["meaning"],
+            "token": blanks_token(word, word_with_blanks, blanks)
+        })
+    
+    return jsonify({"success": True, "words": items})
+
+@app.route('/api/typing-words', methods=['GET'])
+def get_typing_words():
+    """一次获取多个盲打单词，前端显示时再把学习阶段更新为3（exclude 参数同 /api/words-with-blanks）"""
+    words = stage_words(3, batch_count())
+    if not words:
+        return jsonify({
+            "success": False,
+            "message": "您还没有在'单词填空'模块学习过任何单词，请先完成一些填空练习。"
+        }), 404
+    
+    return jsonify({
+        "success": True,
+        "words": [{"id": word["id"], "word": word["word"], "meaning": word["meaning"], "token": typing_token(word)}
+                  for word in words]
     })
 
 @app.route('/api/check-blanks', methods=['POST'])
 def check_blanks():
-    """检查填空答案API"""
-    data = request.json
+    """检查填空答案API，结果计入该单词的复习计划
+
+    题目由取词接口返回的签名令牌描述，任何进程都可以校验；每个令牌只能作答一次。
+    """
+    data = request.json or {}
     user_answers = data.get('answers', [])
-    
-    # 从会话获取正确答案
-    correct_blanks = session.get('current_blanks', [])
-    current_word = session.get('current_word', '')
-    current_level = session.get('current_level', '默认')
-    
-    if not correct_blanks or len(user_answers) != len(correct_blanks):
-        return jsonify({"error": "无效的答案"}), 400
+    try:
+        challenge = answer_token.verify(data.get('token', ''), "blanks")
+        if not isinstance(user_answers, list) or len(user_answers) != len(challenge.positions):
+            return jsonify({"error": "无效的答案"}), 400
+        answer_token.redeem(challenge)
+    except answer_token.InvalidToken as e:
+        return jsonify({"error": str(e)}), 400
     
     # 检查答案
-    is_correct = all(user_answer.lower() == correct_blank.lower() 
-                    for user_answer, correct_blank in zip(user_answers, correct_blanks))
+    is_correct = answer_token.check(challenge, user_answers)
+    
+    quality = scheduler.QUALITY_BLANKS_CORRECT if is_correct else scheduler.QUALITY_BLANKS_WRONG
+    schedule = None
+    if challenge.word_id is not None:
+        schedule = WordModel.record_review(challenge.word_id, quality, "blanks", is_correct, current_user_id())
+    correct_word = schedule.get("word") if schedule else None
     
     return jsonify({
         "is_correct": is_correct,
-        "correct_word": current_word,
-        "correct_blanks": correct_blanks,
-        "level": current_level
+        "correct_word": correct_word,
+        "correct_blanks": [correct_word[i] for i in challenge.positions] if correct_word else None,
+        "level": data.get('level', '默认'),
+        "schedule": schedule
     })
 
 @app.route('/api/random-meaning')
 def get_random_meaning():
     """获取随机中文释义API"""
     level = request.args.get('level', None)
-    word = WordModel.get_random_word(level)
+    word = WordModel.get_random_word(level, session_decks(), **word_filters())
     if not word:
         return jsonify({"error": "没有找到单词"}), 404
     
-    # 保存正确答案到会话
-    if 'id' in word:
-        session['current_word_id'] = word['id']
-    session['current_word'] = word['word']
-    session['current_level'] = word.get('level', '默认')
-    
+    # 正确答案放在签名令牌中，由 /api/check-typing 校验
     return jsonify({
         "meaning": word['meaning'],
-        "level": word.get('level', '默认')
+        "level": word.get('level', '默认'),
+        "token": typing_token(word)
     })
 
 @app.route('/api/check-typing', methods=['POST'])
 def check_typing():
-    """检查中文盲打答案API"""
-    data = request.json
-    user_answer = data.get('answer', '').strip().lower()
+    """检查中文盲打答案API，结果计入该单词的复习计划
+
+    题目由取词接口返回的签名令牌描述，任何进程都可以校验；每个令牌只能作答一次。
+    答错时返回拼写反馈：distance（与正确单词的编辑距离）、almost_correct（只拼错了个别字母）
+    和 suggestions（与答案相近的真实单词），拼错个别字母按"勉强记得"安排复习。
+    """
+    data = request.json or {}
+    user_answer = str(data.get('answer', '')).strip().lower()
+    try:
+        challenge = answer_token.verify(data.get('token', ''), "typing")
+        answer_token.redeem(challenge)
+    except answer_token.InvalidToken as e:
+        return jsonify({"error": str(e)}), 400
     
-    # 从会话获取正确答案
-    current_word = session.get('current_word', '').lower()
-    current_level = session.get('current_level', '默认')
+    # 检查答案
+    is_correct = bool(user_answer) and answer_token.check(challenge, user_answer)
+    user_id = current_user_id()
+    
+    # 正确单词加密保存在令牌中，不论是否有复习计划都告诉用户，答错时用来计算拼写距离
+    correct_word = answer_token.reveal(challenge)
+    feedback = {"distance": 0 if is_correct else None, "almost_correct": False, "suggestions": []}
+    if user_answer and not is_correct and correct_word:
+        feedback = typing_feedback(user_answer, correct_word)
+    
+    # 空答案表示限时模式下超时
+    if not user_answer:
+        quality = scheduler.QUALITY_TIMEOUT
+    elif is_correct:
+        quality = scheduler.QUALITY_TYPING_CORRECT
+    elif feedback["almost_correct"]:
+        quality = scheduler.QUALITY_TYPING_ALMOST
+    else:
+        quality = scheduler.QUALITY_TYPING_WRONG
+    schedule = None
+    if challenge.word_id is not None:
+        schedule = WordModel.record_review(challenge.word_id, quality, "typing", is_correct, user_id)
     
-    if not current_word:
-        return jsonify({"error": "无效的会话"}), 400
+    return jsonify({
+        "is_correct": is_correct,
+        "correct_word": correct_word or (schedule.get("word") if schedule else None),
+        "distance": feedback["distance"],
+        "almost_correct": feedback["almost_correct"],
+        "suggestions": feedback["suggestions"],
+        "level": data.get('level', '默认'),
+        "schedule": schedule
+    })
+
+@app.route('/api/multiple-choice', methods=['GET'])
+def get_multiple_choice():
+    """多选题API：direction=word 给出单词和若干中文释义，direction=meaning 给出释义和若干单词
+
+    正确选项的下标放在签名令牌中，由 /api/check-choice 校验。
+    出题的单词和 /api/random-word 一样加入学习记录（阶段1），令牌中带上学习记录id，作答结果计入复习计划。
+    """
+    level = request.args.get('level', None)
+    direction = request.args.get('direction', 'word')
+    if direction not in CHOICE_DIRECTIONS:
+        return jsonify({"error": "无效的出题方向"}), 400
+    question = WordModel.get_multiple_choice(level, direction, session_decks(), CHOICE_OPTIONS)
+    if not question:
+        return jsonify({"error": "没有找到单词"}), 404
     
-    # 检查答案
-    is_correct = user_answer == current_word
+    user_id = current_user_id()
+    WordModel.add_learned_word(question["word"], stage=1, user_id=user_id)
+    word_id = WordModel.get_learned_word_id(question["word"]["word"], user_id)
+    
+    return jsonify({
+        "direction": question["direction"],
+        "prompt": question["prompt"],
+        "options": question["options"],
+        "level": question["level"],
+        "token": answer_token.issue("choice", word_id, question["answer"])
+    })
+
+@app.route('/api/check-choice', methods=['POST'])
+def check_choice():
+    """检查多选题答案API，返回是否答对和正确选项的下标，结果计入该单词的复习计划；每个令牌只能作答一次"""
+    data = request.json or {}
+    choice = data.get('choice')
+    try:
+        challenge = answer_token.verify(data.get('token', ''), "choice")
+        if not isinstance(choice, int) or isinstance(choice, bool) or not 0 <= choice < CHOICE_OPTIONS:
+            return jsonify({"error": "无效的答案"}), 400
+        answer_token.redeem(challenge)
+    except answer_token.InvalidToken as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # 令牌中只有正确下标的摘要（与令牌的随机数绑定），逐个比对即可找出正确选项
+    correct_index = next((i for i in range(CHOICE_OPTIONS) if answer_token.check(challenge, i)), None)
+    is_correct = choice == correct_index
+    
+    quality = scheduler.QUALITY_CHOICE_CORRECT if is_correct else scheduler.QUALITY_CHOICE_WRONG
+    schedule = None
+    if challenge.word_id is not None:
+        schedule = WordModel.record_review(challenge.word_id, quality, "choice", is_correct, current_user_id())
     
     return jsonify({
         "is_correct": is_correct,
-        "correct_word": current_word,
-        "level": current_level
+        "correct_index": correct_index,
+        "schedule": schedule
     })
 
 @app.route('/api/reset-words', methods=['POST'])
 def reset_words():
     """重置已显示的单词记录"""
+    session.pop('decks', None)
     result = WordModel.reset_shown_words()
     return jsonify(result)
 
@@ -192,20 +509,46 @@ def get_learned_words():
     offset = request.args.get('offset', 0, type=int)
     sort_by = request.args.get('sort_by', 'learn_time')
     sort_order = request.args.get('sort_order', 'desc')
+    # 带 cursor 参数（第一页传空字符串）时按游标分页
+    cursor = request.args.get('cursor')
     
-    result = WordModel.get_learned_words(limit, offset, sort_by, sort_order)
+    result = WordModel.get_learned_words(limit, offset, sort_by, sort_order, cursor, current_user_id())
     return jsonify(result)
 
+@app.route('/api/learned-words/export', methods=['GET'])
+def export_learned_words():
+    """导出全部学习记录，每行一个JSON对象（NDJSON），边查询边输出"""
+    if not progress_store_ready():
+        return jsonify(READ_ONLY_RESULT), 503
+    sort_by = request.args.get('sort_by', 'learn_time')
+    sort_order = request.args.get('sort_order', 'desc')
+    # 生成器在请求上下文之外继续执行，先取出用户
+    user_id = current_user_id()
+    
+    def generate():
+        for word in WordModel.iter_learned_words(sort_by, sort_order, user_id=user_id):
+            yield json.dumps(word, ensure_ascii=False) + '\n'
+    
+    response = app.response_class(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Content-Disposition'] = 'attachment; filename=learned_words.ndjson'
+    return response
+
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """学习进度统计API，days 为每日直方图的天数（最多365）"""
+    days = max(1, min(request.args.get('days', 30, type=int), 365))
+    return jsonify(WordModel.get_stats(days, current_user_id()))
+
 @app.route('/api/learned-word/<int:word_id>', methods=['DELETE'])
 def delete_learned_word(word_id):
     """删除学习记录API"""
-    result = WordModel.delete_learned_word(word_id)
+    result = WordModel.delete_learned_word(word_id, current_user_id())
     return jsonify(result)
 
 @app.route('/api/learned-words/clear', methods=['DELETE'])
 def clear_learned_words():
     """清空学习记录API"""
-    result = WordModel.clear_learned_words()
+    result = WordModel.clear_learned_words(current_user_id())
     return jsonify(result)
 
 @app.route('/api/learned-word', methods=['POST'])
@@ -223,7 +566,7 @@ def add_learned_word():
         "source_table": data.get('source_table')
     }
     
-    result = WordModel.add_learned_word(word_dict)
+    result = WordModel.add_learned_word(word_dict, user_id=current_user_id())
     return jsonify(result)
 
 @app.route('/api/update-word-stage', methods=['POST'])
@@ -232,21 +575,13 @@ def update_word_stage():
     data = request.json
     if not data or 'word' not in data or 'stage' not in data:
         return jsonify({"success": False, "message": "缺少必要参数"}), 400
+    if not valid_stage(data['stage']):
+        return jsonify(INVALID_STAGE_RESULT), 400
     
-    word = data['word']
-    stage = data['stage']
-    
-    # 查询单词ID
-    query = text("SELECT id FROM learned_words WHERE word = :word")
-    result = init_db.session.execute(query, {"word": word}).fetchone()
-    
-    if result:
-        word_id = result[0]
-        # 更新单词的学习阶段
-        response = WordModel.update_word_stage(word_id, stage)
-        return jsonify(response)
-    else:
+    response = WordModel.update_word_stage_by_word(data['word'], data['stage'], current_user_id())
+    if response is None:
         return jsonify({"success": False, "message": "未找到该单词"}), 404
+    return jsonify(response)
 
 @app.route('/api/text-to-speech', methods=['GET'])
 def text_to_speech():
@@ -254,59 +589,81 @@ def text_to_speech():
     text = request.args.get('text', '')
     if not text:
         return jsonify({"error": "未提供文本"}), 400
+    voice = request.args.get('voice', tts_cache.DEFAULT_VOICE)
+    audio_format = request.args.get('format', tts_cache.DEFAULT_FORMAT)
+    if audio_format not in tts_cache.MIMETYPES:
+        return jsonify({"error": f"不支持的音频格式: {audio_format}"}), 400
+    
+    # 音频按内容寻址，同一 (文本, 发音人, 格式) 的结果不会变化，
+    # 浏览器带着相同的 ETag 再次请求时直接返回304
+    key = tts_cache.cache_key(text, voice, audio_format)
+    if key in request.if_none_match:
+        response = app.response_class(status=304)
+        response.set_etag(key)
+        response.headers['Cache-Control'] = TTS_CACHE_CONTROL
+        return response
     
     try:
-        # 使用免费的Voicerss TTS API
-        api_key = "c6c9f5b5c8f34d7b8e5a3c7d9b8a7c5d"  # 这是一个示例密钥，实际使用时请替换为您自己的密钥
-        url = f"https://api.voicerss.org/?key={api_key}&hl=en-us&v=Amy&c=MP3&f=16khz_16bit_stereo&src={text}"
-        
-        # 创建临时文件保存音频
-        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        temp_file_path = temp_file.name
-        temp_file.close()
-        
-        # 下载音频文件
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            with open(temp_file_path, 'wb') as f:
-                f.write(response.content)
-            
-            # 发送音频文件
-            return send_file(temp_file_path, mimetype='audio/mpeg')
-        else:
-            return jsonify({"error": f"获取音频失败，状态码: {response.status_code}"}), 500
-    
+        key, path, stream = tts_cache.open_audio(text, voice, audio_format)
+    except tts_cache.TTSError as e:
+        return jsonify({"error": str(e)}), 500
     except Exception as e:
         return jsonify({"error": f"生成语音出错: {str(e)}"}), 500
     
-    finally:
-        # 确保临时文件被删除
-        if 'temp_file_path' in locals() and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+    if stream is None:
+        response = send_file(path, mimetype=tts_cache.MIMETYPES[audio_format], etag=key, conditional=True)
+    else:
+        # 首次合成：上游的音频边下载边转发给浏览器，同时写入缓存
+        response = app.response_class(stream, mimetype=tts_cache.MIMETYPES[audio_format])
+        response.set_etag(key)
+    response.headers['Cache-Control'] = TTS_CACHE_CONTROL
+    return response
 
 @app.route('/status')
 def status():
     """应用状态API"""
     if init_db.use_in_memory:
-        mode = "内存模式"
-        tables = []
+        mode = "快照模式"
+        tables = [(table, init_db.VOCABULARY_TABLES[table]) for table in vocab_cache.available_tables()]
     else:
-        mode = "MySQL模式"
+        mode = f"{storage.backend.label}模式"
         tables = list(init_db.VOCABULARY_TABLES.items())
     
     return jsonify({
         "status": "running",
         "database_mode": mode,
-        "vocabulary_tables": tables
+        "database_backend": storage.backend.name,
+        "vocabulary_tables": tables,
+        "connection_pool": init_db.get_pool_status()
     })
 
+@app.route('/metrics')
+def metrics_endpoint():
+    """请求延迟、数据库查询和慢查询指标API"""
+    return jsonify(metrics.snapshot())
+
 if __name__ == '__main__':
-    init_db.init_database()
+    # 日志级别由 LOG_LEVEL 控制，默认 INFO；设为 DEBUG 时输出每次取词和每个请求的耗时
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+                        format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    # 配置了词汇快照时直接从快照读取词汇，数据库只用于学习记录
+    snapshot_path = os.getenv('VOCAB_SNAPSHOT')
+    if snapshot_path:
+        vocab_snapshot.activate(snapshot_path)
+    db_ready = init_db.init_database()
+    if db_ready or init_db.use_in_memory:
+        # 启动时预加载词汇缓存和释义索引
+        if not init_db.use_in_memory:
+            vocab_cache.load_all()
+        meaning_index.build_all()
+        word_index.get_index()
+        spelling_index.build_all()
+        attribute_index.build_all()
+        # 其他进程（import_sql.py）重新导入词汇表后在后台重新加载
+        vocab_cache.start_watcher()
+        # 预先建立的干扰项索引（python distractor_index.py build），没有时多选题随机选取干扰项
+        distractor_index.load(os.getenv('DISTRACTOR_INDEX', distractor_index.DEFAULT_PATH))
+    if db_ready:
+        # 按配置启用学习进度延迟写入
+        progress_writer.start_from_env()
     app.run(debug=True, host='0.0.0.0', port=5000)
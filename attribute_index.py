@@ -0,0 +1,129 @@
+import random
+import logging
+import threading
+import vocab_cache
+from translate_parser import parts_of_speech
+
+logger = logging.getLogger(__name__)
+
+# 长度位图的上限：更长的单词只出现在"长度不限"的集合中，max_length 超过它时不再限制
+MAX_LENGTH = 24
+
+
+def _bitmap(rows, size):
+    """把行号集合转换为位图（Python 整数，第 row 位为1表示包含该行）"""
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def select(bitmap, rank):
+    """位图中第 rank 个（从0开始）为1的位的位置，二分查找前缀中1的个数"""
+    low, high = 0, bitmap.bit_length()
+    while high - low > 1:
+        middle = (low + high) // 2
+        if (bitmap & ((1 << middle) - 1)).bit_count() > rank:
+            high = middle
+        else:
+            low = middle
+    return low
+
+
+class TableAttributeIndex:
+    """单个词汇表的属性位图索引：每个词性一个位图，每个长度一个"长度不超过 L"的累积位图
+
+    按词性和长度筛选只需几次整数按位与，位图中1的个数即候选数，按名次取第 k 个1即可均匀随机地选出一个单词。
+    一个级别最多一万多个单词，每个位图不到 2KB。
+    """
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        size = len(vocabulary)
+        rows_by_pos = {}
+        rows_by_length = {}
+        valid = []
+        for row in range(size):
+            word = vocabulary.word(row).strip()
+            if not word:
+                continue
+            valid.append(row)
+            for tag in parts_of_speech(vocabulary.meaning(row)):
+                rows_by_pos.setdefault(tag, []).append(row)
+            rows_by_length.setdefault(min(len(word), MAX_LENGTH + 1), []).append(row)
+        self.all = _bitmap(valid, size)
+        self.pos = {tag: _bitmap(rows, size) for tag, rows in rows_by_pos.items()}
+        # at_most[L] 是长度不超过 L 的单词
+        self.at_most = [0]
+        for length in range(1, MAX_LENGTH + 1):
+            self.at_most.append(self.at_most[-1] | _bitmap(rows_by_length.get(length, ()), size))
+
+    def __len__(self):
+        return len(self.vocabulary)
+
+    def _at_most(self, length):
+        return self.all if length > MAX_LENGTH else self.at_most[max(length, 0)]
+
+    def candidates(self, pos=None, min_length=None, max_length=None):
+        """符合条件的行的位图；pos 是词性列表（满足其一即可），长度范围包含两端"""
+        bitmap = self.all
+        if pos:
+            tags = 0
+            for tag in pos:
+                tags |= self.pos.get(tag, 0)
+            bitmap &= tags
+        if max_length is not None:
+            bitmap &= self._at_most(max_length)
+        if min_length is not None and min_length > 1:
+            bitmap &= ~self._at_most(min_length - 1)
+        return bitmap
+
+
+# 每个表的索引；对应的 LevelVocabulary 被替换（重新导入、缓存失效）时自动重建该表
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_table_index(table_name):
+    """获取某个表的属性索引，词汇变化时只重建这一个表"""
+    vocabulary = vocab_cache.get_level(table_name)
+    index = _indexes.get(table_name)
+    if index is not None and index.vocabulary is vocabulary:
+        return index
+    with _lock:
+        index = _indexes.get(table_name)
+        if index is None or index.vocabulary is not vocabulary:
+            index = TableAttributeIndex(vocabulary)
+            _indexes[table_name] = index
+            logger.info("已建立属性索引: %s，%s 个单词，%s 种词性", table_name, len(index), len(index.pos))
+    return index
+
+
+def build_all():
+    """启动时为所有可用的表建立索引"""
+    for table_name in vocab_cache.available_tables():
+        try:
+            get_table_index(table_name)
+        except Exception as e:
+            logger.error("建立属性索引 %s 时出错: %s", table_name, e)
+
+
+def sample(tables, count, pos=None, min_length=None, max_length=None):
+    """在若干表中符合条件的单词里均匀随机地选出至多 count 个不同的单词，返回 [(表名, 行号)]"""
+    matches = []
+    total = 0
+    for table_name in tables:
+        bitmap = get_table_index(table_name).candidates(pos, min_length, max_length)
+        size = bitmap.bit_count()
+        if size:
+            matches.append((table_name, bitmap, size))
+            total += size
+    picked = []
+    for rank in random.sample(range(total), min(count, total)):
+        # 名次先落到某个表，再在该表的位图中取第 rank 个1
+        for table_name, bitmap, size in matches:
+            if rank < size:
+                picked.append((table_name, select(bitmap, rank)))
+                break
+            rank -= size
+    return picked
@@ -0,0 +1,307 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import datetime
+import platform
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+# 加载环境变量
+load_dotenv()
+
+# 默认的历史记录规模和每项测量的次数
+DEFAULT_SIZES = (1000, 100000, 1000000)
+DEFAULT_ITERATIONS = 200
+WARMUP_ITERATIONS = 10
+# 合成学习记录时每批插入的行数
+SYNTHESIZE_BATCH_SIZE = 5000
+
+SYNTHESIZE_LEARNED_WORD = text("""
+    INSERT INTO learned_words
+        (user_id, word, translate, level, source_table, learn_time, review_count, last_review_time, learn_stage, due_time)
+    VALUES (:user_id, :word, :translate, :level, :source_table, :learn_time, :review_count, :last_review_time, :stage, :due_time)
+""")
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法求分位数，sorted_values 须已排序"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(name, func, iterations, size=None):
+    """调用 func 若干次，返回延迟分位数（毫秒）和吞吐量"""
+    for _ in range(min(WARMUP_ITERATIONS, iterations)):
+        func()
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(iterations):
+        begin = time.perf_counter_ns()
+        func()
+        latencies.append((time.perf_counter_ns() - begin) / 1e6)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        "name": name,
+        "history_size": size,
+        "iterations": iterations,
+        "p50_ms": round(percentile(latencies, 0.50), 4),
+        "p99_ms": round(percentile(latencies, 0.99), 4),
+        "mean_ms": round(sum(latencies) / len(latencies), 4),
+        "max_ms": round(latencies[-1], 4),
+        "ops_per_sec": round(iterations / elapsed, 2) if elapsed > 0 else None
+    }
+    print(f"  {name}: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, {result['ops_per_sec']} 次/秒", file=sys.stderr)
+    return result
+
+
+def default_database(backend):
+    """基准测试默认使用的数据库：MySQL 为 <MYSQL_DB>_bench，SQLite 为仓库目录下的 english_practice_bench.db"""
+    if backend == "sqlite":
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_practice_bench.db")
+    return os.getenv("MYSQL_DB", "english_practice") + "_bench"
+
+
+def prepare_database(backend, database, reload_vocabulary=False):
+    """创建基准测试数据库，导入自带的七个词汇表，并初始化学习记录表"""
+    # 存储后端在导入时按环境变量选择，必须先切换到基准测试数据库
+    os.environ["DB_BACKEND"] = backend
+    os.environ["SQLITE_PATH" if backend == "sqlite" else "MYSQL_DB"] = database
+    import import_sql
+    import init_db
+    import vocab_cache
+    import meaning_index
+    import word_index
+    import spelling_index
+    import attribute_index
+    import distractor_index
+
+    if not import_sql.create_database():
+        raise SystemExit(f"无法创建基准测试数据库 {database}")
+    if not init_db.init_database():
+        raise SystemExit("无法连接基准测试数据库")
+
+    missing = [t for t in init_db.VOCABULARY_TABLES if not init_db.table_exists(init_db.session, t)]
+    if reload_vocabulary or missing:
+        print("正在导入词汇表...", file=sys.stderr)
+        for sql_file in import_sql.find_sql_files():
+            import_sql.import_sql_file(sql_file)
+    init_db.session.remove()
+    vocab_cache.load_all()
+    # 与 app.py 启动时一样预建释义索引、单词索引、拼写索引和属性索引，避免首次请求的构建时间计入结果
+    meaning_index.build_all()
+    word_index.get_index()
+    spelling_index.build_all()
+    attribute_index.build_all()
+    # 干扰项索引建立较慢（约1分钟），已有且与词汇一致时直接使用
+    index_path = os.path.splitext(database)[0] + ".distractors"
+    index = distractor_index.load(index_path) if os.path.exists(index_path) else None
+    if index is None or not all(index.matches(vocab_cache.get_level(t)) for t in vocab_cache.available_tables()):
+        print("正在建立干扰项索引...", file=sys.stderr)
+        distractor_index.build_index(index_path)
+        distractor_index.load(index_path)
+
+
+def synthesize_history(size, users=1, seed=0):
+    """清空 learned_words 并合成 size 条学习记录，轮流分给 users 个用户
+
+    单词取自已导入的词汇表，超出词汇量的部分在单词后加序号以满足唯一键。
+    学习时间、复习次数、阶段和到期时间随机分布在过去一年内。
+    第一个用户是默认用户（基准测试的请求都以默认用户身份发出），返回它的单词列表。
+    """
+    import init_db
+    import vocab_cache
+    import models
+    import progress_stats
+    import storage
+
+    rng = random.Random(seed)
+    vocabularies = [(t, init_db.VOCABULARY_TABLES.get(t, t), vocab_cache.get_level(t)) for t in vocab_cache.available_tables()]
+    now = datetime.datetime.now()
+
+    init_db.session.execute(text("DELETE FROM learned_words"))
+    init_db.session.commit()
+    print(f"正在合成 {size} 条学习记录（{users} 个用户）...", file=sys.stderr)
+    started = time.perf_counter()
+    user_ids = [init_db.DEFAULT_USER_ID] + [f"bench-{n}" for n in range(1, users)]
+    batch = []
+    seen = set()
+    default_words = []
+    for n in range(size):
+        table_name, level, vocabulary = vocabularies[n % len(vocabularies)]
+        row = rng.randrange(len(vocabulary))
+        word = vocabulary.word(row)
+        if word.lower() in seen:
+            word = f"{word}#{n}"
+        seen.add(word.lower())
+        user_id = user_ids[n % users]
+        if user_id == init_db.DEFAULT_USER_ID:
+            default_words.append(word)
+        learn_time = now - datetime.timedelta(seconds=rng.randrange(365 * 86400))
+        last_review_time = learn_time + datetime.timedelta(seconds=rng.randrange(max(1, int((now - learn_time).total_seconds()))))
+        batch.append({
+            "user_id": user_id,
+            "word": word,
+            "translate": vocabulary.meaning(row),
+            "level": level,
+            "source_table": table_name,
+            "learn_time": learn_time,
+            "review_count": rng.randint(1, 20),
+            "last_review_time": last_review_time,
+            "stage": rng.randint(1, models.MAX_STAGE),
+            "due_time": now + datetime.timedelta(seconds=rng.randrange(-30 * 86400, 30 * 86400))
+        })
+        if len(batch) >= SYNTHESIZE_BATCH_SIZE:
+            init_db.session.execute(SYNTHESIZE_LEARNED_WORD, batch)
+            init_db.session.commit()
+            batch = []
+    if batch:
+        init_db.session.execute(SYNTHESIZE_LEARNED_WORD, batch)
+        init_db.session.commit()
+    init_db.session.execute(text(storage.backend.analyze_statement("learned_words")))
+    init_db.session.commit()
+    init_db.session.remove()
+
+    # 缓存的总数和统计要按新的数据重新计算
+    models.learned_word_total.invalidate()
+    progress_stats.stats.invalidate()
+    print(f"合成完成，耗时 {time.perf_counter() - started:.1f} 秒", file=sys.stderr)
+    return sorted(default_words)
+
+
+def model_benchmarks(size, iterations, words):
+    """以默认用户直接调用 WordModel 的热点方法，words 是该用户已有的单词"""
+    import init_db
+    import spelling_index
+    from models import WordModel
+
+    rng = random.Random(1)
+    new_word_counter = iter(range(10 ** 9))
+    middle = {"cursor": None}
+
+    def deep_offset_page():
+        WordModel.get_learned_words(50, len(words) // 2, "learn_time", "desc")
+
+    def misspelled():
+        # 把一个已学单词的某个字母换掉，模拟盲打时的拼写错误
+        word = rng.choice(words).split("#")[0].lower()
+        position = rng.randrange(len(word))
+        return word[:position] + rng.choice("abcdefghijklmnopqrstuvwxyz") + word[position + 1:]
+
+    def cursor_page():
+        # 从第一页开始连续翻页，翻到末尾后回到第一页
+        page = WordModel.get_learned_words(50, 0, "learn_time", "desc", middle["cursor"] or "")
+        middle["cursor"] = page.get("next_cursor")
+
+    cases = [
+        ("model.get_random_word", lambda: WordModel.get_random_word()),
+        ("model.get_words_by_stage(2)", lambda: WordModel.get_words_by_stage(2)),
+        ("model.get_words_by_stage(3, limit=5)", lambda: WordModel.get_words_by_stage(3, limit=5)),
+        ("model.add_learned_word(existing)", lambda: WordModel.add_learned_word(
+            {"word": rng.choice(words), "meaning": "基准测试", "level": "四级"}, stage=1)),
+        ("model.add_learned_word(new)", lambda: WordModel.add_learned_word(
+            {"word": f"bench-new-{next(new_word_counter)}", "meaning": "基准测试", "level": "四级"}, stage=1)),
+        ("model.get_learned_words(first_page)", lambda: WordModel.get_learned_words(50, 0, "learn_time", "desc")),
+        ("model.get_learned_words(offset=user_size/2)", deep_offset_page),
+        ("model.get_learned_words(cursor)", cursor_page),
+        ("model.get_stats", lambda: WordModel.get_stats(30)),
+        ("spelling.nearest(typo)", lambda: spelling_index.nearest(misspelled())),
+        ("model.get_multiple_choice", lambda: WordModel.get_multiple_choice()),
+        ("model.get_random_word(pos=v, 6-9)", lambda: WordModel.get_random_word(
+            "六级", pos=["v"], min_length=6, max_length=9)),
+    ]
+    results = []
+    for name, func in cases:
+        results.append(measure(name, func, iterations, size))
+        # 模拟每个请求结束时释放会话
+        init_db.session.remove()
+    return results
+
+
+def http_benchmarks(size, iterations):
+    """通过 Flask 测试客户端调用接口（包含路由、会话和JSON序列化的开销）"""
+    import app as web
+
+    client = web.app.test_client()
+
+    def get(url):
+        def call():
+            response = client.get(url)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{url} 返回 {response.status_code}")
+        return call
+
+    cases = [
+        ("http.GET /api/random-word", get("/api/random-word")),
+        ("http.GET /api/random-words?count=5", get("/api/random-words?count=5")),
+        ("http.GET /api/random-words?pos=v&min_len=6&max_len=9", get("/api/random-words?count=5&pos=v&min_len=6&max_len=9")),
+        ("http.GET /api/words-with-blanks?count=5", get("/api/words-with-blanks?count=5")),
+        ("http.GET /api/typing-words?count=5", get("/api/typing-words?count=5")),
+        ("http.GET /api/multiple-choice", get("/api/multiple-choice")),
+        ("http.GET /api/learned-words", get("/api/learned-words?limit=50")),
+        ("http.GET /api/learned-words?cursor=", get("/api/learned-words?limit=50&cursor=")),
+        ("http.GET /api/search-meaning", get("/api/search-meaning?q=%E5%AD%A6%E4%B9%A0")),
+        ("http.GET /api/stats", get("/api/stats")),
+    ]
+    return [measure(name, func, iterations, size) for name, func in cases]
+
+
+def main():
+    """命令行入口：运行基准测试并输出JSON结果"""
+    parser = argparse.ArgumentParser(description="WordModel 热点方法和HTTP接口的基准测试")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="合成的学习记录条数，逗号分隔")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="每项测量的次数")
+    parser.add_argument("--users", type=int, default=1,
+                        help="合成的学习记录分给多少个用户，测试只读写其中一个用户的记录")
+    parser.add_argument("--backend", choices=["mysql", "sqlite"], default=os.getenv("DB_BACKEND", "mysql"),
+                        help="数据库后端")
+    parser.add_argument("--database", default=os.getenv("BENCH_DATABASE"),
+                        help="基准测试使用的MySQL数据库名或SQLite文件路径（会清空其中的学习记录）")
+    parser.add_argument("--reload-vocabulary", action="store_true", help="重新导入词汇表")
+    parser.add_argument("--skip-http", action="store_true", help="只测试模型方法")
+    parser.add_argument("--output", help="结果写入的文件，默认输出到标准输出")
+    args = parser.parse_args()
+    # 库模块通过 logging 输出加载进度和错误，命令行下直接显示
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    database = args.database or default_database(args.backend)
+    prepare_database(args.backend, database, args.reload_vocabulary)
+
+    results = []
+    for size in sizes:
+        words = synthesize_history(size, max(1, args.users))
+        print(f"学习记录 {size} 条:", file=sys.stderr)
+        results.extend(model_benchmarks(size, args.iterations, words))
+        if not args.skip_http:
+            results.extend(http_benchmarks(size, args.iterations))
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "backend": args.backend,
+        "database": database,
+        "sizes": sizes,
+        "users": max(1, args.users),
+        "iterations": args.iterations,
+        "results": results
+    }
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
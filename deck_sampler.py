@@ -0,0 +1,87 @@
+import secrets
+
+# 64位整数掩码
+MASK64 = (1 << 64) - 1
+# Feistel 轮数，4轮足以让排列看起来足够随机
+ROUNDS = 4
+
+
+def _mix(value, key):
+    """splitmix64 风格的整数混淆函数"""
+    value = (value * 0x9E3779B97F4A7C15 + key) & MASK64
+    value ^= value >> 31
+    value = (value * 0xBF58476D1CE4E5B9) & MASK64
+    value ^= value >> 29
+    return value
+
+
+def new_seed():
+    """生成一副新牌的种子"""
+    return secrets.randbits(32)
+
+
+class ShuffledDeck:
+    """按需洗牌的单词牌堆
+
+    用以种子为密钥的 Feistel 网络把 [0, size) 映射为一个伪随机排列，
+    相当于一次 Fisher–Yates 洗牌，但不需要保存整副牌：状态只有
+    (seed, cursor, size) 三个整数。游标走完一轮之前不会出现重复，
+    每次抽牌的代价是常数。
+    """
+
+    def __init__(self, size, seed=None, cursor=0):
+        self.size = size
+        self.seed = new_seed() if seed is None else seed
+        self.cursor = cursor
+        # 选择能覆盖 size 的最小偶数位宽，左右两半各占一半
+        half_bits = max(1, ((max(size, 2) - 1).bit_length() + 1) // 2)
+        self._half_bits = half_bits
+        self._half_mask = (1 << half_bits) - 1
+
+    @classmethod
+    def from_state(cls, state, size):
+        """从 [seed, cursor, size] 恢复牌堆；表大小变化时重新洗牌"""
+        if state and len(state) == 3 and state[2] == size and 0 <= state[1] <= size:
+            return cls(size, state[0], state[1])
+        return cls(size)
+
+    def state(self):
+        """返回可以存入会话的固定大小状态"""
+        return [self.seed, self.cursor, self.size]
+
+    def _permute(self, value):
+        """对 value 做一次 Feistel 置换（定义域为 2^(2*half_bits)）"""
+        left = value >> self._half_bits
+        right = value & self._half_mask
+        for round_index in range(ROUNDS):
+            key = _mix(self.seed, round_index)
+            left, right = right, left ^ (_mix(right, key) & self._half_mask)
+        return (left << self._half_bits) | right
+
+    def position(self, index):
+        """第 index 张牌对应的单词下标"""
+        # 循环行走：落在 [size, 2^bits) 之外时继续置换，直到回到表内
+        value = self._permute(index)
+        while value >= self.size:
+            value = self._permute(value)
+        return value
+
+    def draw(self):
+        """抽一张牌；一轮抽完后换一个种子重新洗牌"""
+        if self.size == 0:
+            return None
+        if self.cursor >= self.size:
+            self.seed = _mix(self.seed, self.size) & 0xFFFFFFFF
+            self.cursor = 0
+        index = self.position(self.cursor)
+        self.cursor += 1
+        return index
+
+    def peek(self, count):
+        """查看接下来的若干张牌，不移动游标"""
+        end = min(self.size, self.cursor + count)
+        return [self.position(i) for i in range(self.cursor, end)]
+
+    def remaining(self):
+        """本轮剩余的牌数"""
+        return self.size - self.cursor
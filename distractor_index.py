@@ -0,0 +1,272 @@
+import os
+import sys
+import mmap
+import zlib
+import array
+import random
+import struct
+import logging
+import argparse
+import init_db
+import vocab_cache
+import vocab_snapshot
+import spelling_index
+import translate_parser
+from init_db import VOCABULARY_TABLES
+
+logger = logging.getLogger(__name__)
+
+# 干扰项索引文件格式（小端）：
+#   文件头   magic(4) version(u32) 级别数(u32) 每个单词的干扰项数(u32)
+#   目录项   表名(32字节，UTF-8补零) 单词数(u32) 词汇指纹(u32) 数据位置(u64)
+#   数据区   每个级别一个 u32 数组，第i个单词的干扰项行号位于 [i*K, (i+1)*K)，不足时用 NO_ROW 补齐
+MAGIC = b"EPVD"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+ENTRY = struct.Struct("<32sIIQ")
+ALIGNMENT = 8
+NO_ROW = 0xFFFFFFFF
+
+# 每个单词预先保存的干扰项数，出题时从中随机选取，同一个单词每次的选项不完全相同
+DISTRACTORS_PER_WORD = 6
+# 除拼写相近的单词外，再从词性相同、长度相近的单词中抽取多少个候选
+SAMPLED_CANDIDATES = 24
+# 候选与目标的编辑距离超过这个值时不再精确计算
+MAX_DISTANCE = 4
+
+# 默认索引位置
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocabulary.distractors")
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def fingerprint(vocabulary):
+    """词汇内容的指纹：字符串池和偏移数组的 CRC32，单词、释义或行序变化后索引即失效"""
+    arena, offsets = vocabulary.buffers()
+    return zlib.crc32(offsets, zlib.crc32(arena)) & 0xFFFFFFFF
+
+
+def _senses(translate):
+    return {sense for _, sense in translate_parser.split_senses(translate)}
+
+
+def build_level(vocabulary, per_word=DISTRACTORS_PER_WORD, seed=0):
+    """为一个级别的每个单词挑选干扰项，返回 u32 数组（每个单词 per_word 个行号）
+
+    干扰项取自同一级别：候选为拼写相近的单词，加上词性相同、长度相近的若干单词；
+    按词性相同、编辑距离、长度差依次排序，去掉与目标是同一个单词或有相同义项（可能同样正确）的候选。
+    """
+    rng = random.Random(seed)
+    spelling = spelling_index.TableSpellingIndex(vocabulary)
+    words = [vocabulary.word(row).strip().lower() for row in range(len(vocabulary))]
+    meanings = [vocabulary.meaning(row) for row in range(len(vocabulary))]
+    tags = [translate_parser.parts_of_speech(meaning) for meaning in meanings]
+    senses = [_senses(meaning) for meaning in meanings]
+
+    # 单词到行号（同一单词重复出现时取第一行），以及按 (主要词性, 长度) 分组的行号
+    rows_by_word = {}
+    rows_by_shape = {}
+    for row, word in enumerate(words):
+        if not word:
+            continue
+        rows_by_word.setdefault(word, row)
+        rows_by_shape.setdefault((tags[row][0] if tags[row] else "", len(word)), []).append(row)
+
+    result = array.array("I", [NO_ROW]) * (len(vocabulary) * per_word)
+    for row, word in enumerate(words):
+        if not word:
+            continue
+        primary = tags[row][0] if tags[row] else ""
+        distances = {}
+        radius = max(1, spelling_index.typo_tolerance(len(word)))
+        for distance, neighbour in spelling.search(word, radius):
+            distances[rows_by_word[neighbour]] = distance
+        similar = []
+        for length in (len(word) - 1, len(word), len(word) + 1):
+            similar.extend(rows_by_shape.get((primary, length), ()))
+        for candidate in rng.sample(similar, min(SAMPLED_CANDIDATES, len(similar))):
+            if candidate not in distances:
+                distances[candidate] = spelling_index.edit_distance(word, words[candidate], MAX_DISTANCE)
+
+        ranked = []
+        for candidate, distance in distances.items():
+            if (words[candidate] == word or meanings[candidate] == meanings[row]
+                    or senses[candidate] & senses[row]):
+                continue
+            same_pos = primary in tags[candidate] if primary else not tags[candidate]
+            ranked.append((not same_pos, distance, abs(len(words[candidate]) - len(word)), candidate))
+        ranked.sort()
+
+        chosen = []
+        seen = set()
+        for *_, candidate in ranked:
+            if words[candidate] not in seen:
+                seen.add(words[candidate])
+                chosen.append(candidate)
+                if len(chosen) == per_word:
+                    break
+        result[row * per_word:row * per_word + len(chosen)] = array.array("I", chosen)
+    return result
+
+
+def write_index(levels, output_path, per_word=DISTRACTORS_PER_WORD):
+    """把 {表名: (LevelVocabulary, 干扰项数组)} 写成索引文件（先写临时文件再原子替换）"""
+    if sys.byteorder != "little" or array.array("I").itemsize != 4:
+        raise RuntimeError("干扰项索引格式要求小端和4字节的无符号整数")
+
+    entries = []
+    position = _align(HEADER.size + ENTRY.size * len(levels))
+    for table_name, (vocabulary, distractors) in levels.items():
+        entries.append((table_name, vocabulary, distractors, position))
+        position = _align(position + len(distractors) * distractors.itemsize)
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries), per_word))
+        for table_name, vocabulary, distractors, data_position in entries:
+            f.write(ENTRY.pack(table_name.encode("utf-8"), len(vocabulary), fingerprint(vocabulary), data_position))
+        for table_name, vocabulary, distractors, data_position in entries:
+            f.seek(data_position)
+            f.write(distractors.tobytes())
+        f.truncate(position)
+    os.replace(temp_path, output_path)
+
+
+def build_index(output_path=DEFAULT_PATH, per_word=DISTRACTORS_PER_WORD):
+    """为当前词汇（快照或数据库）的所有级别建立干扰项索引，返回 {表名: 单词数}"""
+    levels = {}
+    for table_name in vocab_cache.available_tables():
+        vocabulary = vocab_cache.get_level(table_name)
+        levels[table_name] = (vocabulary, build_level(vocabulary, per_word))
+        logger.info("已挑选干扰项: %s，%s 个单词", table_name, len(vocabulary))
+    write_index(levels, output_path, per_word)
+    return {table_name: len(vocabulary) for table_name, (vocabulary, _) in levels.items()}
+
+
+class DistractorIndex:
+    """内存映射的只读干扰项索引，取一个单词的干扰项只需按行号切片"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, count, self.per_word = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不是有效的干扰项索引: {path}")
+
+        # 表名 -> (单词数, 词汇指纹, u32 视图)
+        self.levels = {}
+        for i in range(count):
+            raw_name, rows, level_fingerprint, data_position = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+            table_name = raw_name.rstrip(b"\0").decode("utf-8")
+            data = view[data_position:data_position + 4 * rows * self.per_word].cast("I")
+            self.levels[table_name] = (rows, level_fingerprint, data)
+        # 已经核对过指纹的词汇：表名 -> (LevelVocabulary, 是否一致)
+        self._verified = {}
+
+    def matches(self, vocabulary):
+        """索引是否是为这份词汇建立的；每个 LevelVocabulary 只核对一次"""
+        verified = self._verified.get(vocabulary.table_name)
+        if verified is not None and verified[0] is vocabulary:
+            return verified[1]
+        level = self.levels.get(vocabulary.table_name)
+        ok = level is not None and level[0] == len(vocabulary) and level[1] == fingerprint(vocabulary)
+        if not ok:
+            logger.warning("干扰项索引与词汇表 %s 不一致（词汇已变化），该级别改为随机选取干扰项，"
+                           "请重新运行 python distractor_index.py build", vocabulary.table_name)
+        self._verified[vocabulary.table_name] = (vocabulary, ok)
+        return ok
+
+    def get(self, table_name, row):
+        """第 row 个单词预先挑选的干扰项行号"""
+        _, _, data = self.levels[table_name]
+        start = row * self.per_word
+        return [candidate for candidate in data[start:start + self.per_word] if candidate != NO_ROW]
+
+    def close(self):
+        """释放内存映射"""
+        self.levels = {}
+        self._verified = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._file.close()
+
+
+# 当前生效的索引，未加载时多选题随机选取干扰项
+index = None
+
+
+def load(path=DEFAULT_PATH):
+    """加载干扰项索引，文件不存在时返回 None"""
+    global index
+    if not os.path.exists(path):
+        logger.info("没有干扰项索引 %s，多选题将随机选取干扰项", path)
+        return None
+    index = DistractorIndex(path)
+    logger.info("已加载干扰项索引: %s，%s 个级别，每个单词 %s 个干扰项", path, len(index.levels), index.per_word)
+    return index
+
+
+def _random_distractors(vocabulary, row, count, exclude):
+    """在同一级别中随机选取干扰项（没有可用的索引时使用）"""
+    word, meaning = vocabulary.word(row).lower(), vocabulary.meaning(row)
+    chosen = []
+    for _ in range(count * 10):
+        if len(chosen) == count or len(vocabulary) <= 1:
+            break
+        candidate = vocabulary.random_index()
+        if (candidate in exclude or candidate in chosen or vocabulary.word(candidate).lower() == word
+                or vocabulary.meaning(candidate) == meaning):
+            continue
+        chosen.append(candidate)
+    return chosen
+
+
+def choose(vocabulary, row, count):
+    """为第 row 个单词选出 count 个干扰项的行号，优先从预先建立的索引中随机选取"""
+    chosen = []
+    if index is not None and index.matches(vocabulary):
+        candidates = index.get(vocabulary.table_name, row)
+        chosen = random.sample(candidates, min(count, len(candidates)))
+    if len(chosen) < count:
+        chosen += _random_distractors(vocabulary, row, count - len(chosen), set(chosen) | {row})
+    return chosen
+
+
+def main():
+    """命令行入口：build 建立干扰项索引，info 查看索引内容"""
+    parser = argparse.ArgumentParser(description="预先建立多选题的干扰项索引")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("path", nargs="?", default=os.getenv("DISTRACTOR_INDEX", DEFAULT_PATH))
+    parser.add_argument("--snapshot", default=os.getenv("VOCAB_SNAPSHOT"),
+                        help="从词汇快照读取词汇（默认从数据库读取）")
+    parser.add_argument("--per-word", type=int, default=DISTRACTORS_PER_WORD, help="每个单词保存的干扰项数")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        if args.snapshot:
+            vocab_snapshot.activate(args.snapshot)
+        elif not init_db.init_database():
+            sys.exit("无法连接数据库，请检查配置或使用 --snapshot")
+        counts = build_index(args.path, args.per_word)
+        for table_name, count in counts.items():
+            print(f"{table_name}（{VOCABULARY_TABLES[table_name]}）: {count} 个单词")
+        print(f"已生成干扰项索引: {args.path}，{os.path.getsize(args.path)} 字节")
+    else:
+        loaded = DistractorIndex(args.path)
+        for table_name, (rows, level_fingerprint, _) in loaded.levels.items():
+            print(f"{table_name}（{VOCABULARY_TABLES.get(table_name, '未知')}）: {rows} 个单词，指纹 {level_fingerprint:08x}")
+        print(f"每个单词 {loaded.per_word} 个干扰项")
+        loaded.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,182 @@
 import os
-import pymysql
+import sys
+import time
+import codecs
 from dotenv import load_dotenv
 import glob
 import re
+from concurrent.futures import ThreadPoolExecutor
+import vocab_cache
+import init_db
+import storage
 
 # 加载环境变量
 load_dotenv()
 
-# 获取MySQL连接信息
-host = os.getenv("MYSQL_HOST", "localhost")
-port = int(os.getenv("MYSQL_PORT", "3306"))
-user = os.getenv("MYSQL_USER", "root")
-password = os.getenv("MYSQL_PASSWORD", "")
-db = os.getenv("MYSQL_DB", "english_practice")
+# 每批写入的行数和并行导入的文件数
+BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "2000"))
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "7"))
+
+# 导出文件所在目录
+SQL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english-vocabulary-master", "乱序sql")
+
+# 导出文件中每行一条 INSERT 语句。释义取到行尾的 "');" 为止，
+# 所以释义里的分号和未转义的音标引号（如 [kən'dʌkt]）都不会截断语句
+INSERT_ROW_PATTERN = re.compile(
+    r"^INSERT\s+INTO\s+[`\"]?(\w+)[`\"]?\s*\(\s*`?word`?\s*,\s*`?translate`?\s*\)\s*"
+    r"VALUES\s*\(\s*'((?:[^'\\]|\\.)*)'\s*,\s*'(.*)'\s*\)\s*;\s*$",
+    re.IGNORECASE
+)
+CREATE_TABLE_PATTERN = re.compile(r'CREATE\s+TABLE\s+[`"]?(\w+)[`"]?', re.IGNORECASE)
+ESCAPE_PATTERN = re.compile(r"\\(.)")
+ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "0": "\0"}
 
 def create_database():
     """创建数据库（如果不存在）"""
     try:
-        # 连接MySQL服务器（不指定数据库）
-        conn = pymysql.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password
-        )
-        cursor = conn.cursor()
-        
-        # 创建数据库
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db} DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
-        print(f"数据库 {db} 已创建或已存在")
-        
-        conn.close()
+        # 由存储后端（DB_BACKEND）创建MySQL数据库或SQLite数据库文件
+        storage.backend.create_database()
+        print(f"数据库 {storage.backend.database_name()} 已创建或已存在")
     except Exception as e:
         print(f"创建数据库时出错: {e}")
         return False
     return True
 
-def clean_sql_statement(statement):
-    """清理SQL语句，处理常见的语法问题"""
-    # 移除注释
-    statement = re.sub(r'--.*?$', '', statement, flags=re.MULTILINE)
-    
-    # 如果是空语句，返回空字符串
-    if not statement.strip():
-        return ""
-    
-    # 处理引号问题
-    statement = statement.replace("'", "'").replace("'", "'")
-    
-    # 处理中文引号
-    statement = statement.replace(""", '"').replace(""", '"')
-    
-    return statement.strip()
-
-def import_sql_file(file_path):
-    """导入SQL文件到数据库"""
+def unescape_sql_string(value):
+    """还原SQL字符串字面量中的反斜杠转义"""
+    return ESCAPE_PATTERN.sub(lambda m: ESCAPES.get(m.group(1), m.group(1)), value)
+
+def detect_encoding(file_path):
+    """整个文件都是合法的UTF-8时返回 utf-8，否则按 GBK 读取
+
+    在解析之前单独读一遍确定编码：若边解析边回退，回退前已经产出（并写入）的行会被重复导入。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return 'gbk'
+    return 'utf-8'
+
+def _read_lines(file_path):
+    """逐行读取SQL文件，编码由 detect_encoding 预先确定"""
+    with open(file_path, 'r', encoding=detect_encoding(file_path)) as f:
+        for line in f:
+            yield line
+
+def parse_sql_file(file_path):
+    """流式解析导出文件，逐行产出 (表名, 单词, 释义)
+
+    表名统一转为小写，与 init_db.VOCABULARY_TABLES 的键一致
+    （导出文件中的 CET4、TOEFL 等大写表名在区分大小写的MySQL上无法被查到）。
+    """
+    table_name = None
+    for line in _read_lines(file_path):
+        match = INSERT_ROW_PATTERN.match(line)
+        if match:
+            yield match.group(1).lower(), unescape_sql_string(match.group(2)), unescape_sql_string(match.group(3))
+            continue
+
+        create_match = CREATE_TABLE_PATTERN.search(line)
+        if create_match:
+            table_name = create_match.group(1).lower()
+        elif line.upper().startswith("INSERT"):
+            print(f"无法解析的语句({table_name}): {line[:100]}...")
+
+def _connect():
+    """创建到词汇数据库的连接"""
+    return storage.backend.connect()
+
+def _create_staging_table(cursor, table_name):
+    """创建导入用的临时表，只带主键，单词索引在数据写完后再建"""
+    staging = f"{table_name}__import"
+    storage.backend.create_staging_table(cursor, staging)
+    return staging
+
+def _swap_in_table(cursor, table_name, staging):
+    """建好单词索引后替换旧表，导入期间旧表仍可读；替换后更新该表的版本号，运行中的应用据此重新加载"""
+    indexes = {name: index for name, index in init_db.VOCABULARY_INDEXES.items() if name != 'PRIMARY'}
+    storage.backend.swap_in_table(cursor, table_name, staging, indexes)
+    cursor.execute(storage.backend.BUMP_VOCABULARY_VERSION, (table_name,))
+
+def import_sql_file(file_path, batch_size=BATCH_SIZE):
+    """导入SQL文件到数据库，返回导入统计；失败时返回None"""
+    file_name = os.path.basename(file_path)
+    conn = None
+    staging = None
     try:
-        # 连接到数据库
-        conn = pymysql.connect(
-            host=host,
-            port=port,
-            user=user,
-            password=password,
-            database=db,
-            charset='utf8mb4'
-        )
+        # 每个文件使用独立的连接，便于并行导入
+        conn = _connect()
         cursor = conn.cursor()
-        
-        # 读取SQL文件
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                sql_content = f.read()
-        except UnicodeDecodeError:
-            # 如果UTF-8解码失败，尝试GBK编码
-            with open(file_path, 'r', encoding='gbk') as f:
-                sql_content = f.read()
-        
-        # 处理CREATE TABLE语句
-        if "CREATE TABLE" in sql_content.upper():
-            # 提取表名
-            table_name_match = re.search(r'CREATE\s+TABLE\s+[`"]?(\w+)[`"]?', sql_content, re.IGNORECASE)
-            if table_name_match:
-                table_name = table_name_match.group(1)
-                
-                # 先删除表（如果存在）
-                cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-                
-                # 修改CREATE TABLE语句，确保使用正确的字符集
-                sql_content = re.sub(
-                    r'ENGINE\s*=\s*\w+(\s+.*?)?;',
-                    r'ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;',
-                    sql_content,
-                    flags=re.IGNORECASE
-                )
-        
-        # 分割SQL语句并执行
-        statements = sql_content.split(';')
-        for statement in statements:
-            clean_stmt = clean_sql_statement(statement)
-            if clean_stmt:
-                try:
-                    cursor.execute(clean_stmt)
-                except Exception as e:
-                    print(f"执行语句时出错: {e}")
-                    print(f"问题语句: {clean_stmt[:100]}...")
-        
+        cursor.execute(init_db.CREATE_VOCABULARY_VERSIONS)
+        started = time.perf_counter()
+
+        imported = {}
+        table_name = None
+        batch = []
+
+        def write_batch():
+            # executemany 会把 INSERT ... VALUES 改写为多行 VALUES 一次发送
+            if batch:
+                placeholder = storage.backend.placeholder
+                cursor.executemany(f"INSERT INTO {staging} (word, translate) VALUES ({placeholder}, {placeholder})", batch)
+                imported[table_name] = imported.get(table_name, 0) + len(batch)
+                batch.clear()
+
+        for row_table, word, translate in parse_sql_file(file_path):
+            if row_table != table_name:
+                write_batch()
+                if table_name:
+                    _swap_in_table(cursor, table_name, staging)
+                    staging = None
+                table_name = row_table
+                staging = _create_staging_table(cursor, table_name)
+            batch.append((word, translate))
+            if len(batch) >= batch_size:
+                write_batch()
+
+        write_batch()
+        if table_name:
+            _swap_in_table(cursor, table_name, staging)
+            staging = None
         conn.commit()
-        print(f"成功导入SQL文件: {os.path.basename(file_path)}")
-        conn.close()
-        return True
+
+        elapsed = time.perf_counter() - started
+        rows = sum(imported.values())
+        rows_per_sec = rows / elapsed if elapsed > 0 else 0.0
+        print(f"成功导入SQL文件: {file_name}，表: {', '.join(imported)}，{rows} 行，"
+              f"耗时 {elapsed:.2f} 秒，{rows_per_sec:.0f} 行/秒")
+
+        # 与导入脚本在同一进程中的词汇缓存（如基准测试）直接失效；
+        # 运行中的应用由 vocab_cache 的版本检查发现表已被替换
+        for name in imported:
+            vocab_cache.invalidate(name)
+
+        return {"file": file_name, "tables": list(imported), "rows": rows,
+                "seconds": elapsed, "rows_per_sec": rows_per_sec}
     except Exception as e:
         print(f"导入SQL文件 {file_path} 时出错: {e}")
-        return False
+        return None
+    finally:
+        if conn is not None:
+            try:
+                # 出错时回滚未提交的写入，并删除尚未替换旧表的临时表
+                if staging is not None:
+                    conn.rollback()
+                    cleanup = conn.cursor()
+                    cleanup.execute(f"DROP TABLE IF EXISTS {staging}")
+                    conn.commit()
+            except Exception as e:
+                print(f"清理临时表 {staging} 时出错: {e}")
+            finally:
+                conn.close()
+
+def find_sql_files():
+    """获取所有导出的SQL文件"""
+    return sorted(glob.glob(os.path.join(SQL_DIR, "*.sql")))
 
 def main():
     """主函数"""
@@ -119,21 +184,25 @@ def main():
     if not create_database():
         print("无法创建数据库，程序退出")
         return
-    
-    # 获取所有SQL文件
-    sql_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 
-                          "english-vocabulary-master", "乱序sql")
-    sql_files = glob.glob(os.path.join(sql_dir, "*.sql"))
-    
+
+    # 获取所有SQL文件，也可以在命令行中指定
+    sql_files = sys.argv[1:] or find_sql_files()
+
     if not sql_files:
-        print(f"在 {sql_dir} 中未找到SQL文件")
+        print(f"在 {SQL_DIR} 中未找到SQL文件")
         return
-    
-    # 导入所有SQL文件
-    for sql_file in sql_files:
-        import_sql_file(sql_file)
-    
-    print("所有SQL文件导入完成")
+
+    # 并行导入所有SQL文件（SQLite 同一时间只能有一个写事务，逐个导入）
+    workers = IMPORT_WORKERS if storage.backend.parallel_import else 1
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sql_files)))) as executor:
+        results = list(executor.map(import_sql_file, sql_files))
+    elapsed = time.perf_counter() - started
+
+    succeeded = [result for result in results if result]
+    total_rows = sum(result["rows"] for result in succeeded)
+    print(f"所有SQL文件导入完成：{len(succeeded)}/{len(sql_files)} 个文件，共 {total_rows} 行，"
+          f"耗时 {elapsed:.2f} 秒，{total_rows / elapsed if elapsed > 0 else 0:.0f} 行/秒")
 
 if __name__ == "__main__":
     main()
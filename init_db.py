@@ -1,10 +1,15 @@
 import os
 import sys
 from dotenv import load_dotenv
-from sqlalchemy import create_engine, Column, Integer, String, Text, text, DateTime
+from sqlalchemy import event, Column, Integer, String, Text, text, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, scoped_session
 import datetime
+import logging
+import threading
+import storage
+
+logger = logging.getLogger(__name__)
 
 # 加载环境变量
 load_dotenv()
@@ -59,6 +64,7 @@ class LearnedWord(Base):
     __tablename__ = 'learned_words'
     
     id = Column(Integer, primary_key=True)
+    user_id = Column(String(64), nullable=False, default='default')  # 用户标识，见迁移5
     word = Column(String(255), nullable=False)
     translate = Column(Text, nullable=False)
     level = Column(String(50), nullable=True)
@@ -85,32 +91,297 @@ VOCABULARY_TABLES = {
 # 内存模式下的级别
 MEMORY_LEVELS = ['初级', '中级', '高级']
 
+# 未识别出用户的请求（以及迁移5之前的全部学习记录）归属的默认用户
+DEFAULT_USER_ID = 'default'
+# 用户标识的最大长度，与 user_id 字段的定义一致
+USER_ID_MAX_LENGTH = 64
+
+# learned_words 按 user_id 哈希分区的分区数（仅 MySQL），0 表示不分区
+LEARNED_WORDS_PARTITIONS = int(os.getenv('LEARNED_WORDS_PARTITIONS', '0'))
+
+# 各表应当具有的索引，键是索引名，值是 (字段列表, 是否唯一)，由存储后端生成建索引的语句。
+# 值为 None 的索引随建表创建。迁移1添加的这些索引已被迁移5的按用户索引取代
+LEARNED_WORDS_INDEXES = {
+    'PRIMARY': None,
+    'uk_word': ("word", True),
+    'idx_stage': ("learn_stage, id", False),
+    'idx_learn_time': ("learn_time, id", False),
+    'idx_review_count': ("review_count, id", False),
+    'idx_last_review_time': ("last_review_time, id", False)
+}
+
+# 迁移3添加的复习计划字段 (字段名, 定义, 注释) 和索引：每个阶段按到期时间顺序读取
+REVIEW_SCHEDULE_COLUMNS = [
+    ("ease_factor", "FLOAT NOT NULL DEFAULT 2.5", "难度系数"),
+    ("interval_days", "INT NOT NULL DEFAULT 0", "当前复习间隔（天）"),
+    ("repetitions", "INT NOT NULL DEFAULT 0", "连续答对次数"),
+    ("due_time", "DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP", "下次复习时间")
+]
+LEARNED_WORDS_SCHEDULE_INDEXES = {
+    'idx_stage_due': ("learn_stage, due_time, id", False)
+}
+
+# 迁移5添加的用户字段和以 user_id 开头的索引：每个用户的学习记录在索引上连续存放，
+# 按单词查找、按阶段取到期单词和学习记录列表的各种排序都只读取该用户的那一段
+USER_COLUMNS = [
+    ("user_id", f"VARCHAR({USER_ID_MAX_LENGTH}) NOT NULL DEFAULT '{DEFAULT_USER_ID}'", "用户标识")
+]
+LEARNED_WORDS_USER_INDEXES = {
+    'uk_user_word': ("user_id, word", True),
+    'idx_user_stage_due': ("user_id, learn_stage, due_time, id", False),
+    'idx_user_learn_time': ("user_id, learn_time, id", False),
+    'idx_user_review_count': ("user_id, review_count, id", False),
+    'idx_user_last_review_time': ("user_id, last_review_time, id", False)
+}
+
+# 导入的词汇表没有主键，PRIMARY 表示补一个自增的代理主键 id
+VOCABULARY_INDEXES = {
+    'PRIMARY': ("id", True),
+    'idx_word': ("word", False)
+}
+
+# 各词汇表的版本号：导入脚本每次替换一个表时加一，运行中的应用据此发现词汇已被其他进程重新导入
+CREATE_VOCABULARY_VERSIONS = """
+    CREATE TABLE IF NOT EXISTS vocabulary_versions (
+        table_name VARCHAR(64) PRIMARY KEY,
+        version INT NOT NULL DEFAULT 0
+    )
+"""
+
+# 各用户学习统计的版本号：每次改动学习记录或每日统计的事务中加一，
+# 进程内的统计汇总据此发现其他进程（多个 worker）的写入
+CREATE_STATS_VERSIONS = f"""
+    CREATE TABLE IF NOT EXISTS stats_versions (
+        user_id VARCHAR({USER_ID_MAX_LENGTH}) PRIMARY KEY,
+        version INT NOT NULL DEFAULT 0
+    )
+"""
+
 # 全局变量，用于标记是否使用内存模式
 use_in_memory = False
+# 线程作用域的会话注册表，每个请求结束时由 app 调用 session.remove()
 session = None
 engine = None
 
+# 连接池事件计数，用于 /status 中的连接池指标
+pool_counters = {"connections": 0, "checkouts": 0, "peak_checked_out": 0}
+_pool_counters_lock = threading.Lock()
+
+def _env_flag(name, default):
+    """读取布尔型环境变量"""
+    return os.getenv(name, default).strip().lower() in ('1', 'true', 'yes', 'on')
+
+def get_pool_options():
+    """从环境变量读取连接池配置"""
+    return {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', '10')),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', '20')),
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', '3600')),
+        "pool_pre_ping": _env_flag('DB_POOL_PRE_PING', 'true'),
+        "pool_timeout": int(os.getenv('DB_POOL_TIMEOUT', '30'))
+    }
+
+def _on_connect(dbapi_connection, connection_record):
+    """连接池新建物理连接时计数"""
+    with _pool_counters_lock:
+        pool_counters["connections"] += 1
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    """从连接池取出连接时计数并记录峰值"""
+    with _pool_counters_lock:
+        pool_counters["checkouts"] += 1
+        checked_out = engine.pool.checkedout()
+        if checked_out > pool_counters["peak_checked_out"]:
+            pool_counters["peak_checked_out"] = checked_out
+
+def get_pool_status():
+    """返回连接池的当前状态和累计指标"""
+    if engine is None:
+        return None
+    pool = engine.pool
+    options = get_pool_options()
+    with _pool_counters_lock:
+        counters = dict(pool_counters)
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": options["max_overflow"],
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+        "connections_created": counters["connections"],
+        "total_checkouts": counters["checkouts"],
+        "peak_checked_out": counters["peak_checked_out"]
+    }
+
+def get_existing_indexes(db_session, table_name):
+    """查询表上已有的索引名"""
+    return storage.backend.get_existing_indexes(db_session, table_name)
+
+def table_exists(db_session, table_name):
+    """检查表是否存在"""
+    return storage.backend.table_exists(db_session, table_name)
+
+def missing_index_statements(table_name, indexes, existing_indexes):
+    """返回为表补齐 indexes 中尚不存在的索引所需的语句"""
+    missing = {name: index for name, index in indexes.items() if index and name not in existing_indexes}
+    return storage.backend.index_statements(table_name, missing)
+
+def execute_statements(db_session, statements):
+    """依次执行存储后端生成的语句"""
+    for statement in statements:
+        db_session.execute(text(statement))
+
+def _migrate_learned_words_indexes(db_session):
+    """迁移1：合并重复单词，为 learned_words 添加唯一键和排序索引"""
+    # 添加唯一键之前先把重复的单词合并到最早的那条记录上
+    execute_statements(db_session, storage.backend.MERGE_DUPLICATE_WORDS)
+    
+    existing = get_existing_indexes(db_session, 'learned_words')
+    execute_statements(db_session, missing_index_statements('learned_words', LEARNED_WORDS_INDEXES, existing))
+
+def _migrate_vocabulary_keys(db_session):
+    """迁移2：为导入的词汇表添加代理主键和单词索引"""
+    for table_name in VOCABULARY_TABLES.keys():
+        # 尚未导入的表由导入脚本在建表后补齐
+        if not table_exists(db_session, table_name):
+            continue
+        existing = get_existing_indexes(db_session, table_name)
+        execute_statements(db_session, missing_index_statements(table_name, VOCABULARY_INDEXES, existing))
+
+def _migrate_review_schedule(db_session):
+    """迁移3：为 learned_words 添加间隔重复的复习计划字段和到期时间索引"""
+    # 已有的记录全部视为立即到期
+    execute_statements(db_session, storage.backend.add_column_statements('learned_words', REVIEW_SCHEDULE_COLUMNS))
+    existing = get_existing_indexes(db_session, 'learned_words')
+    execute_statements(db_session, missing_index_statements('learned_words', LEARNED_WORDS_SCHEDULE_INDEXES, existing))
+
+def _migrate_daily_stats(db_session):
+    """迁移4：按天累计复习次数和作答结果的统计表"""
+    db_session.execute(text("""
+        CREATE TABLE IF NOT EXISTS daily_stats (
+            day DATE NOT NULL,
+            metric VARCHAR(32) NOT NULL,
+            value INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, metric)
+        )
+    """))
+
+def _migrate_user_partitioning(db_session):
+    """迁移5：learned_words 和 daily_stats 增加用户维度，索引改为以 user_id 开头"""
+    backend = storage.backend
+    # 已有的学习记录归默认用户
+    execute_statements(db_session, backend.add_column_statements('learned_words', USER_COLUMNS))
+    existing = get_existing_indexes(db_session, 'learned_words')
+    # 先建 (user_id, word) 唯一键再删除 word 上的唯一键，迁移过程中单词始终不会重复
+    execute_statements(db_session, missing_index_statements('learned_words', LEARNED_WORDS_USER_INDEXES, existing))
+    superseded = [name for name in list(LEARNED_WORDS_INDEXES) + list(LEARNED_WORDS_SCHEDULE_INDEXES)
+                  if name != 'PRIMARY' and name in existing]
+    execute_statements(db_session, backend.drop_index_statements('learned_words', superseded))
+
+    # daily_stats 的主键改为 (user_id, day, metric)：主键无法通用地修改，建新表复制数据后替换
+    db_session.execute(text("DROP TABLE IF EXISTS daily_stats_by_user"))
+    db_session.execute(text(f"""
+        CREATE TABLE daily_stats_by_user (
+            user_id VARCHAR({USER_ID_MAX_LENGTH}) NOT NULL,
+            day DATE NOT NULL,
+            metric VARCHAR(32) NOT NULL,
+            value INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, metric)
+        )
+    """))
+    db_session.execute(text("""
+        INSERT INTO daily_stats_by_user (user_id, day, metric, value)
+        SELECT :user_id, day, metric, value FROM daily_stats
+    """), {"user_id": DEFAULT_USER_ID})
+    db_session.execute(text("DROP TABLE daily_stats"))
+    db_session.execute(text("ALTER TABLE daily_stats_by_user RENAME TO daily_stats"))
+
+def _migrate_vocabulary_versions(db_session):
+    """迁移6：词汇表版本号表，导入脚本替换词汇表时更新"""
+    db_session.execute(text(CREATE_VOCABULARY_VERSIONS))
+
+def _migrate_stats_versions(db_session):
+    """迁移7：用户统计版本号表，改动学习记录和每日统计时更新"""
+    db_session.execute(text(CREATE_STATS_VERSIONS))
+
+# 数据库结构迁移：(版本号, 说明, 迁移函数)，按版本号顺序执行且只执行一次
+SCHEMA_MIGRATIONS = [
+    (1, "learned_words 唯一键及排序索引", _migrate_learned_words_indexes),
+    (2, "词汇表代理主键及单词索引", _migrate_vocabulary_keys),
+    (3, "learned_words 复习计划字段及到期时间索引", _migrate_review_schedule),
+    (4, "每日统计表 daily_stats", _migrate_daily_stats),
+    (5, "learned_words 和 daily_stats 按用户划分及按用户索引", _migrate_user_partitioning),
+    (6, "词汇表版本号表 vocabulary_versions", _migrate_vocabulary_versions),
+    (7, "用户统计版本号表 stats_versions", _migrate_stats_versions)
+]
+
+def run_migrations(db_session):
+    """执行尚未应用的结构迁移"""
+    db_session.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_time DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """))
+    applied = {row[0] for row in db_session.execute(text("SELECT version FROM schema_migrations")).fetchall()}
+    
+    for version, description, migrate in SCHEMA_MIGRATIONS:
+        if version in applied:
+            continue
+        logger.info("正在执行数据库迁移 %s: %s", version, description)
+        migrate(db_session)
+        db_session.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+            {"version": version, "description": description}
+        )
+        db_session.commit()
+        logger.info("数据库迁移 %s 已完成", version)
+
+def apply_partitioning(db_session):
+    """按 LEARNED_WORDS_PARTITIONS 把 learned_words 按 user_id 哈希分区（分区数已一致时不做任何操作）"""
+    if LEARNED_WORDS_PARTITIONS <= 0:
+        return
+    backend = storage.backend
+    if not backend.supports_partitioning:
+        logger.warning("%s 不支持表分区，忽略 LEARNED_WORDS_PARTITIONS", backend.label)
+        return
+    statements = backend.partition_statements(db_session, 'learned_words', 'user_id', LEARNED_WORDS_PARTITIONS)
+    if not statements:
+        return
+    logger.info("正在把 learned_words 按 user_id 划分为 %s 个分区...", LEARNED_WORDS_PARTITIONS)
+    execute_statements(db_session, statements)
+    db_session.commit()
+    logger.info("learned_words 分区完成")
+
+def check_indexes(db_session):
+    """检查各表缺少的索引，返回 {表名: [缺少的索引名]}"""
+    expected = {'learned_words': ['PRIMARY'] + list(LEARNED_WORDS_USER_INDEXES.keys())}
+    for table_name in VOCABULARY_TABLES.keys():
+        expected[table_name] = list(VOCABULARY_INDEXES.keys())
+    
+    missing = {}
+    for table_name, index_names in expected.items():
+        existing = get_existing_indexes(db_session, table_name)
+        absent = [name for name in index_names if name not in existing]
+        if absent:
+            missing[table_name] = absent
+    return missing
+
 def init_database():
     """初始化数据库连接和表结构"""
     global use_in_memory, session, engine
     
-    # 获取数据库连接参数
-    mysql_host = os.getenv('MYSQL_HOST', 'localhost')
-    mysql_port = os.getenv('MYSQL_PORT', '3306')
-    mysql_user = os.getenv('MYSQL_USER', 'root')
-    mysql_password = os.getenv('MYSQL_PASSWORD', '')
-    mysql_db = os.getenv('MYSQL_DB', 'english_practice')
-    
-    # 构建数据库连接URL
-    db_url = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}:{mysql_port}/{mysql_db}"
+    backend = storage.backend
     
     try:
-        # 创建数据库引擎
-        engine = create_engine(db_url, echo=False)
+        # 由存储后端（DB_BACKEND）创建带连接池的数据库引擎
+        engine = backend.create_engine(get_pool_options())
+        event.listen(engine, 'connect', _on_connect)
+        event.listen(engine, 'checkout', _on_checkout)
         
-        # 创建会话
-        Session = sessionmaker(bind=engine)
-        session = Session()
+        # 创建线程作用域的会话，每个线程（请求）使用独立的会话
+        session = scoped_session(sessionmaker(bind=engine))
         
         # 测试连接
         session.execute(text("SELECT 1"))
@@ -120,59 +391,58 @@ def init_database():
             try:
                 count_query = text(f"SELECT COUNT(*) FROM {table_name}")
                 result = session.execute(count_query).scalar()
-                print(f"找到词汇表: {table_name}，包含 {result} 个单词")
+                logger.info("找到词汇表: %s，包含 %s 个单词", table_name, result)
             except Exception as e:
-                print(f"词汇表 {table_name} 不存在或无法访问: {e}")
-                print(f"请确保已导入SQL文件并创建了表 {table_name}")
+                logger.error("词汇表 %s 不存在或无法访问: %s", table_name, e)
+                logger.error("请确保已导入SQL文件并创建了表 %s", table_name)
         
         # 检查学习记录表是否存在
         try:
             count_query = text("SELECT COUNT(*) FROM learned_words")
             result = session.execute(count_query).scalar()
-            print(f"找到学习记录表: learned_words，包含 {result} 条记录")
+            logger.info("找到学习记录表: learned_words，包含 %s 条记录", result)
             
             # 检查learn_stage字段是否存在
             try:
                 session.execute(text("SELECT learn_stage FROM learned_words LIMIT 1"))
-                print("学习记录表已包含learn_stage字段")
+                logger.info("学习记录表已包含learn_stage字段")
             except Exception as e:
-                print("学习记录表缺少learn_stage字段，正在添加...")
-                session.execute(text("""
-                    ALTER TABLE learned_words 
-                    ADD COLUMN learn_stage INT DEFAULT 1 
-                    COMMENT '学习阶段：1=认识，2=填空，3=盲打，4=复习完成'
-                """))
+                logger.info("学习记录表缺少learn_stage字段，正在添加...")
+                execute_statements(session, backend.add_column_statements('learned_words', [
+                    ("learn_stage", "INT DEFAULT 1", "学习阶段：1=认识，2=填空，3=盲打，4=复习完成")
+                ]))
                 session.commit()
-                print("已添加learn_stage字段到学习记录表")
+                logger.info("已添加learn_stage字段到学习记录表")
                 
         except Exception as e:
-            print("学习记录表不存在，正在创建...")
+            logger.info("学习记录表不存在，正在创建...")
             # 创建学习记录表
-            session.execute(text("""
-                CREATE TABLE IF NOT EXISTS learned_words (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    word VARCHAR(255) NOT NULL,
-                    translate TEXT NOT NULL,
-                    level VARCHAR(50),
-                    source_table VARCHAR(50),
-                    learn_time DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    review_count INT DEFAULT 0,
-                    last_review_time DATETIME NULL,
-                    learn_stage INT DEFAULT 1 COMMENT '学习阶段：1=认识，2=填空，3=盲打，4=复习完成'
-                )
-            """))
+            session.execute(text(backend.CREATE_LEARNED_WORDS))
             session.commit()
-            print("已创建学习记录表 learned_words")
+            logger.info("已创建学习记录表 learned_words")
+        
+        # 执行结构迁移并报告缺少的索引
+        run_migrations(session)
+        apply_partitioning(session)
+        missing_indexes = check_indexes(session)
+        for table_name, index_names in missing_indexes.items():
+            logger.warning("表 %s 缺少索引: %s", table_name, ', '.join(index_names))
         
-        print("成功连接到MySQL数据库")
+        logger.info("成功连接到%s数据库: %s", backend.label, backend.database_name())
         return True
         
     except Exception as e:
-        print(f"连接到MySQL数据库失败: {e}")
-        print("请确保MySQL数据库已启动并且配置正确")
+        logger.error("连接到%s数据库失败: %s", backend.label, e)
+        logger.error("请确保%s数据库已启动并且配置正确", backend.label)
+        # 连接失败时不保留会话，学习记录接口将以只读模式返回
+        if session is not None:
+            session.remove()
+        session = None
+        engine = None
         return False
     finally:
-        session.close()
+        if session is not None:
+            session.remove()
 
 # 如果直接运行此文件，则初始化数据库
 if __name__ == "__main__":
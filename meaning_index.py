@@ -0,0 +1,132 @@
+import array
+import heapq
+import logging
+import threading
+import vocab_cache
+from translate_parser import split_senses
+
+logger = logging.getLogger(__name__)
+
+# 命中方式对应的得分：整个义项相同 > 义项以查询开头 > 释义中包含查询
+SCORE_EXACT_SENSE = 3
+SCORE_SENSE_PREFIX = 2
+SCORE_SUBSTRING = 1
+
+
+def _grams(value):
+    """字符一元组和二元组（CJK 文本没有空格分词，用 n-gram 建立倒排）"""
+    value = value.lower()
+    grams = set(value)
+    grams.update(value[i:i + 2] for i in range(len(value) - 1))
+    return grams
+
+
+class TableMeaningIndex:
+    """单个词汇表的释义倒排索引"""
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        senses = {}
+        prefixes = {}
+        grams = {}
+        for row in range(len(vocabulary)):
+            meaning = vocabulary.meaning(row)
+            for _, sense in split_senses(meaning):
+                sense = sense.lower()
+                senses.setdefault(sense, []).append(row)
+                prefixes.setdefault(sense[:1], []).append(row)
+                if len(sense) > 1:
+                    prefixes.setdefault(sense[:2], []).append(row)
+            for gram in _grams(meaning):
+                grams.setdefault(gram, []).append(row)
+        # 倒排表用紧凑的无符号整数数组保存，行号有序且不重复
+        self.senses = {key: array.array("I", sorted(set(rows))) for key, rows in senses.items()}
+        self.prefixes = {key: array.array("I", sorted(set(rows))) for key, rows in prefixes.items()}
+        self.grams = {key: array.array("I", rows) for key, rows in grams.items()}
+
+    def _candidates(self, query):
+        """用 n-gram 倒排表求交集，得到可能包含查询的行"""
+        if len(query) <= 2:
+            return set(self.grams.get(query, ()))
+        bigrams = [query[i:i + 2] for i in range(len(query) - 1)]
+        postings = []
+        for gram in bigrams:
+            rows = self.grams.get(gram)
+            if not rows:
+                return set()
+            postings.append(rows)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for rows in postings[1:]:
+            candidates.intersection_update(rows)
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query):
+        """返回 {行号: 得分}，query 须已转为小写"""
+        results = dict.fromkeys(self._candidates(query), SCORE_SUBSTRING)
+        if len(query) <= 2:
+            # 一、二个字的查询直接由倒排表得到精确结果，不需要逐行解码释义
+            for row in self.prefixes.get(query, ()):
+                results[row] = SCORE_SENSE_PREFIX
+        else:
+            for row in list(results):
+                meaning = self.vocabulary.meaning(row)
+                if query not in meaning.lower():
+                    del results[row]
+                elif any(sense.lower().startswith(query) for _, sense in split_senses(meaning)):
+                    results[row] = SCORE_SENSE_PREFIX
+        for row in self.senses.get(query, ()):
+            results[row] = SCORE_EXACT_SENSE
+        return results
+
+
+# 每个表的索引；对应的 LevelVocabulary 被替换（重新导入、缓存失效）时自动重建该表
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_table_index(table_name):
+    """获取某个表的释义索引，词汇变化时只重建这一个表"""
+    vocabulary = vocab_cache.get_level(table_name)
+    index = _indexes.get(table_name)
+    if index is not None and index.vocabulary is vocabulary:
+        return index
+    with _lock:
+        index = _indexes.get(table_name)
+        if index is None or index.vocabulary is not vocabulary:
+            index = TableMeaningIndex(vocabulary)
+            _indexes[table_name] = index
+            logger.info("已建立释义索引: %s，%s 个义项，%s 个字词片段", table_name, len(index.senses), len(index.grams))
+    return index
+
+
+def build_all():
+    """启动时为所有可用的表建立索引"""
+    for table_name in vocab_cache.available_tables():
+        try:
+            get_table_index(table_name)
+        except Exception as e:
+            logger.error("建立释义索引 %s 时出错: %s", table_name, e)
+
+
+# 词汇表被其他进程重新导入后，vocab_cache 的后台检查线程换上新词汇时立即重建该表的索引，
+# 不必等到下一次查询时在请求中重建
+vocab_cache.add_reload_listener(get_table_index)
+
+
+def search(meaning, tables, limit=10):
+    """在若干表中按释义查找，返回按相关度排序的 [(得分, 表名, 行号)]
+
+    同分时释义越短越靠前（越可能是该词的主要意思），再按表的顺序。
+    """
+    query = (meaning or "").strip().lower()
+    if not query:
+        return []
+    ranked = []
+    for table_order, table_name in enumerate(tables):
+        index = get_table_index(table_name)
+        for row, score in index.search(query).items():
+            ranked.append((-score, index.vocabulary.meaning_size(row), table_order, row, table_name))
+    return [(-neg_score, table_name, row) for neg_score, _, _, row, table_name in heapq.nsmallest(limit, ranked)]
@@ -0,0 +1,225 @@
+import os
+import time
+import bisect
+import logging
+import threading
+import collections
+from flask import request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# 是否记录请求和查询指标
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+# 超过该耗时（毫秒）的SQL语句记为慢查询，保留最近 SLOW_QUERY_SAMPLES 条
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_SAMPLES = int(os.getenv("SLOW_QUERY_SAMPLES", "50"))
+# 慢查询样本中语句和参数保留的最大长度
+SAMPLE_TEXT_LIMIT = 500
+
+# 延迟直方图的桶上界（毫秒），最后一个桶收纳更慢的请求
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# 每个请求执行的查询条数的桶上界
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """固定分桶的直方图，记录计数、总和和最大值"""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        """按桶估算分位数，返回所在桶的上界（落在最后一个桶时返回最大值）"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self):
+        buckets = {f"le_{bound}": count for bound, count in zip(self.bounds, self.counts)}
+        buckets["inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else None,
+            "max": round(self.max, 3),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets
+        }
+
+
+class RouteMetrics:
+    """单个路由的累计指标"""
+
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.query_time_ms = 0.0
+        self.statuses = collections.Counter()
+        self.errors = 0
+
+    def to_dict(self):
+        return {
+            "requests": self.latency_ms.count,
+            "errors": self.errors,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items())},
+            "latency_ms": self.latency_ms.to_dict(),
+            "queries_per_request": self.queries.to_dict(),
+            "query_time_ms": round(self.query_time_ms, 3)
+        }
+
+
+class RequestState:
+    """当前请求执行期间累计的查询次数和耗时"""
+
+    __slots__ = ("route", "started", "status", "queries", "query_time_ms")
+
+    def __init__(self, route):
+        self.route = route
+        self.started = time.perf_counter()
+        self.status = None
+        self.queries = 0
+        self.query_time_ms = 0.0
+
+
+_lock = threading.Lock()
+_routes = collections.defaultdict(RouteMetrics)
+_slow_queries = collections.deque(maxlen=SLOW_QUERY_SAMPLES)
+# 不在请求中执行的查询（如延迟写入的后台线程）
+_background = {"queries": 0, "query_time_ms": 0.0}
+_started_at = time.time()
+# 每个线程同时只处理一个请求，请求状态放在线程局部变量中，SQLAlchemy 事件在同一线程触发
+_local = threading.local()
+
+
+def _route_name():
+    """路由的统计键：方法加URL规则，未匹配的请求归为一类，避免按原始路径无限增长"""
+    rule = request.url_rule.rule if request.url_rule is not None else "<unmatched>"
+    return f"{request.method} {rule}"
+
+
+def _before_request():
+    _local.request = RequestState(_route_name())
+
+
+def _after_request(response):
+    state = getattr(_local, "request", None)
+    if state is not None:
+        state.status = response.status_code
+    return response
+
+
+def _teardown_request(exception=None):
+    # 流式响应在内容发送完以后才会调用 teardown，因此耗时包含整个响应
+    state = getattr(_local, "request", None)
+    if state is None:
+        return
+    _local.request = None
+    elapsed_ms = (time.perf_counter() - state.started) * 1000
+    with _lock:
+        route = _routes[state.route]
+        route.latency_ms.observe(elapsed_ms)
+        route.queries.observe(state.queries)
+        route.query_time_ms += state.query_time_ms
+        status = state.status or (500 if exception is not None else 200)
+        route.statuses[status] += 1
+        if exception is not None or status >= 500:
+            route.errors += 1
+    logger.debug("%s 耗时 %.1f ms，%d 条查询共 %.1f ms",
+                 state.route, elapsed_ms, state.queries, state.query_time_ms)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    state = getattr(_local, "request", None)
+    if state is not None:
+        state.queries += 1
+        state.query_time_ms += elapsed_ms
+    else:
+        with _lock:
+            _background["queries"] += 1
+            _background["query_time_ms"] += elapsed_ms
+    if elapsed_ms >= SLOW_QUERY_MS:
+        sample = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "duration_ms": round(elapsed_ms, 3),
+            "route": state.route if state is not None else None,
+            "statement": " ".join(statement.split())[:SAMPLE_TEXT_LIMIT],
+            "parameters": repr(parameters)[:SAMPLE_TEXT_LIMIT],
+            "executemany": executemany
+        }
+        with _lock:
+            _slow_queries.append(sample)
+        logger.warning("慢查询 %.1f ms: %s", elapsed_ms, sample["statement"])
+
+
+def _handle_error(exception_context):
+    # 语句执行失败时不会触发 after_cursor_execute，需要丢弃对应的开始时间
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def init_app(app):
+    """为应用注册请求计时，并为所有数据库引擎注册查询计时"""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    # 在 Engine 类上注册，对之后 init_database 创建的引擎同样生效
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
+
+
+def snapshot():
+    """返回各路由的延迟直方图、每请求查询次数和耗时，以及最近的慢查询"""
+    with _lock:
+        return {
+            "enabled": METRICS_ENABLED,
+            "uptime_seconds": round(time.time() - _started_at, 1),
+            "slow_query_ms": SLOW_QUERY_MS,
+            "routes": {name: route.to_dict() for name, route in sorted(_routes.items())},
+            "background_queries": {
+                "queries": _background["queries"],
+                "query_time_ms": round(_background["query_time_ms"], 3)
+            },
+            "slow_queries": list(_slow_queries)
+        }
+
+
+def reset():
+    """清空已累计的指标"""
+    global _started_at
+    with _lock:
+        _routes.clear()
+        _slow_queries.clear()
+        _background["queries"] = 0
+        _background["query_time_ms"] = 0.0
+        _started_at = time.time()
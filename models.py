@@ -1,33 +1,174 @@
 import random
 import os
-import collections
+import json
+import base64
+import time
 import datetime
+import logging
+import threading
 from dotenv import load_dotenv
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 import init_db
-from init_db import in_memory_words, VOCABULARY_TABLES, MEMORY_LEVELS, LearnedWord
+import vocab_cache
+import meaning_index
+import word_index
+import attribute_index
+import distractor_index
+import progress_writer
+import scheduler
+import progress_stats
+import storage
+from deck_sampler import ShuffledDeck
+from init_db import in_memory_words, VOCABULARY_TABLES, MEMORY_LEVELS, DEFAULT_USER_ID
+
+logger = logging.getLogger(__name__)
 
 # 加载环境变量
 load_dotenv()
 
-# 用于记录最近显示过的单词，避免短期内重复
-recent_words = collections.deque(maxlen=50)
+# 进程级的默认牌堆状态，键是表名，值是 [seed, cursor, size]
+default_decks = {}
 # 记录每个级别的单词总数（用于内存模式）
 level_word_counts = {}
-# 记录每个表的单词总数（用于数据库模式）
-table_word_counts = {}
+
+# 缓存的学习记录条数最多保留多少秒，过期后重新 COUNT（其他进程的写入在此之后可见）
+LEARNED_WORD_TOTAL_TTL = float(os.getenv("LEARNED_WORD_TOTAL_TTL", "10"))
+
+# 第一阶段选取新单词时最多从牌堆中抽几轮（已学过的单词会被跳过）
+NEW_WORD_DRAWS = 3
+
+# 最高的学习阶段（4=复习完成）
+MAX_STAGE = 4
+
+
+def valid_stage(stage):
+    """学习阶段是否为 1 到 MAX_STAGE 之间的整数"""
+    return isinstance(stage, int) and not isinstance(stage, bool) and 1 <= stage <= MAX_STAGE
+
+# 学习阶段无效时的返回值
+INVALID_STAGE_RESULT = {"success": False, "message": f"无效的学习阶段，应为 1 到 {MAX_STAGE} 之间的整数"}
+
+# 只读部署（仅加载词汇快照、未连接学习记录数据库）时学习记录相关接口的返回值
+READ_ONLY_RESULT = {"success": False, "message": "当前为只读模式，未连接学习记录数据库"}
+
+def progress_store_ready():
+    """学习记录数据库是否可用"""
+    return init_db.session is not None
+
+# 学习记录列表允许的排序字段；每个字段都有 (user_id, 字段, id) 索引（见 init_db 迁移5），id 作为同值时的次序
+LEARNED_WORD_SORT_COLUMNS = ("learn_time", "review_count", "last_review_time", "word")
+DATETIME_SORT_COLUMNS = ("learn_time", "last_review_time")
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LEARNED_WORD_COLUMNS = """id, word, translate, level, source_table,
+                       learn_time, review_count, last_review_time, learn_stage"""
+
+def learned_word_dict(row):
+    """把 learned_words 的一行转换为接口返回的字典"""
+    return {
+        "id": row[0],
+        "word": row[1],
+        "meaning": row[2],
+        "level": row[3],
+        "source_table": row[4],
+        "learn_time": row[5].strftime(DATETIME_FORMAT) if row[5] else None,
+        "review_count": row[6],
+        "last_review_time": row[7].strftime(DATETIME_FORMAT) if row[7] else None,
+        "learn_stage": row[8]
+    }
+
+def encode_cursor(sort_column, word):
+    """用一页最后一条记录的 (排序值, id) 生成下一页的游标"""
+    payload = json.dumps([word[sort_column], word["id"]], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(sort_column, cursor):
+    """解析游标，返回 (排序值, id)；格式不对时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        value, last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if sort_column in DATETIME_SORT_COLUMNS and value is not None:
+            value = datetime.datetime.strptime(value, DATETIME_FORMAT)
+        return value, int(last_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+def keyset_condition(sort_column, order_direction, value):
+    """游标之后的记录的 WHERE 条件
+
+    与 ORDER BY 字段, id 的次序一致；MySQL 和 SQLite 中 NULL 都在升序时排最前、降序时排最后。
+    """
+    if order_direction == "ASC":
+        if value is None:
+            return f"(({sort_column} IS NULL AND id > :cursor_id) OR {sort_column} IS NOT NULL)"
+        return f"({sort_column} > :cursor_value OR ({sort_column} = :cursor_value AND id > :cursor_id))"
+    if value is None:
+        return f"({sort_column} IS NULL AND id < :cursor_id)"
+    return (f"({sort_column} < :cursor_value OR ({sort_column} = :cursor_value AND id < :cursor_id)"
+            f" OR {sort_column} IS NULL)")
+
+class LearnedWordCounter:
+    """每个用户的学习记录条数的缓存
+
+    某个用户第一次使用时按 user_id 索引执行一次 COUNT(*)，之后随提交成功的插入、删除增减，不再每页都统计。
+    计数只在本进程内维护，其他进程（多个 worker、导入脚本）的写入看不到，所以最多保留 ttl 秒，过期后重新统计。
+    批量写入无法区分插入和更新时直接作废，下次读取时重新统计。
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # user_id -> [计数, 过期时间]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self._values.get(user_id)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        value = init_db.session.execute(
+            text("SELECT COUNT(*) FROM learned_words WHERE user_id = :user_id"), {"user_id": user_id}).scalar()
+        self.set(user_id, value)
+        return value
+
+    def add(self, user_id, delta):
+        with self._lock:
+            entry = self._values.get(user_id)
+            if entry is not None:
+                entry[0] += delta
+
+    def set(self, user_id, value):
+        with self._lock:
+            self._values[user_id] = [value, time.monotonic() + self.ttl]
+
+    def invalidate(self, user_id=None):
+        """作废该用户（未指定时为所有用户）的计数"""
+        with self._lock:
+            if user_id is None:
+                self._values.clear()
+            else:
+                self._values.pop(user_id, None)
+
+learned_word_total = LearnedWordCounter(LEARNED_WORD_TOTAL_TTL)
+
+def _on_flush(result):
+    for user_id, counts in result["users"].items():
+        learned_word_total.add(user_id, counts["inserted"])
+
+progress_writer.flush_listeners.append(_on_flush)
+progress_writer.flush_listeners.append(progress_stats.on_flush)
 
 class WordModel:
     @staticmethod
     def get_available_levels():
         """获取可用的单词级别"""
         if init_db.use_in_memory:
-            return MEMORY_LEVELS
+            # 快照模式：只返回快照中包含的级别
+            return [VOCABULARY_TABLES[table] for table in vocab_cache.available_tables()]
         else:
             try:
                 return list(VOCABULARY_TABLES.values())
             except Exception as e:
-                print(f"获取单词级别时出错: {e}")
+                logger.error("获取单词级别时出错: %s", e)
                 return []
     
     @staticmethod
@@ -41,191 +182,187 @@ class WordModel:
         return level_word_counts
     
     @staticmethod
-    def _count_words_by_table():
-        """统计每个表的单词数量（数据库模式）"""
-        global table_word_counts
-        if not table_word_counts:
-            table_word_counts = {}
-            try:
-                for table_name in VOCABULARY_TABLES.keys():
-                    count_query = text(f"SELECT COUNT(*) FROM {table_name}")
-                    count = init_db.session.execute(count_query).scalar()
-                    table_word_counts[table_name] = count
-            except Exception as e:
-                print(f"统计表单词数量时出错: {e}")
-        return table_word_counts
+    def _tables_for_level(level=None):
+        """根据中文级别名称确定要查询的表，不指定级别时返回所有可用的表"""
+        tables = vocab_cache.available_tables()
+        if level:
+            return [table for table in tables if VOCABULARY_TABLES.get(table) == level]
+        return tables
     
     @staticmethod
-    def get_random_word(level=None):
-        """获取随机单词，可以指定级别，避免短期内重复"""
-        global recent_words
+    def _draw_word(level=None, deck_state=None):
+        """从指定级别（不指定时随机选一个表）的牌堆中抽一个单词，返回 (LevelVocabulary, 行号)，没有单词时返回 (None, None)"""
+        # 确定要查询的表
+        table_name = None
+        if level:
+            # 根据中文级别名称找到对应的表名
+            for table, level_name in VOCABULARY_TABLES.items():
+                if level_name == level:
+                    table_name = table
+                    break
         
-        if init_db.use_in_memory:
-            # 由于我们已经注释掉了回退逻辑，这部分代码不应该被执行
-            print("错误：系统被配置为只使用MySQL数据库，但尝试使用内存模式")
-            return None
-        else:
-            try:
-                # 确定要查询的表
-                table_name = None
-                if level:
-                    # 根据中文级别名称找到对应的表名
-                    for table, level_name in VOCABULARY_TABLES.items():
-                        if level_name == level:
-                            table_name = table
-                            break
-                
-                if not table_name:
-                    # 如果没有指定级别或找不到对应的表，随机选择一个表
-                    table_name = random.choice(list(VOCABULARY_TABLES.keys()))
-                
-                # 获取表中的记录数
-                table_counts = WordModel._count_words_by_table()
-                count = table_counts.get(table_name, 0)
-                
-                if count == 0:
-                    count_query = text(f"SELECT COUNT(*) FROM {table_name}")
-                    count = init_db.session.execute(count_query).scalar()
-                    table_counts[table_name] = count
-                
-                if count == 0:
-                    return None
-                
-                # 如果最近显示的单词数量已经接近该表的总单词数，清空记录
-                if len(recent_words) > count * 0.7:
-                    recent_words.clear()
-                    print(f"已重置单词记录，当前表: {table_name}，总单词数: {count}")
-                
-                # 尝试最多20次获取未在最近显示过的单词
-                for _ in range(min(20, count)):
-                    # 使用ORDER BY RAND()方法获取真正随机的单词
-                    word_query = text(f"SELECT word, translate as meaning FROM {table_name} ORDER BY RAND() LIMIT 1")
-                    result = init_db.session.execute(word_query).fetchone()
-                    
-                    if result and result[0] not in recent_words:
-                        # 将结果转换为字典
-                        word_dict = {
-                            "word": result[0],
-                            "meaning": result[1],
-                            "level": VOCABULARY_TABLES.get(table_name, "未知"),
-                            "source_table": table_name
-                        }
-                        recent_words.append(result[0])
-                        print(f"获取到新单词(SQL): {result[0]}，当前记录数: {len(recent_words)}")
-                        return word_dict
-                
-                # 如果多次尝试都失败，重置记录并再次尝试
-                recent_words.clear()
-                
-                # 再次随机获取一个单词
-                word_query = text(f"SELECT word, translate as meaning FROM {table_name} ORDER BY RAND() LIMIT 1")
-                result = init_db.session.execute(word_query).fetchone()
-                
-                if result:
-                    # 将结果转换为字典
-                    word_dict = {
-                        "word": result[0],
-                        "meaning": result[1],
-                        "level": VOCABULARY_TABLES.get(table_name, "未知"),
-                        "source_table": table_name
-                    }
-                    recent_words.append(result[0])
-                    print(f"重置记录后获取到单词(SQL): {result[0]}")
-                    return word_dict
-                return None
-            except Exception as e:
-                print(f"获取随机单词时出错: {e}")
+        if not table_name:
+            # 如果没有指定级别或找不到对应的表，随机选择一个表
+            table_name = random.choice(vocab_cache.available_tables())
+        
+        # 从内存缓存（或快照）中取词，不再每次执行 ORDER BY RAND()
+        vocabulary = vocab_cache.get_level(table_name)
+        if len(vocabulary) == 0:
+            return None, None
+        
+        # 从该表的牌堆中抽一张，抽完一轮前不会重复
+        if deck_state is None:
+            deck_state = default_decks
+        deck = ShuffledDeck.from_state(deck_state.get(table_name), len(vocabulary))
+        index = deck.draw()
+        deck_state[table_name] = deck.state()
+        logger.debug("获取到新单词(缓存): %s，本轮剩余: %s", vocabulary.word(index), deck.remaining())
+        return vocabulary, index
+    
+    @staticmethod
+    def _sample_words(level, count, pos=None, min_length=None, max_length=None):
+        """按词性和长度筛选后均匀随机地取至多 count 个不同的单词（走属性位图索引，不使用牌堆）"""
+        tables = WordModel._tables_for_level(level) or vocab_cache.available_tables()
+        return [vocab_cache.get_level(table_name).get(row)
+                for table_name, row in attribute_index.sample(tables, count, pos, min_length, max_length)]
+    
+    @staticmethod
+    def get_random_word(level=None, deck_state=None, pos=None, min_length=None, max_length=None):
+        """获取随机单词，可以指定级别
+
+        deck_state 是保存每个表洗牌状态的字典（通常来自用户会话），
+        同一副牌抽完之前不会重复；不传时使用进程级的默认牌堆。
+        指定词性列表 pos 或长度范围时从符合条件的单词中均匀随机选取（可能重复），没有符合条件的单词时返回 None。
+        """
+        try:
+            if pos or min_length is not None or max_length is not None:
+                words = WordModel._sample_words(level, 1, pos, min_length, max_length)
+                return words[0] if words else None
+            vocabulary, index = WordModel._draw_word(level, deck_state)
+            if vocabulary is None:
                 return None
+            return vocabulary.get(index)
+        except Exception as e:
+            logger.error("获取随机单词时出错: %s", e)
+            return None
     
     @staticmethod
-    def get_word_by_text(word_text, level=None):
-        """根据单词文本获取单词"""
-        if init_db.use_in_memory:
-            # 由于我们已经注释掉了回退逻辑，这部分代码不应该被执行
-            print("错误：系统被配置为只使用MySQL数据库，但尝试使用内存模式")
+    def get_multiple_choice(level=None, direction="word", deck_state=None, options=4):
+        """出一道多选题：direction 为 word 时给出单词、从 options 个中文释义中选择，为 meaning 时反过来
+
+        干扰项来自预先建立的干扰项索引（同一级别中拼写相近、词性相同的单词），一次按行号读取；
+        返回题干、选项、正确选项的下标和单词本身（word），没有单词时返回 None。
+        """
+        try:
+            vocabulary, index = WordModel._draw_word(level, deck_state)
+            if vocabulary is None:
+                return None
+            rows = [index] + distractor_index.choose(vocabulary, index, options - 1)
+            random.shuffle(rows)
+            if direction == "meaning":
+                prompt, choices = vocabulary.meaning(index), [vocabulary.word(row) for row in rows]
+            else:
+                prompt, choices = vocabulary.word(index), [vocabulary.meaning(row) for row in rows]
+            return {
+                "direction": direction,
+                "prompt": prompt,
+                "options": choices,
+                "answer": rows.index(index),
+                "word": vocabulary.get(index),
+                "level": vocabulary.level,
+                "source_table": vocabulary.table_name
+            }
+        except Exception as e:
+            logger.error("生成多选题时出错: %s", e)
             return None
-        else:
+    
+    @staticmethod
+    def get_random_words(level=None, count=5, deck_state=None, pos=None, min_length=None, max_length=None):
+        """一次获取多个随机单词，依次从牌堆中抽取，同一轮内不会重复
+
+        指定词性或长度范围时一次选出 count 个互不相同的符合条件的单词。
+        """
+        if pos or min_length is not None or max_length is not None:
             try:
-                # 确定要查询的表
-                tables_to_search = []
-                if level:
-                    # 根据中文级别名称找到对应的表名
-                    for table, level_name in VOCABULARY_TABLES.items():
-                        if level_name == level:
-                            tables_to_search.append(table)
-                            break
-                else:
-                    # 如果没有指定级别，搜索所有表
-                    tables_to_search = list(VOCABULARY_TABLES.keys())
-                
-                # 在指定的表中查找单词
-                for table_name in tables_to_search:
-                    word_query = text(f"SELECT word, translate as meaning FROM {table_name} WHERE word = :word")
-                    result = init_db.session.execute(word_query, {"word": word_text}).fetchone()
-                    
-                    if result:
-                        # 将结果转换为字典
-                        word_dict = {
-                            "word": result[0],
-                            "meaning": result[1],
-                            "level": VOCABULARY_TABLES.get(table_name, "未知"),
-                            "source_table": table_name
-                        }
-                        return word_dict
-                
-                return None
+                return WordModel._sample_words(level, count, pos, min_length, max_length)
             except Exception as e:
-                print(f"根据文本获取单词时出错: {e}")
-                return None
+                logger.error("获取随机单词时出错: %s", e)
+                return []
+        words = []
+        for _ in range(count):
+            word = WordModel.get_random_word(level, deck_state)
+            if word is None:
+                break
+            words.append(word)
+        return words
+    
+    @staticmethod
+    def get_word_by_text(word_text, level=None):
+        """根据单词文本获取单词（不区分大小写，多个级别都有时返回第一个）"""
+        words = WordModel.get_word_levels(word_text, level)
+        return words[0] if words else None
+    
+    @staticmethod
+    def get_word_levels(word_text, level=None):
+        """返回单词出现的所有级别，一次哈希查找完成，不再逐表查询"""
+        try:
+            tables = WordModel._tables_for_level(level)
+            locations = word_index.lookup(word_text, set(tables))
+            # 按级别顺序返回
+            order = {table_name: i for i, table_name in enumerate(tables)}
+            return [vocab_cache.get_level(table_name).get(row)
+                    for table_name, row in sorted(locations, key=lambda location: order[location[0]])]
+        except Exception as e:
+            logger.error("根据文本获取单词时出错: %s", e)
+            return []
+    
+    @staticmethod
+    def suggest_words(prefix, limit=10):
+        """单词前缀补全，返回单词、释义及所在级别"""
+        try:
+            suggestions = []
+            for key in word_index.suggest(prefix, limit):
+                words = WordModel.get_word_levels(key)
+                if words:
+                    suggestions.append({
+                        "word": words[0]["word"],
+                        "meaning": words[0]["meaning"],
+                        "level": words[0]["level"],
+                        "source_table": words[0]["source_table"],
+                        "levels": [word["level"] for word in words]
+                    })
+            return suggestions
+        except Exception as e:
+            logger.error("获取单词补全时出错: %s", e)
+            return []
     
     @staticmethod
     def get_word_by_meaning(meaning, level=None):
-        """根据中文释义获取单词"""
-        if init_db.use_in_memory:
-            # 由于我们已经注释掉了回退逻辑，这部分代码不应该被执行
-            print("错误：系统被配置为只使用MySQL数据库，但尝试使用内存模式")
-            return None
-        else:
-            try:
-                # 确定要查询的表
-                tables_to_search = []
-                if level:
-                    # 根据中文级别名称找到对应的表名
-                    for table, level_name in VOCABULARY_TABLES.items():
-                        if level_name == level:
-                            tables_to_search.append(table)
-                            break
-                else:
-                    # 如果没有指定级别，搜索所有表
-                    tables_to_search = list(VOCABULARY_TABLES.keys())
-                
-                # 在指定的表中查找单词
-                for table_name in tables_to_search:
-                    word_query = text(f"SELECT word, translate as meaning FROM {table_name} WHERE translate LIKE :meaning")
-                    result = init_db.session.execute(word_query, {"meaning": f"%{meaning}%"}).fetchone()
-                    
-                    if result:
-                        # 将结果转换为字典
-                        word_dict = {
-                            "word": result[0],
-                            "meaning": result[1],
-                            "level": VOCABULARY_TABLES.get(table_name, "未知"),
-                            "source_table": table_name
-                        }
-                        return word_dict
-                
-                return None
-            except Exception as e:
-                print(f"根据释义获取单词时出错: {e}")
-                return None
+        """根据中文释义获取单词（返回相关度最高的一个）"""
+        results = WordModel.search_by_meaning(meaning, level, limit=1)
+        return results[0] if results else None
+    
+    @staticmethod
+    def search_by_meaning(meaning, level=None, limit=10):
+        """根据中文释义查找单词，返回按相关度排序的多个级别的结果"""
+        try:
+            # 使用预先建立的释义倒排索引，不再对每个表执行 LIKE '%...%' 全表扫描
+            results = []
+            for score, table_name, row in meaning_index.search(meaning, WordModel._tables_for_level(level), limit):
+                word_dict = vocab_cache.get_level(table_name).get(row)
+                word_dict["score"] = score
+                results.append(word_dict)
+            return results
+        except Exception as e:
+            logger.error("根据释义获取单词时出错: %s", e)
+            return []
     
     @staticmethod
     def reset_shown_words():
         """重置已显示单词的记录"""
-        global recent_words, level_word_counts, table_word_counts
-        recent_words.clear()
+        global level_word_counts
+        default_decks.clear()
         level_word_counts = {}
-        table_word_counts = {}
         return {"success": True, "message": "已重置单词记录"}
     
     @staticmethod
@@ -259,136 +396,209 @@ class WordModel:
         return ''.join(word_with_blanks), blanks
     
     @staticmethod
-    def add_learned_word(word_dict, stage=1):
-        """添加学习过的单词到学习记录表"""
+    def add_learned_word(word_dict, stage=1, user_id=DEFAULT_USER_ID):
+        """添加学习过的单词到该用户的学习记录"""
+        if not valid_stage(stage):
+            return dict(INVALID_STAGE_RESULT)
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
+        # 启用延迟写入时只在内存中合并，由后台线程批量写入。
+        # 队列中只有尚未写入的增量，不知道数据库中的累计复习次数和阶段，所以不返回这两项
+        if progress_writer.queue is not None:
+            progress_writer.queue.record_learned(user_id, word_dict, stage)
+            return {"success": True, "message": "已加入学习记录队列"}
+        
         try:
-            # 检查单词是否已经存在于学习记录表中
-            query = text("SELECT id, review_count, learn_stage FROM learned_words WHERE word = :word")
-            result = init_db.session.execute(query, {"word": word_dict["word"]}).fetchone()
+            # 插入或更新：该用户已有这个单词时复习次数加一、学习阶段取较大值。
+            # 存储后端同时带回更新前的阶段，不需要再查询一次
+            now = datetime.datetime.now()
+            level = word_dict.get("level", "未知")
+            inserted, review_count, current_stage = storage.backend.upsert_learned_word(init_db.session, {
+                "user_id": user_id,
+                "word": word_dict["word"],
+                "translate": word_dict["meaning"],
+                "level": level,
+                "source_table": word_dict.get("source_table", None),
+                "now": now,
+                "stage": stage
+            })
             
-            if result:
-                # 如果单词已存在，更新复习次数、最后复习时间和学习阶段
-                word_id, review_count, current_stage = result
-                
-                # 如果传入的学习阶段大于当前阶段，则更新学习阶段
-                new_stage = max(stage, current_stage)
-                
-                update_query = text("""
-                    UPDATE learned_words 
-                    SET review_count = :review_count, 
-                        last_review_time = :review_time,
-                        learn_stage = :learn_stage
-                    WHERE id = :id
-                """)
-                init_db.session.execute(update_query, {
-                    "review_count": review_count + 1,
-                    "review_time": datetime.datetime.now(),
-                    "learn_stage": new_stage,
-                    "id": word_id
-                })
-                init_db.session.commit()
-                return {"success": True, "message": "已更新学习记录", "review_count": review_count + 1, "stage": new_stage}
-            else:
-                # 如果单词不存在，创建新记录
-                learned_word = LearnedWord(
-                    word=word_dict["word"],
-                    translate=word_dict["meaning"],
-                    level=word_dict.get("level", "未知"),
-                    source_table=word_dict.get("source_table", None),
-                    learn_time=datetime.datetime.now(),
-                    review_count=1,
-                    last_review_time=datetime.datetime.now(),
-                    learn_stage=stage
-                )
-                init_db.session.add(learned_word)
+            change = progress_stats.stats.get(user_id).change()
+            if inserted:
+                change.learned(level, stage, now.date())
                 init_db.session.commit()
+                change.apply()
+                learned_word_total.add(user_id, 1)
                 return {"success": True, "message": "已添加到学习记录", "review_count": 1, "stage": stage}
+            
+            new_stage = max(stage, current_stage)
+            change.reviewed(1, now.date())
+            change.stage_changed(current_stage, new_stage)
+            init_db.session.commit()
+            change.apply()
+            return {"success": True, "message": "已更新学习记录", "review_count": review_count, "stage": new_stage}
         except Exception as e:
             init_db.session.rollback()
-            print(f"添加学习记录时出错: {e}")
+            logger.error("添加学习记录时出错: %s", e)
             return {"success": False, "message": f"添加学习记录失败: {e}"}
     
     @staticmethod
-    def get_learned_words(limit=50, offset=0, sort_by="learn_time", sort_order="desc"):
-        """获取学习记录列表"""
+    def get_learned_words(limit=50, offset=0, sort_by="learn_time", sort_order="desc", cursor=None,
+                          user_id=DEFAULT_USER_ID):
+        """获取该用户的学习记录列表
+
+        传入 cursor（第一页为空字符串）时按游标分页：从上一页最后一条记录之后继续读取，
+        不论翻到第几页都只扫描 limit 行；否则按 offset 分页。结果中的 next_cursor 用于请求下一页。
+        """
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
         try:
             # 构建排序条件
             sort_column = "learn_time"
-            if sort_by in ["learn_time", "review_count", "last_review_time", "word"]:
+            if sort_by in LEARNED_WORD_SORT_COLUMNS:
                 sort_column = sort_by
             
             order_direction = "DESC"
             if sort_order.lower() == "asc":
                 order_direction = "ASC"
             
+            params = {"limit": limit, "user_id": user_id}
+            where_clause = "WHERE user_id = :user_id"
+            if cursor:
+                cursor_value, cursor_id = decode_cursor(sort_column, cursor)
+                params.update(cursor_value=cursor_value, cursor_id=cursor_id)
+                where_clause += " AND " + keyset_condition(sort_column, order_direction, cursor_value)
+            elif cursor is None:
+                params["offset"] = offset
+            
             # 查询学习记录
             query = text(f"""
-                SELECT id, word, translate, level, source_table, 
-                       learn_time, review_count, last_review_time, learn_stage
+                SELECT {LEARNED_WORD_COLUMNS}
                 FROM learned_words 
-                ORDER BY {sort_column} {order_direction}
-                LIMIT :limit OFFSET :offset
+                {where_clause}
+                ORDER BY {sort_column} {order_direction}, id {order_direction}
+                LIMIT :limit{" OFFSET :offset" if "offset" in params else ""}
             """)
             
-            results = init_db.session.execute(query, {"limit": limit, "offset": offset}).fetchall()
+            results = init_db.session.execute(query, params).fetchall()
+            words = [learned_word_dict(row) for row in results]
+            total_count = learned_word_total.get(user_id)
             
-            # 获取总记录数
-            count_query = text("SELECT COUNT(*) FROM learned_words")
-            total_count = init_db.session.execute(count_query).scalar()
+            # 不足一页说明已经到末尾
+            next_cursor = None
+            if words and len(words) == limit:
+                next_cursor = encode_cursor(sort_column, words[-1])
             
-            # 转换结果为字典列表
-            words = []
-            for row in results:
-                words.append({
-                    "id": row[0],
-                    "word": row[1],
-                    "meaning": row[2],
-                    "level": row[3],
-                    "source_table": row[4],
-                    "learn_time": row[5].strftime("%Y-%m-%d %H:%M:%S") if row[5] else None,
-                    "review_count": row[6],
-                    "last_review_time": row[7].strftime("%Y-%m-%d %H:%M:%S") if row[7] else None,
-                    "learn_stage": row[8]
-                })
+            # 叠加尚未写入数据库的学习进度，保证能读到刚产生的记录
+            progress_writer.overlay_learned_words(words, user_id)
+            first_page = not cursor and offset == 0
+            new_words = progress_writer.pending_new_words({word["word"] for word in words}, user_id) if first_page else []
+            total_count += len(new_words)
+            if new_words:
+                words = new_words + words
+                # 按偏移分页时保持每页条数不变；按游标分页时不能截断，否则会跳过数据库中的记录
+                if cursor is None:
+                    words = words[:limit]
             
             return {
                 "success": True,
                 "total": total_count,
                 "offset": offset,
                 "limit": limit,
+                "next_cursor": next_cursor,
                 "words": words
             }
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
         except Exception as e:
-            print(f"获取学习记录时出错: {e}")
+            logger.error("获取学习记录时出错: %s", e)
             return {"success": False, "message": f"获取学习记录失败: {e}"}
     
     @staticmethod
-    def get_words_by_stage(stage, limit=1, exclude_ids=None):
-        """根据学习阶段获取单词"""
+    def get_stats(days=30, user_id=DEFAULT_USER_ID):
+        """该用户的学习进度统计：按级别和阶段的计数、每日学习/复习直方图和正确率"""
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
+        try:
+            summary = progress_stats.stats.get(user_id).summary(days)
+            # 延迟写入队列中还没写入的单词也算在总数里，与学习记录列表一致
+            if progress_writer.queue is not None:
+                summary["pending"] = progress_writer.queue.pending_count(user_id)
+            summary["success"] = True
+            return summary
+        except Exception as e:
+            logger.error("获取学习统计时出错: %s", e)
+            return {"success": False, "message": f"获取学习统计失败: {e}"}
+    
+    @staticmethod
+    def iter_learned_words(sort_by="learn_time", sort_order="desc", batch_size=500, user_id=DEFAULT_USER_ID):
+        """按顺序逐条产出该用户的全部学习记录，用服务端游标分批读取，不把整个结果集放进内存"""
+        sort_column = sort_by if sort_by in LEARNED_WORD_SORT_COLUMNS else "learn_time"
+        order_direction = "ASC" if sort_order.lower() == "asc" else "DESC"
+        query = text(f"""
+            SELECT {LEARNED_WORD_COLUMNS}
+            FROM learned_words
+            WHERE user_id = :user_id
+            ORDER BY {sort_column} {order_direction}, id {order_direction}
+        """)
+        exported = set()
+        # 导出可能持续很久，单独占用一个连接，不影响本线程的会话
+        with init_db.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query, {"user_id": user_id})
+            while True:
+                rows = result.fetchmany(batch_size)
+                if not rows:
+                    break
+                words = [learned_word_dict(row) for row in rows]
+                progress_writer.overlay_learned_words(words, user_id)
+                for word in words:
+                    exported.add(word["word"])
+                    yield word
+        # 最后补上还在写入队列中的新单词
+        for word in progress_writer.pending_new_words(exported, user_id):
+            yield word
+    
+    @staticmethod
+    def get_words_by_stage(stage, limit=1, exclude_ids=None, user_id=DEFAULT_USER_ID):
+        """根据学习阶段获取该用户的单词
+
+        第一阶段从词汇中随机选取该用户还没有学过的单词；其他阶段从上一阶段或更高阶段中已经到期的单词里
+        按复习计划取最早到期的，每个阶段都是 (user_id, learn_stage, due_time, id) 索引上的一次有序范围读取，
+        不再对整张表 ORDER BY RAND()。
+        """
         try:
-            # 如果是第一阶段（认识单词），则随机获取一个单词
+            # 如果是第一阶段（认识单词），则随机获取该用户没有学过的单词
             if stage == 1:
-                return WordModel.get_random_word()
-            
-            # 构建查询条件
-            conditions = [f"learn_stage >= {stage - 1}"]  # 获取上一阶段或更高阶段的单词
+                words = WordModel._new_words(limit, user_id)
+                if limit == 1:
+                    return words[0] if words else None
+                return words
             
-            # 如果有需要排除的单词ID，添加到条件中
-            if exclude_ids and len(exclude_ids) > 0:
-                ids_str = ",".join([str(id) for id in exclude_ids])
-                conditions.append(f"id NOT IN ({ids_str})")
+            if not progress_store_ready():
+                return None
             
-            # 构建完整的查询语句
-            where_clause = " AND ".join(conditions)
+            exclude_clause = ""
+            params = {"limit": limit, "user_id": user_id, "now": datetime.datetime.now()}
+            if exclude_ids:
+                exclude_clause = "AND id NOT IN :exclude_ids"
+                params["exclude_ids"] = [int(word_id) for word_id in exclude_ids]
             query = text(f"""
-                SELECT id, word, translate, level, source_table, learn_stage
+                SELECT id, word, translate, level, source_table, learn_stage, due_time
                 FROM learned_words 
-                WHERE {where_clause}
-                ORDER BY RAND()
+                WHERE user_id = :user_id AND learn_stage = :stage AND due_time <= :now {exclude_clause}
+                ORDER BY due_time, id
                 LIMIT :limit
             """)
+            if exclude_ids:
+                query = query.bindparams(bindparam("exclude_ids", expanding=True))
             
-            results = init_db.session.execute(query, {"limit": limit}).fetchall()
+            # 获取上一阶段或更高阶段已到期的单词：每个阶段各取最早到期的 limit 个，再合并取最早的
+            results = []
+            for candidate_stage in range(max(stage - 1, 1), MAX_STAGE + 1):
+                params["stage"] = candidate_stage
+                results.extend(init_db.session.execute(query, params).fetchall())
+            results.sort(key=lambda row: (row[6], row[0]))
+            results = results[:limit]
             
             # 如果没有找到符合条件的单词，返回None
             if not results:
@@ -413,53 +623,203 @@ class WordModel:
             return words
             
         except Exception as e:
-            print(f"根据学习阶段获取单词时出错: {e}")
+            logger.error("根据学习阶段获取单词时出错: %s", e)
+            return None
+    
+    @staticmethod
+    def _new_words(count, user_id=DEFAULT_USER_ID):
+        """从默认牌堆中抽取至多 count 个该用户学习记录中没有的单词（最多抽 NEW_WORD_DRAWS 轮）"""
+        words = []
+        for _ in range(NEW_WORD_DRAWS):
+            drawn = WordModel.get_random_words(count=count - len(words))
+            if not drawn:
+                break
+            learned = set()
+            if progress_store_ready():
+                query = text("SELECT word FROM learned_words WHERE user_id = :user_id AND word IN :words")
+                query = query.bindparams(bindparam("words", expanding=True))
+                learned = {row[0] for row in init_db.session.execute(
+                    query, {"user_id": user_id, "words": [word["word"] for word in drawn]}).fetchall()}
+            words.extend(word for word in drawn if word["word"] not in learned)
+            if len(words) >= count:
+                break
+        return words[:count]
+
+    @staticmethod
+    def get_learned_word_id(word_text, user_id=DEFAULT_USER_ID):
+        """按单词取出该用户的学习记录id，不存在时（包括还在延迟写入队列中）返回 None"""
+        if not progress_store_ready():
+            return None
+        try:
+            return init_db.session.execute(
+                text("SELECT id FROM learned_words WHERE user_id = :user_id AND word = :word"),
+                {"user_id": user_id, "word": word_text}).scalar()
+        except Exception as e:
+            logger.error("查询学习记录时出错: %s", e)
             return None
+
+    @staticmethod
+    def record_review(word_id, quality, exercise=None, is_correct=None, user_id=DEFAULT_USER_ID):
+        """记录一次作答的质量（0-5），按 SM-2 更新该用户的单词（学习记录id）的复习计划
+
+        指定 exercise（blanks/typing/choice）时同时计入该练习的正确率统计。
+        返回值中包含单词本身，供接口告诉用户正确答案。
+        单词还没有到期时（同一道题重复提交，或已经在别处复习过）只计入正确率统计，复习计划不变，
+        一个复习间隔内只按第一次作答安排下次复习。
+
+        单词不在该用户的学习记录中时返回 None。
+        """
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
+        try:
+            query = text("""
+                SELECT id, ease_factor, interval_days, repetitions, word, due_time
+                FROM learned_words WHERE id = :id AND user_id = :user_id
+            """)
+            row = init_db.session.execute(query, {"id": word_id, "user_id": user_id}).fetchone()
+            if not row:
+                return None
+            
+            now = datetime.datetime.now()
+            due = row[5] is None or row[5] <= now
+            if due:
+                ease_factor, interval_days, repetitions, due_time = scheduler.review(
+                    row[1], row[2], row[3], quality, now)
+                init_db.session.execute(text("""
+                    UPDATE learned_words
+                    SET ease_factor = :ease_factor,
+                        interval_days = :interval_days,
+                        repetitions = :repetitions,
+                        due_time = :due_time,
+                        last_review_time = :now
+                    WHERE id = :id
+                """), {
+                    "ease_factor": ease_factor,
+                    "interval_days": interval_days,
+                    "repetitions": repetitions,
+                    "due_time": due_time,
+                    "now": now,
+                    "id": row[0]
+                })
+            else:
+                ease_factor, interval_days, due_time = row[1], row[2], row[5]
+            change = None
+            if exercise is not None:
+                change = progress_stats.stats.get(user_id).change()
+                change.answered(exercise, is_correct, now.date())
+            init_db.session.commit()
+            if change is not None:
+                change.apply()
+            return {
+                "success": True,
+                "message": "已更新复习计划" if due else "单词尚未到期，复习计划不变",
+                "word": row[4],
+                "ease_factor": ease_factor,
+                "interval_days": interval_days,
+                "due_time": due_time.strftime(DATETIME_FORMAT)
+            }
+        except Exception as e:
+            init_db.session.rollback()
+            logger.error("更新复习计划时出错: %s", e)
+            return {"success": False, "message": f"更新复习计划失败: {e}"}
     
     @staticmethod
-    def update_word_stage(word_id, stage):
-        """更新单词的学习阶段"""
+    def update_word_stage(word_id, stage, word_text=None, user_id=DEFAULT_USER_ID):
+        """更新该用户的单词的学习阶段
+
+        启用延迟写入且提供了单词文本时，阶段变化按单词合并后批量写入，
+        合并时阶段取较大值。
+        """
+        if not valid_stage(stage):
+            return dict(INVALID_STAGE_RESULT)
+        if progress_writer.queue is not None and word_text:
+            progress_writer.queue.record_stage(user_id, word_text, stage)
+            return {"success": True, "message": "已加入学习阶段更新队列"}
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
+        
         try:
+            # 统计已经建立时，按主键取出原来的阶段以便增量更新各阶段的计数
+            user_stats = progress_stats.stats.get(user_id)
+            old_stage = None
+            if user_stats.seeded:
+                old_stage = init_db.session.execute(
+                    text("SELECT learn_stage FROM learned_words WHERE id = :id AND user_id = :user_id"),
+                    {"id": word_id, "user_id": user_id}).scalar()
             query = text("""
                 UPDATE learned_words 
                 SET learn_stage = :stage,
                     last_review_time = :review_time
-                WHERE id = :id
+                WHERE id = :id AND user_id = :user_id
             """)
-            init_db.session.execute(query, {
+            result = init_db.session.execute(query, {
                 "stage": stage,
                 "review_time": datetime.datetime.now(),
-                "id": word_id
+                "id": word_id,
+                "user_id": user_id
             })
+            change = user_stats.change()
+            if old_stage is not None and result.rowcount:
+                change.stage_changed(old_stage, stage)
             init_db.session.commit()
+            change.apply()
             return {"success": True, "message": "已更新学习阶段"}
         except Exception as e:
             init_db.session.rollback()
-            print(f"更新学习阶段时出错: {e}")
+            logger.error("更新学习阶段时出错: %s", e)
             return {"success": False, "message": f"更新学习阶段失败: {e}"}
     
     @staticmethod
-    def delete_learned_word(word_id):
-        """删除学习记录"""
+    def update_word_stage_by_word(word_text, stage, user_id=DEFAULT_USER_ID):
+        """根据单词文本更新该用户的学习阶段"""
+        if not valid_stage(stage):
+            return dict(INVALID_STAGE_RESULT)
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
+        if progress_writer.queue is not None:
+            return WordModel.update_word_stage(None, stage, word_text, user_id)
+        
+        # 查询单词ID（(user_id, word) 上有唯一索引）
+        query = text("SELECT id FROM learned_words WHERE user_id = :user_id AND word = :word")
+        result = init_db.session.execute(query, {"user_id": user_id, "word": word_text}).fetchone()
+        if not result:
+            return None
+        return WordModel.update_word_stage(result[0], stage, user_id=user_id)
+    
+    @staticmethod
+    def delete_learned_word(word_id, user_id=DEFAULT_USER_ID):
+        """删除该用户的一条学习记录"""
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
         try:
-            query = text("DELETE FROM learned_words WHERE id = :id")
-            init_db.session.execute(query, {"id": word_id})
+            query = text("DELETE FROM learned_words WHERE id = :id AND user_id = :user_id")
+            result = init_db.session.execute(query, {"id": word_id, "user_id": user_id})
+            change = progress_stats.stats.get(user_id).change()
+            change.invalidate()
             init_db.session.commit()
+            change.apply()
+            learned_word_total.add(user_id, -result.rowcount)
             return {"success": True, "message": "已删除学习记录"}
         except Exception as e:
             init_db.session.rollback()
-            print(f"删除学习记录时出错: {e}")
+            logger.error("删除学习记录时出错: %s", e)
             return {"success": False, "message": f"删除学习记录失败: {e}"}
     
     @staticmethod
-    def clear_learned_words():
-        """清空所有学习记录"""
+    def clear_learned_words(user_id=DEFAULT_USER_ID):
+        """清空该用户的所有学习记录"""
+        if not progress_store_ready():
+            return dict(READ_ONLY_RESULT)
         try:
-            query = text("DELETE FROM learned_words")
-            init_db.session.execute(query)
+            query = text("DELETE FROM learned_words WHERE user_id = :user_id")
+            init_db.session.execute(query, {"user_id": user_id})
+            change = progress_stats.stats.get(user_id).change()
+            change.clear()
             init_db.session.commit()
+            change.apply()
+            learned_word_total.set(user_id, 0)
             return {"success": True, "message": "已清空所有学习记录"}
         except Exception as e:
             init_db.session.rollback()
-            print(f"清空学习记录时出错: {e}")
+            logger.error("清空学习记录时出错: %s", e)
             return {"success": False, "message": f"清空学习记录失败: {e}"}
@@ -0,0 +1,270 @@
+import os
+import datetime
+import threading
+from collections import Counter, OrderedDict
+from sqlalchemy import text
+import init_db
+import storage
+
+# 每日按事件累计的指标，保存在 daily_stats 表中（见 init_db 迁移4）
+METRIC_REVIEWED = "reviewed"
+EXERCISES = ("blanks", "typing", "choice")
+
+# 启动时从数据库读取多少天的每日数据
+HISTORY_DAYS = 365
+
+# 内存中最多保留多少个用户的汇总，超出时淘汰最久未读取的用户，下次读取时重新汇总
+STATS_CACHE_USERS = int(os.getenv("STATS_CACHE_USERS", "1000"))
+
+SELECT_STATS_VERSION = text("SELECT version FROM stats_versions WHERE user_id = :user_id")
+
+
+def answered_metric(exercise):
+    return f"{exercise}_answered"
+
+
+def correct_metric(exercise):
+    return f"{exercise}_correct"
+
+
+class ProgressStats:
+    """某个用户的学习进度的内存汇总
+
+    第一次读取时用几条按 user_id 过滤的 GROUP BY 查询建立汇总，之后随每次提交成功的学习、阶段变化和作答增量更新，
+    读取的代价与学习记录的多少无关。按级别/阶段的计数和每日新学单词数来自 learned_words；
+    复习次数和作答正确率按事件累计，写入 daily_stats 表以便重启后恢复。
+    每次改动都通过 StatsChange 把 stats_versions 中该用户的版本号加一；读取时按主键查询版本号，
+    只有其他进程写入过（版本号不是本进程最后见到的）才重新汇总。
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self.seeded = False
+        self.version = 0
+        self.by_level = Counter()
+        self.by_stage = Counter()
+        self.learned_daily = Counter()
+        # {日期: Counter(指标 -> 值)} 和所有日期的合计
+        self.metrics_daily = {}
+        self.metric_totals = Counter()
+
+    def _current_version(self):
+        return init_db.session.execute(SELECT_STATS_VERSION, {"user_id": self.user_id}).scalar() or 0
+
+    def _seed(self):
+        since = datetime.date.today() - datetime.timedelta(days=HISTORY_DAYS)
+        params = {"user_id": self.user_id, "since": since}
+        # 先读版本号：汇总期间有其他写入时版本号已经落后，下次读取会再汇总一次
+        version = self._current_version()
+        by_level = Counter()
+        for level, count in init_db.session.execute(text(
+                "SELECT level, COUNT(*) FROM learned_words WHERE user_id = :user_id GROUP BY level"), params).fetchall():
+            by_level[level or "未知"] += count
+        by_stage = Counter()
+        for stage, count in init_db.session.execute(text(
+                "SELECT learn_stage, COUNT(*) FROM learned_words WHERE user_id = :user_id GROUP BY learn_stage"),
+                params).fetchall():
+            by_stage[stage or 0] += count
+        learned_daily = Counter()
+        for day, count in init_db.session.execute(text("""
+                SELECT DATE(learn_time), COUNT(*) FROM learned_words
+                WHERE user_id = :user_id AND learn_time >= :since GROUP BY DATE(learn_time)
+            """), params).fetchall():
+            learned_daily[str(day)] = count
+        metrics_daily = {}
+        for day, metric, value in init_db.session.execute(text(
+                "SELECT day, metric, value FROM daily_stats WHERE user_id = :user_id AND day >= :since"),
+                params).fetchall():
+            metrics_daily.setdefault(str(day), Counter())[metric] = value
+        metric_totals = Counter(dict(init_db.session.execute(text(
+            "SELECT metric, SUM(value) FROM daily_stats WHERE user_id = :user_id GROUP BY metric"),
+            params).fetchall()))
+
+        with self._lock:
+            self.by_level = by_level
+            self.by_stage = by_stage
+            self.learned_daily = learned_daily
+            self.metrics_daily = metrics_daily
+            self.metric_totals = Counter({metric: int(value) for metric, value in metric_totals.items()})
+            self.seeded = True
+            self.version = version
+
+    def invalidate(self):
+        """下次读取时重新从数据库汇总"""
+        with self._lock:
+            self.seeded = False
+
+    def change(self):
+        """开始一次改动（在写入学习记录的事务中调用）"""
+        return StatsChange(self)
+
+    def _apply(self, change):
+        with self._lock:
+            if not self.seeded:
+                return
+            # 版本号不连续说明其他进程或线程在此之前也写入过，内存中的汇总已不完整
+            if change.reseed or change.version != self.version + 1:
+                self.seeded = False
+                return
+            self.version = change.version
+            if change.cleared:
+                self.by_level.clear()
+                self.by_stage.clear()
+                self.learned_daily.clear()
+            for level, stage, day in change.learned_words:
+                self.by_level[level or "未知"] += 1
+                self.by_stage[stage] += 1
+                self.learned_daily[day] += 1
+            for old_stage, new_stage in change.stage_changes:
+                self.by_stage[old_stage or 0] -= 1
+                self.by_stage[new_stage] += 1
+            for day, deltas in change.metrics:
+                daily = self.metrics_daily.setdefault(day, Counter())
+                for metric, value in deltas.items():
+                    daily[metric] += value
+                    self.metric_totals[metric] += value
+
+    def summary(self, days=30):
+        """返回按级别、阶段的计数，最近 days 天的每日直方图和正确率"""
+        if not self.seeded or self._current_version() != self.version:
+            self._seed()
+        today = datetime.date.today()
+        with self._lock:
+            daily = []
+            for offset in range(days - 1, -1, -1):
+                day = str(today - datetime.timedelta(days=offset))
+                metrics = self.metrics_daily.get(day, {})
+                daily.append({
+                    "date": day,
+                    "learned": self.learned_daily.get(day, 0),
+                    "reviewed": metrics.get(METRIC_REVIEWED, 0),
+                    "answered": sum(metrics.get(answered_metric(exercise), 0) for exercise in EXERCISES),
+                    "correct": sum(metrics.get(correct_metric(exercise), 0) for exercise in EXERCISES)
+                })
+
+            accuracy = {}
+            for exercise in EXERCISES + ("overall",):
+                names = EXERCISES if exercise == "overall" else (exercise,)
+                answered = sum(self.metric_totals.get(answered_metric(name), 0) for name in names)
+                correct = sum(self.metric_totals.get(correct_metric(name), 0) for name in names)
+                accuracy[exercise] = {
+                    "answered": answered,
+                    "correct": correct,
+                    "rate": round(correct / answered, 4) if answered else None
+                }
+
+            return {
+                "total": sum(self.by_level.values()),
+                "by_level": {level: count for level, count in self.by_level.items() if count},
+                "by_stage": {str(stage): count for stage, count in sorted(self.by_stage.items()) if count},
+                "daily": daily,
+                "accuracy": accuracy
+            }
+
+
+class StatsChange:
+    """一个事务中对某个用户统计的改动
+
+    创建时在事务中把该用户的统计版本号加一，每日指标随事务写入 daily_stats，
+    其余改动先记下来，调用方提交成功后调用 apply 再计入内存中的汇总，事务回滚时汇总不受影响。
+    """
+
+    def __init__(self, user_stats):
+        self.user_stats = user_stats
+        self.version = storage.backend.bump_stats_version(init_db.session, user_stats.user_id)
+        self.learned_words = []
+        self.stage_changes = []
+        self.metrics = []
+        self.cleared = False
+        self.reseed = False
+
+    def learned(self, level, stage, day=None):
+        """新增了一条学习记录"""
+        self.learned_words.append((level, stage, str(day or datetime.date.today())))
+
+    def stage_changed(self, old_stage, new_stage):
+        """某条学习记录的阶段从 old_stage 变为 new_stage"""
+        if old_stage != new_stage:
+            self.stage_changes.append((old_stage, new_stage))
+
+    def clear(self):
+        """学习记录被清空"""
+        self.cleared = True
+        self.learned_words.clear()
+        self.stage_changes.clear()
+
+    def invalidate(self):
+        """无法增量更新（例如删除了记录），提交后重新汇总"""
+        self.reseed = True
+
+    def record_metrics(self, deltas, day=None):
+        """累计每日指标 {指标: 增量}，写入 daily_stats"""
+        day = day or datetime.date.today()
+        deltas = {metric: value for metric, value in deltas.items() if value}
+        if deltas:
+            init_db.session.execute(storage.backend.UPSERT_DAILY_STAT, [
+                {"user_id": self.user_stats.user_id, "day": day, "metric": metric, "value": value}
+                for metric, value in deltas.items()
+            ])
+            self.metrics.append((str(day), deltas))
+
+    def reviewed(self, count=1, day=None):
+        """复习了已学过的单词"""
+        self.record_metrics({METRIC_REVIEWED: count}, day)
+
+    def answered(self, exercise, is_correct, day=None):
+        """完成了一次填空、盲打或多选题作答"""
+        self.record_metrics({answered_metric(exercise): 1, correct_metric(exercise): int(is_correct)}, day)
+
+    def apply(self):
+        """事务已提交，计入内存中的汇总"""
+        self.user_stats._apply(self)
+
+
+class UserStats:
+    """按用户保存的 ProgressStats，最多保留 capacity 个用户，淘汰最久未使用的"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+
+    def get(self, user_id):
+        """该用户的汇总，不存在时新建（第一次读取时再从数据库汇总）"""
+        with self._lock:
+            user_stats = self._users.get(user_id)
+            if user_stats is None:
+                user_stats = self._users[user_id] = ProgressStats(user_id)
+                while len(self._users) > self.capacity:
+                    self._users.popitem(last=False)
+            else:
+                self._users.move_to_end(user_id)
+            return user_stats
+
+    def invalidate(self, user_id=None):
+        """下次读取时重新汇总该用户（未指定时为所有用户）的统计"""
+        with self._lock:
+            targets = list(self._users.values()) if user_id is None else [self._users.get(user_id)]
+        for user_stats in targets:
+            if user_stats is not None:
+                user_stats.invalidate()
+
+
+stats = UserStats(STATS_CACHE_USERS)
+
+
+def on_flush(result):
+    """延迟写入队列批量写入后调用：按用户累计复习次数，并把新增的单词和阶段变化计入汇总"""
+    changes = []
+    for user_id, counts in result["users"].items():
+        change = stats.get(user_id).change()
+        for level, stage, day in counts["learned"]:
+            change.learned(level, stage, day)
+        for old_stage, new_stage in counts["stage_changes"]:
+            change.stage_changed(old_stage, new_stage)
+        change.reviewed(counts["learn_events"] - counts["inserted"])
+        changes.append(change)
+    init_db.session.commit()
+    for change in changes:
+        change.apply()
@@ -0,0 +1,304 @@
+import os
+import atexit
+import datetime
+import logging
+import threading
+from sqlalchemy import text, bindparam
+import init_db
+import storage
+
+logger = logging.getLogger(__name__)
+
+# 批量写入前读出该用户这批单词已有的阶段（(user_id, word) 上有唯一索引）
+SELECT_EXISTING_STAGES = text("""
+    SELECT word, COALESCE(learn_stage, 0) FROM learned_words WHERE user_id = :user_id AND word IN :words
+""").bindparams(bindparam("words", expanding=True))
+
+
+class PendingProgress:
+    """某个用户的某个单词尚未写入数据库的学习进度（已合并）"""
+
+    __slots__ = ("user_id", "word", "translate", "level", "source_table", "learn_time",
+                 "review_count", "stage", "last_review_time")
+
+    def __init__(self, user_id, word):
+        self.user_id = user_id
+        self.word = word
+        self.translate = None
+        self.level = None
+        self.source_table = None
+        self.learn_time = None
+        self.review_count = 0
+        self.stage = 0
+        self.last_review_time = None
+
+    def merge(self, other):
+        """把另一条待写入进度合并进来"""
+        if other.translate is not None and self.translate is None:
+            self.translate = other.translate
+            self.level = other.level
+            self.source_table = other.source_table
+        if other.learn_time is not None and (self.learn_time is None or other.learn_time < self.learn_time):
+            self.learn_time = other.learn_time
+        self.review_count += other.review_count
+        self.stage = max(self.stage, other.stage)
+        if other.last_review_time is not None and (self.last_review_time is None or other.last_review_time > self.last_review_time):
+            self.last_review_time = other.last_review_time
+
+    def params(self):
+        """转换为写入语句的参数"""
+        return {
+            "user_id": self.user_id,
+            "word": self.word,
+            "translate": self.translate,
+            "level": self.level,
+            "source_table": self.source_table,
+            "learn_time": self.learn_time,
+            "review_count": self.review_count,
+            "last_review_time": self.last_review_time,
+            "stage": self.stage
+        }
+
+
+class WriteBehindQueue:
+    """学习进度的延迟写入队列
+
+    add_learned_word / update_word_stage 只在内存中按 (用户, 单词) 合并事件，
+    后台线程在积累到 batch_size 个单词或每隔 interval 秒时批量写入数据库。
+    """
+
+    def __init__(self, batch_size=200, interval=1.0):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = {}
+        # 正在写入的一批进度，写入完成前仍对读取可见
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopped = False
+        self._thread = None
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="progress-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台线程并写入剩余的进度"""
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _add(self, progress):
+        key = (progress.user_id, progress.word)
+        with self._lock:
+            existing = self._pending.get(key)
+            if existing is None:
+                self._pending[key] = progress
+                existing = progress
+            else:
+                existing.merge(progress)
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.notify()
+            return existing.params()
+
+    def record_learned(self, user_id, word_dict, stage, now=None):
+        """记录用户的一次学习：复习次数加一，阶段取较大值"""
+        now = now or datetime.datetime.now()
+        progress = PendingProgress(user_id, word_dict["word"])
+        progress.translate = word_dict["meaning"]
+        progress.level = word_dict.get("level", "未知")
+        progress.source_table = word_dict.get("source_table", None)
+        progress.learn_time = now
+        progress.review_count = 1
+        progress.stage = stage
+        progress.last_review_time = now
+        return self._add(progress)
+
+    def record_stage(self, user_id, word, stage, now=None):
+        """记录用户的一次阶段变化"""
+        progress = PendingProgress(user_id, word)
+        progress.stage = stage
+        progress.last_review_time = now or datetime.datetime.now()
+        return self._add(progress)
+
+    def pending_count(self, user_id=None):
+        """尚未写入的单词数，指定 user_id 时只统计该用户的"""
+        with self._lock:
+            if user_id is None:
+                return len(self._pending)
+            return sum(1 for key in self._pending if key[0] == user_id)
+
+    def snapshot(self, user_id):
+        """返回该用户待写入进度的副本，键是单词"""
+        with self._lock:
+            merged = {}
+            for source in (self._inflight, self._pending):
+                for (owner, word), progress in source.items():
+                    if owner != user_id:
+                        continue
+                    combined = merged.get(word)
+                    if combined is None:
+                        combined = merged[word] = PendingProgress(user_id, word)
+                    combined.merge(progress)
+        return {word: progress.params() for word, progress in merged.items()}
+
+    def flush(self):
+        """把当前积累的进度批量写入数据库（在后台线程或退出时调用）"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            self._inflight = batch
+        if not batch:
+            return 0
+
+        by_user = {}
+        for progress in batch.values():
+            by_user.setdefault(progress.user_id, []).append(progress.params())
+        try:
+            users = {}
+            for user_id, rows in by_user.items():
+                upserts = [p for p in rows if p["translate"] is not None]
+                stage_updates = [p for p in rows if p["translate"] is None]
+                # 在同一个写事务中先读出这些单词原来的阶段，由此得到新增的单词和各单词的阶段变化
+                storage.backend.begin_write(init_db.session)
+                existing = {
+                    word.lower(): stage for word, stage in init_db.session.execute(
+                        SELECT_EXISTING_STAGES, {"user_id": user_id, "words": [p["word"] for p in rows]}).fetchall()
+                }
+                if upserts:
+                    # 单词已存在时累加复习次数，阶段和复习时间取较大值
+                    init_db.session.execute(storage.backend.FLUSH_UPSERT, upserts)
+                if stage_updates:
+                    # 只有阶段变化、没有释义的事件只能更新已有记录
+                    init_db.session.execute(storage.backend.FLUSH_STAGE_UPDATE, stage_updates)
+                learned, stage_changes = [], []
+                for p in rows:
+                    old_stage = existing.get(p["word"].lower())
+                    if old_stage is not None:
+                        stage_changes.append((old_stage, max(old_stage, p["stage"])))
+                    elif p["translate"] is not None:
+                        learned.append((p["level"], p["stage"], p["learn_time"].date()))
+                users[user_id] = {
+                    "inserted": len(learned),
+                    "learn_events": sum(p["review_count"] for p in upserts),
+                    "learned": learned,
+                    "stage_changes": stage_changes
+                }
+            init_db.session.commit()
+            result = {
+                "words": len(batch),
+                "users": users
+            }
+            for listener in flush_listeners:
+                try:
+                    listener(result)
+                except Exception as e:
+                    init_db.session.rollback()
+                    logger.error("处理批量写入结果时出错: %s", e)
+            return len(batch)
+        except Exception as e:
+            init_db.session.rollback()
+            logger.error("批量写入学习进度时出错: %s", e)
+            # 写入失败时把这批进度放回队列，下次重试
+            with self._lock:
+                for key, progress in batch.items():
+                    newer = self._pending.get(key)
+                    if newer is not None:
+                        progress.merge(newer)
+                    self._pending[key] = progress
+            return 0
+        finally:
+            with self._lock:
+                self._inflight = {}
+            init_db.session.remove()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopped and len(self._pending) < self.batch_size:
+                    self._wakeup.wait(self.interval)
+                if self._stopped:
+                    return
+            self.flush()
+
+
+# 全局队列，未启用延迟写入时为 None
+queue = None
+
+# 每次批量写入成功后调用的函数，参数是 {"words": 单词数, "users": {用户: {"inserted": 新增的记录数,
+# "learn_events": 合并前的学习次数, "learned": [(级别, 阶段, 学习日期)], "stage_changes": [(原阶段, 新阶段)]}}}
+flush_listeners = []
+
+
+def start_from_env():
+    """根据环境变量启用延迟写入，并注册退出时的写入钩子"""
+    global queue
+    if os.getenv('WRITE_BEHIND_ENABLED', 'false').strip().lower() not in ('1', 'true', 'yes', 'on'):
+        return None
+    if queue is None:
+        queue = WriteBehindQueue(
+            batch_size=int(os.getenv('WRITE_BEHIND_BATCH_SIZE', '200')),
+            interval=float(os.getenv('WRITE_BEHIND_INTERVAL', '1.0'))
+        )
+        queue.start()
+        atexit.register(queue.stop)
+        logger.info("已启用学习进度延迟写入，批量大小: %s，间隔: %s秒", queue.batch_size, queue.interval)
+    return queue
+
+
+def overlay_learned_words(words, user_id):
+    """把该用户尚未写入的进度叠加到从数据库读出的学习记录上"""
+    if queue is None:
+        return words
+    pending = queue.snapshot(user_id)
+    if not pending:
+        return words
+    for word in words:
+        progress = pending.get(word["word"])
+        if progress is None:
+            continue
+        word["review_count"] = (word["review_count"] or 0) + progress["review_count"]
+        word["learn_stage"] = max(word["learn_stage"] or 0, progress["stage"])
+        if progress["last_review_time"] is not None:
+            review_time = progress["last_review_time"].strftime("%Y-%m-%d %H:%M:%S")
+            if word["last_review_time"] is None or review_time > word["last_review_time"]:
+                word["last_review_time"] = review_time
+    return words
+
+
+def pending_new_words(existing_words, user_id):
+    """返回该用户待写入且数据库中还不存在的单词，格式与学习记录一致"""
+    if queue is None:
+        return []
+    pending = queue.snapshot(user_id)
+    candidates = [p for word, p in pending.items() if p["translate"] is not None and word not in existing_words]
+    if not candidates:
+        return []
+
+    # 一次按 (user_id, word) 唯一键查询哪些单词已经在数据库中
+    query = text("SELECT word FROM learned_words WHERE user_id = :user_id AND word IN :words").bindparams(
+        bindparam("words", expanding=True))
+    stored = {row[0] for row in init_db.session.execute(
+        query, {"user_id": user_id, "words": [p["word"] for p in candidates]}).fetchall()}
+
+    new_words = []
+    for p in candidates:
+        if p["word"] in stored:
+            continue
+        new_words.append({
+            "id": None,
+            "word": p["word"],
+            "meaning": p["translate"],
+            "level": p["level"],
+            "source_table": p["source_table"],
+            "learn_time": p["learn_time"].strftime("%Y-%m-%d %H:%M:%S") if p["learn_time"] else None,
+            "review_count": p["review_count"],
+            "last_review_time": p["last_review_time"].strftime("%Y-%m-%d %H:%M:%S") if p["last_review_time"] else None,
+            "learn_stage": p["stage"]
+        })
+    return new_words
@@ -0,0 +1,42 @@
+import datetime
+
+# SM-2 间隔重复算法的参数
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+# 答错后很快再出现，而不是等到第二天
+RELEARN_DELAY = datetime.timedelta(minutes=10)
+
+# 回答质量（0-5）：填空有提示，答对记4分；盲打完全靠回忆，答对记5分；超时没有作答记0分。
+# 盲打只有个别字母拼错时说明记得这个单词，记3分（仍算记住，但间隔增长得更慢）
+QUALITY_BLANKS_CORRECT = 4
+QUALITY_BLANKS_WRONG = 2
+QUALITY_TYPING_CORRECT = 5
+QUALITY_TYPING_ALMOST = 3
+QUALITY_TYPING_WRONG = 1
+QUALITY_TIMEOUT = 0
+# 多选题只需从几个选项中认出答案，答对记3分，答错记1分
+QUALITY_CHOICE_CORRECT = 3
+QUALITY_CHOICE_WRONG = 1
+
+
+def review(ease_factor, interval_days, repetitions, quality, now=None):
+    """按 SM-2 计算一次复习后的状态，返回 (难度系数, 间隔天数, 连续答对次数, 下次复习时间)"""
+    now = now or datetime.datetime.now()
+    ease_factor = ease_factor or DEFAULT_EASE
+    if quality >= 3:
+        if repetitions == 0:
+            interval_days = FIRST_INTERVAL_DAYS
+        elif repetitions == 1:
+            interval_days = SECOND_INTERVAL_DAYS
+        else:
+            interval_days = max(1, round(interval_days * ease_factor))
+        repetitions += 1
+        due_time = now + datetime.timedelta(days=interval_days)
+    else:
+        repetitions = 0
+        interval_days = FIRST_INTERVAL_DAYS
+        due_time = now + RELEARN_DELAY
+    ease_factor = ease_factor + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return max(MIN_EASE, round(ease_factor, 2)), interval_days, repetitions, due_time
@@ -0,0 +1,188 @@
+import array
+import bisect
+import logging
+import threading
+import vocab_cache
+
+logger = logging.getLogger(__name__)
+
+# 按答案长度允许的拼写错误数：(最大长度, 允许的编辑距离)，更长的单词允许 MAX_TYPOS 处
+TYPO_TOLERANCE = ((2, 0), (6, 1))
+MAX_TYPOS = 2
+
+# 删除变体的哈希取低 43 位，与单词下标（20 位）拼成一个有符号 64 位整数
+HASH_BITS = 43
+WORD_BITS = 20
+HASH_MASK = (1 << HASH_BITS) - 1
+WORD_MASK = (1 << WORD_BITS) - 1
+# 按哈希的高位分桶的目录中平均每个桶的条目数，二分查找只在一个桶内进行
+BUCKET_SIZE = 16
+
+
+def typo_tolerance(length):
+    """长度为 length 的单词最多有几处拼写错误仍算"差一点答对\""""
+    for max_length, typos in TYPO_TOLERANCE:
+        if length <= max_length:
+            return typos
+    return MAX_TYPOS
+
+
+def edit_distance(a, b, limit=None):
+    """两个字符串的编辑距离（Levenshtein：插入、删除、替换各计1）
+
+    指定 limit 时一旦确定距离超过 limit 就提前返回 limit + 1。
+    """
+    if a == b:
+        return 0
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    if not b:
+        return len(a)
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def deletes(word, max_deletes):
+    """word 删除至多 max_deletes 个字母得到的所有字符串（包括 word 本身）"""
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_deletes):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+
+def _variant_hash(variant):
+    # str 的哈希在同一进程内固定，索引只保存在内存中，不需要跨进程一致
+    return hash(variant) & HASH_MASK
+
+
+class TableSpellingIndex:
+    """单个词汇表的删除变体索引（SymSpell 的思路），按编辑距离查找相近的单词
+
+    两个单词的编辑距离不超过 r，当且仅当双方各删除至多 r 个字母后能得到相同的字符串（替换相当于双方各删一个）。
+    建索引时为每个单词生成删除至多 MAX_TYPOS 个字母的所有变体，按哈希排序保存在紧凑的整数数组中；
+    查找时只需为输入生成变体、按哈希高位的目录找到所在的桶并在桶内二分查找，再用编辑距离确认少量候选，
+    不必与每个单词比较。
+    单词统一转为小写，同一个单词只收录一次。
+    """
+
+    def __init__(self, vocabulary):
+        self.vocabulary = vocabulary
+        self.words = []
+        seen = set()
+        for row in range(len(vocabulary)):
+            word = vocabulary.word(row).strip().lower()
+            if word and word not in seen:
+                seen.add(word)
+                self.words.append(word)
+        if len(self.words) > WORD_MASK:
+            raise ValueError(f"词汇表 {vocabulary.table_name} 的单词太多，无法建立拼写索引")
+        entries = []
+        for word_index, word in enumerate(self.words):
+            entries.extend((_variant_hash(variant) << WORD_BITS) | word_index
+                           for variant in deletes(word, MAX_TYPOS))
+        entries.sort()
+        self.entries = array.array("q", entries)
+        # 目录：第 b 个桶的条目位于 buckets[b]:buckets[b + 1]
+        bucket_bits = max(1, (len(entries) // BUCKET_SIZE).bit_length())
+        self._shift = HASH_BITS + WORD_BITS - bucket_bits
+        self.buckets = array.array("I", [0]) * ((1 << bucket_bits) + 1)
+        for entry in entries:
+            self.buckets[(entry >> self._shift) + 1] += 1
+        for bucket in range(1, len(self.buckets)):
+            self.buckets[bucket] += self.buckets[bucket - 1]
+
+    def __len__(self):
+        return len(self.words)
+
+    def candidates(self, keys):
+        """删除变体的哈希键（见 variant_keys）命中的单词，需要再用编辑距离确认"""
+        found = set()
+        entries, buckets, words = self.entries, self.buckets, self.words
+        for key in keys:
+            bucket = key >> self._shift
+            end = buckets[bucket + 1]
+            position = bisect.bisect_left(entries, key, buckets[bucket], end)
+            limit = key + WORD_MASK
+            while position < end and entries[position] <= limit:
+                found.add(words[entries[position] & WORD_MASK])
+                position += 1
+        return found
+
+    def search(self, word, radius):
+        """返回 [(距离, 单词)]，包含与 word 的编辑距离不超过 radius（最大为 MAX_TYPOS）的所有单词"""
+        radius = min(radius, MAX_TYPOS)
+        return _confirm(word, self.candidates(variant_keys(word, radius)), radius)
+
+
+def variant_keys(word, radius):
+    """word 的删除变体在索引中的哈希键，按升序排列"""
+    return sorted(_variant_hash(variant) << WORD_BITS for variant in deletes(word, min(radius, MAX_TYPOS)))
+
+
+def _confirm(word, candidates, radius):
+    results = []
+    for candidate in candidates:
+        distance = edit_distance(word, candidate, radius)
+        if distance <= radius:
+            results.append((distance, candidate))
+    return results
+
+
+# 每个表的索引；对应的 LevelVocabulary 被替换（重新导入、缓存失效）时自动重建该表
+_indexes = {}
+_lock = threading.Lock()
+
+
+def get_table_index(table_name):
+    """获取某个表的拼写索引，词汇变化时只重建这一个表"""
+    vocabulary = vocab_cache.get_level(table_name)
+    index = _indexes.get(table_name)
+    if index is not None and index.vocabulary is vocabulary:
+        return index
+    with _lock:
+        index = _indexes.get(table_name)
+        if index is None or index.vocabulary is not vocabulary:
+            index = TableSpellingIndex(vocabulary)
+            _indexes[table_name] = index
+            logger.info("已建立拼写索引: %s，%s 个单词，%s 个删除变体", table_name, len(index), len(index.entries))
+    return index
+
+
+def build_all():
+    """启动时为所有可用的表建立索引"""
+    for table_name in vocab_cache.available_tables():
+        try:
+            get_table_index(table_name)
+        except Exception as e:
+            logger.error("建立拼写索引 %s 时出错: %s", table_name, e)
+
+
+def nearest(word, tables=None, radius=None, limit=5):
+    """在若干表（默认全部）中查找与 word 最相近的单词，返回按 (距离, 单词) 排序的 [(距离, 单词)]
+
+    radius 默认按 word 的长度取允许的拼写错误数；word 本身是词汇表中的单词时距离为0。
+    limit 为 None 时返回半径内的全部单词。
+    """
+    word = (word or "").strip().lower()
+    if not word:
+        return []
+    if radius is None:
+        radius = typo_tolerance(len(word))
+    # 变体只生成一次；同一个单词可能收录在多个级别中，合并后只确认一次
+    keys = variant_keys(word, radius)
+    candidates = set()
+    for table_name in (tables if tables is not None else vocab_cache.available_tables()):
+        candidates |= get_table_index(table_name).candidates(keys)
+    results = sorted(_confirm(word, candidates, min(radius, MAX_TYPOS)))
+    return results if limit is None else results[:limit]
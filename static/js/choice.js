@@ -0,0 +1,107 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // 获取DOM元素
+    const promptElement = document.getElementById('prompt');
+    const optionsContainer = document.getElementById('options-container');
+    const nextButton = document.getElementById('next-btn');
+    const directionSwitch = document.getElementById('direction-switch');
+    const resultContainer = document.getElementById('result-container');
+    const resultMessage = document.getElementById('result-message');
+    const correctCountElement = document.getElementById('correct-count');
+    const wrongCountElement = document.getElementById('wrong-count');
+    
+    // 统计数据
+    let correctCount = 0;
+    let wrongCount = 0;
+    
+    // 当前题目
+    let currentToken = '';  // 服务器签发的题目令牌，检查答案时带上
+    let answered = false;
+    
+    // 出题方向：word 看单词选释义，meaning 看释义选单词
+    function currentDirection() {
+        return directionSwitch.checked ? 'meaning' : 'word';
+    }
+    
+    // 加载一道多选题
+    function loadQuestion() {
+        resultContainer.style.display = 'none';
+        resultContainer.classList.remove('success', 'error');
+        optionsContainer.innerHTML = '';
+        promptElement.textContent = '正在加载...';
+        answered = false;
+        
+        fetch(`/api/multiple-choice?direction=${currentDirection()}`)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error('网络响应不正常');
+                }
+                return response.json();
+            })
+            .then(data => {
+                currentToken = data.token;
+                promptElement.textContent = data.prompt;
+                data.options.forEach((option, index) => {
+                    const button = document.createElement('button');
+                    button.className = 'option-btn';
+                    button.textContent = `${String.fromCharCode(65 + index)}. ${option}`;
+                    button.addEventListener('click', () => submitChoice(index));
+                    optionsContainer.appendChild(button);
+                });
+            })
+            .catch(error => {
+                console.error('获取题目时出错:', error);
+                promptElement.textContent = '加载失败，请检查网络连接或刷新页面';
+            });
+    }
+    
+    // 提交选择，由服务器校验并告知正确选项
+    function submitChoice(choice) {
+        if (answered) return;
+        answered = true;
+        const buttons = optionsContainer.querySelectorAll('.option-btn');
+        buttons.forEach(button => { button.disabled = true; });
+        
+        fetch('/api/check-choice', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ token: currentToken, choice: choice })
+        })
+        .then(response => response.json())
+        .then(result => {
+            if (result.error) {
+                throw new Error(result.error);
+            }
+            resultContainer.style.display = 'block';
+            if (result.correct_index !== null) {
+                buttons[result.correct_index].classList.add('success');
+            }
+            if (result.is_correct) {
+                resultContainer.classList.add('success');
+                resultMessage.textContent = '回答正确！';
+                correctCount++;
+                correctCountElement.textContent = correctCount;
+            } else {
+                buttons[choice].classList.add('error');
+                resultContainer.classList.add('error');
+                resultMessage.textContent = '回答错误！';
+                wrongCount++;
+                wrongCountElement.textContent = wrongCount;
+            }
+        })
+        .catch(error => {
+            console.error('检查答案时出错:', error);
+            resultContainer.style.display = 'block';
+            resultContainer.classList.add('error');
+            resultMessage.textContent = error.message || '检查答案失败';
+        });
+    }
+    
+    // 事件监听
+    nextButton.addEventListener('click', loadQuestion);
+    directionSwitch.addEventListener('change', loadQuestion);
+    
+    // 页面加载时获取第一道题
+    loadQuestion();
+});
@@ -22,6 +22,82 @@ document.addEventListener('DOMContentLoaded', function() {
     let numBlanks = 0;
     let currentBlanks = [];
     let blankPositions = [];  // 新增：存储空白的位置
+    let currentToken = '';  // 服务器签发的题目令牌，检查答案时带上
+    let answerRecorded = false;  // 每道题只把第一次作答计入复习计划
+    
+    // 预取的题目，点"下一个"时直接从这里取，不必等待网络请求
+    const BUFFER_SIZE = 5;
+    const REFILL_THRESHOLD = 2;
+    let wordBuffer = [];
+    let refillPromise = null;
+    let currentId = null;  // 正在显示的单词的学习记录id，补充缓冲时和缓冲区中的一起排除
+    
+    // 补充预取的题目，同时只发一个请求；已经缓冲和正在显示的单词由服务器跳过
+    function refillBuffer() {
+        if (!refillPromise) {
+            const exclude = wordBuffer.map(word => word.id);
+            if (currentId !== null) {
+                exclude.push(currentId);
+            }
+            refillPromise = fetch(`/api/words-with-blanks?count=${BUFFER_SIZE}&exclude=${exclude.join(',')}`)
+                .then(response => {
+                    if (!response.ok) {
+                        return response.json().then(data => {
+                            throw new Error(data.message || '网络响应不正常');
+                        });
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.message || '获取单词失败');
+                    }
+                    // 请求期间缓冲区可能已经变化，按学习记录id去重后再放入
+                    const buffered = new Set(wordBuffer.map(word => word.id));
+                    wordBuffer.push(...data.words.filter(word => !buffered.has(word.id) && word.id !== currentId));
+                })
+                .finally(() => {
+                    refillPromise = null;
+                });
+        }
+        return refillPromise;
+    }
+    
+    // 取出下一道题，缓冲区快用完时在后台补充
+    function nextWord() {
+        if (wordBuffer.length === 0) {
+            return refillBuffer().then(() => {
+                if (wordBuffer.length === 0) {
+                    throw new Error('获取单词失败');
+                }
+                const word = wordBuffer.shift();
+                currentId = word.id;
+                return word;
+            });
+        }
+        const word = wordBuffer.shift();
+        currentId = word.id;
+        if (wordBuffer.length <= REFILL_THRESHOLD) {
+            refillBuffer().catch(error => console.error('预取单词时出错:', error));
+        }
+        return Promise.resolve(word);
+    }
+    
+    // 更新单词的学习阶段
+    function updateWordStage(word, stage) {
+        fetch('/api/update-word-stage', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ 
+                word: word,
+                stage: stage
+            })
+        }).catch(error => {
+            console.error('更新单词学习阶段时出错:', error);
+        });
+    }
     
     // 加载带空白的单词
     function loadWordWithBlanks() {
@@ -34,23 +110,13 @@ document.addEventListener('DOMContentLoaded', function() {
         wordWithBlanksElement.textContent = '正在加载...';
         meaningElement.textContent = '';
         
-        fetch('/api/word-with-blanks')
-            .then(response => {
-                if (!response.ok) {
-                    return response.json().then(data => {
-                        throw new Error(data.message || '网络响应不正常');
-                    });
-                }
-                return response.json();
-            })
+        nextWord()
             .then(data => {
-                if (!data.success) {
-                    throw new Error(data.message || '获取单词失败');
-                }
-                
                 currentWordWithBlanks = data.word_with_blanks;
+                answerRecorded = false;
                 currentWord = data.word;  // 保存完整单词
                 currentBlanks = data.blanks;  // 保存空白字符
+                currentToken = data.token;
                 numBlanks = currentBlanks.length;
                 
                 // 计算空白的位置
@@ -72,6 +138,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // 创建填空输入框
                 createBlankInputs(numBlanks);
+                
+                // 更新单词的学习阶段为2（填空）
+                updateWordStage(currentWord, 2);
             })
             .catch(error => {
                 console.error('获取单词时出错:', error);
@@ -141,6 +210,26 @@ document.addEventListener('DOMContentLoaded', function() {
         }, duration);
     }
     
+    // 把作答结果交给服务器，用于安排下次复习
+    function recordAnswer(answers) {
+        if (answerRecorded) {
+            return;
+        }
+        answerRecorded = true;
+        fetch('/api/check-blanks', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                token: currentToken,
+                answers: answers
+            })
+        }).catch(error => {
+            console.error('记录作答结果时出错:', error);
+        });
+    }
+    
     // 提交答案
     function submitAnswer() {
         const inputs = blanksContainer.querySelectorAll('.blank-input');
@@ -173,6 +262,8 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
         
+        recordAnswer(answers);
+        
         // 高亮显示错误的输入框
         inputs.forEach((input, index) => {
             if (incorrectIndexes.includes(index)) {
@@ -195,18 +286,7 @@ document.addEventListener('DOMContentLoaded', function() {
             showMessage(`单词 "${currentWord}" 填空练习完成！现在可以在"中文盲打"模块练习这个单词了。`, 'success', 5000);
             
             // 将单词标记为已完成第三阶段（填空）
-            fetch('/api/update-word-stage', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ 
-                    word: currentWord,
-                    stage: 3  // 标记为已完成填空阶段
-                })
-            }).catch(error => {
-                console.error('更新单词学习阶段时出错:', error);
-            });
+            updateWordStage(currentWord, 3);
         } else {
             resultContainer.classList.add('error');
             resultContainer.classList.remove('success');
@@ -45,19 +45,73 @@ document.addEventListener('DOMContentLoaded', function() {
         }, duration);
     }
     
+    // 预取的单词，切换时直接从这里取，不必等待网络请求
+    const BUFFER_SIZE = 5;
+    const REFILL_THRESHOLD = 2;
+    let wordBuffer = [];
+    let refillPromise = null;
+    
+    // 补充预取的单词，同时只发一个请求
+    function refillBuffer() {
+        if (!refillPromise) {
+            refillPromise = fetch(`/api/random-words?count=${BUFFER_SIZE}`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error('网络响应不正常');
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    wordBuffer.push(...data.words);
+                })
+                .finally(() => {
+                    refillPromise = null;
+                });
+        }
+        return refillPromise;
+    }
+    
+    // 取出下一个单词，缓冲区快用完时在后台补充
+    function nextWord() {
+        if (wordBuffer.length === 0) {
+            return refillBuffer().then(() => wordBuffer.shift());
+        }
+        const word = wordBuffer.shift();
+        if (wordBuffer.length <= REFILL_THRESHOLD) {
+            refillBuffer().catch(error => console.error('预取单词时出错:', error));
+        }
+        return Promise.resolve(word);
+    }
+    
+    // 把显示过的单词加入学习记录，阶段为1（认识单词）
+    function recordLearnedWord(word) {
+        fetch('/api/learned-word', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                word: word.word,
+                meaning: word.meaning,
+                level: word.level,
+                source_table: word.source_table
+            })
+        }).catch(error => {
+            console.error('添加学习记录时出错:', error);
+        });
+    }
+    
     // 加载随机单词
     function loadRandomWord() {
-        fetch('/api/random-word')
-            .then(response => {
-                if (!response.ok) {
-                    throw new Error('网络响应不正常');
-                }
-                return response.json();
-            })
+        nextWord()
             .then(data => {
+                if (!data) {
+                    throw new Error('没有找到单词');
+                }
                 currentWord = data;
                 wordElement.textContent = data.word;
                 meaningElement.textContent = data.meaning;
+                recordLearnedWord(data);
                 
                 // 显示学习成功消息
                 showMessage(`单词 "${data.word}" 已添加到学习记录！现在可以在"单词填空"模块练习这个单词了。`, 'success', 5000);
@@ -19,6 +19,15 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // 当前单词
     let currentWord = '';
+    let currentToken = '';  // 服务器签发的题目令牌，检查答案时带上
+    let answerRecorded = false;  // 每个单词只把第一次作答计入复习计划
+    
+    // 预取的单词，点"下一个"时直接从这里取，不必等待网络请求
+    const BUFFER_SIZE = 5;
+    const REFILL_THRESHOLD = 2;
+    let wordBuffer = [];
+    let refillPromise = null;
+    let currentId = null;  // 正在显示的单词的学习记录id，补充缓冲时和缓冲区中的一起排除
     
     // 计时器相关
     let timerInterval = null;
@@ -53,6 +62,73 @@ document.addEventListener('DOMContentLoaded', function() {
         }, duration);
     }
     
+    // 补充预取的单词，同时只发一个请求；已经缓冲和正在显示的单词由服务器跳过
+    function refillBuffer() {
+        if (!refillPromise) {
+            const exclude = wordBuffer.map(word => word.id);
+            if (currentId !== null) {
+                exclude.push(currentId);
+            }
+            refillPromise = fetch(`/api/typing-words?count=${BUFFER_SIZE}&exclude=${exclude.join(',')}`)
+                .then(response => {
+                    if (!response.ok) {
+                        return response.json().then(data => {
+                            throw new Error(data.message || '网络响应不正常');
+                        });
+                    }
+                    return response.json();
+                })
+                .then(data => {
+                    if (!data.success) {
+                        throw new Error(data.message || '获取单词失败');
+                    }
+                    // 请求期间缓冲区可能已经变化，按学习记录id去重后再放入
+                    const buffered = new Set(wordBuffer.map(word => word.id));
+                    wordBuffer.push(...data.words.filter(word => !buffered.has(word.id) && word.id !== currentId));
+                })
+                .finally(() => {
+                    refillPromise = null;
+                });
+        }
+        return refillPromise;
+    }
+    
+    // 取出下一个单词，缓冲区快用完时在后台补充
+    function nextWord() {
+        if (wordBuffer.length === 0) {
+            return refillBuffer().then(() => {
+                if (wordBuffer.length === 0) {
+                    throw new Error('获取单词失败');
+                }
+                const word = wordBuffer.shift();
+                currentId = word.id;
+                return word;
+            });
+        }
+        const word = wordBuffer.shift();
+        currentId = word.id;
+        if (wordBuffer.length <= REFILL_THRESHOLD) {
+            refillBuffer().catch(error => console.error('预取单词时出错:', error));
+        }
+        return Promise.resolve(word);
+    }
+    
+    // 更新单词的学习阶段
+    function updateWordStage(word, stage) {
+        fetch('/api/update-word-stage', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ 
+                word: word,
+                stage: stage
+            })
+        }).catch(error => {
+            console.error('更新单词学习阶段时出错:', error);
+        });
+    }
+    
     // 加载随机中文释义
     function loadRandomMeaning() {
         // 清除之前的结果和输入
@@ -67,24 +143,17 @@ document.addEventListener('DOMContentLoaded', function() {
         // 显示加载提示
         meaningElement.textContent = '正在加载...';
         
-        fetch('/api/typing-word')
-            .then(response => {
-                if (!response.ok) {
-                    return response.json().then(data => {
-                        throw new Error(data.message || '网络响应不正常');
-                    });
-                }
-                return response.json();
-            })
+        nextWord()
             .then(data => {
-                if (!data.success) {
-                    throw new Error(data.message || '获取单词失败');
-                }
-                
                 meaningElement.textContent = data.meaning;
                 currentWord = data.word;  // 保存当前单词
+                currentToken = data.token;
+                answerRecorded = false;
                 answerInput.focus();
                 
+                // 更新单词的学习阶段为3（盲打）
+                updateWordStage(currentWord, 3);
+                
                 // 如果启用了限时模式，开始计时
                 if (timerSwitch.checked) {
                     startTimer();
@@ -104,6 +173,26 @@ document.addEventListener('DOMContentLoaded', function() {
             });
     }
     
+    // 把作答结果交给服务器检查并安排下次复习，空答案表示超时
+    function recordAnswer(answer) {
+        if (answerRecorded) {
+            return Promise.resolve(null);
+        }
+        answerRecorded = true;
+        return fetch('/api/check-typing', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ token: currentToken, answer: answer })
+        })
+        .then(response => response.json())
+        .catch(error => {
+            console.error('记录作答结果时出错:', error);
+            return null;
+        });
+    }
+    
     // 提交答案
     function submitAnswer() {
         const userAnswer = answerInput.value.trim();
@@ -115,13 +204,20 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // 停止计时器
         stopTimer();
+        const isCorrect = userAnswer.toLowerCase() === currentWord.toLowerCase();
+        recordAnswer(userAnswer).then(result => {
+            // 只拼错了个别字母时给出更具体的提示
+            if (!isCorrect && result && result.almost_correct) {
+                resultMessage.textContent = `差一点！有 ${result.distance} 处拼写错误`;
+            }
+        });
         
         // 显示结果
         resultContainer.style.display = 'block';
         answerInput.disabled = true;
         
         // 检查答案
-        if (userAnswer.toLowerCase() === currentWord.toLowerCase()) {
+        if (isCorrect) {
             resultContainer.classList.add('success');
             resultContainer.classList.remove('error');
             resultMessage.textContent = '回答正确！';
@@ -133,18 +229,7 @@ document.addEventListener('DOMContentLoaded', function() {
             showMessage(`单词 "${currentWord}" 盲打练习完成！恭喜您已完成该单词的所有学习阶段，可以在"复习"模块查看。`, 'success', 5000);
             
             // 将单词标记为已完成第四阶段（复习完成）
-            fetch('/api/update-word-stage', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ 
-                    word: currentWord,
-                    stage: 4  // 标记为已完成所有学习阶段
-                })
-            }).catch(error => {
-                console.error('更新单词学习阶段时出错:', error);
-            });
+            updateWordStage(currentWord, 4);
         } else {
             resultContainer.classList.add('error');
             resultContainer.classList.remove('success');
@@ -202,24 +287,16 @@ document.addEventListener('DOMContentLoaded', function() {
         stopTimer();
         answerInput.disabled = true;
         
-        // 获取正确答案
-        fetch('/api/check-typing', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json'
-            },
-            body: JSON.stringify({ answer: '' }) // 发送空答案，服务器会返回正确答案
-        })
-        .then(response => response.json())
-        .then(data => {
-            resultContainer.style.display = 'block';
-            resultContainer.classList.add('error');
-            resultContainer.classList.remove('success');
-            resultMessage.textContent = '时间到！';
-            correctAnswer.textContent = `正确答案: ${data.correct_word}`;
-            wrongCount++;
-            wrongCountElement.textContent = wrongCount;
-        });
+        // 记录超时（发送空答案）
+        recordAnswer('');
+        
+        resultContainer.style.display = 'block';
+        resultContainer.classList.add('error');
+        resultContainer.classList.remove('success');
+        resultMessage.textContent = '时间到！';
+        correctAnswer.textContent = `正确答案: ${currentWord}`;
+        wrongCount++;
+        wrongCountElement.textContent = wrongCount;
     }
     
     // 事件监听
@@ -0,0 +1,577 @@
+import os
+import sqlite3
+import datetime
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import QueuePool
+
+# 加载环境变量
+load_dotenv()
+
+# 学习阶段编码进 review_count 一起带回时使用的进制，阶段取值必须小于它
+STAGE_PACKING = 16
+
+# SQLite 数据库文件的默认位置
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "english_practice.db")
+
+
+class StorageBackend:
+    """数据库方言相关的操作
+
+    WordModel 和初始化代码通过当前后端（模块级的 backend）获得连接、表结构检查、
+    建索引和加列的语句，以及各种插入或更新语句，不直接写某一种数据库特有的SQL。
+    """
+
+    name = "base"
+    label = "数据库"
+    # 导入词汇表时能否并行写入多个表
+    parallel_import = True
+    # 原始DBAPI连接使用的参数占位符
+    placeholder = "%s"
+    # 是否支持把学习记录表按用户哈希分区
+    supports_partitioning = False
+
+    # 按天累计指标（见 init_db 迁移4）
+    UPSERT_DAILY_STAT = None
+    # 延迟写入的批量插入或更新，以及只更新阶段的语句（见 progress_writer）
+    FLUSH_UPSERT = None
+    FLUSH_STAGE_UPDATE = None
+    # 添加唯一键之前把重复的单词合并到最早的那条记录上（见 init_db 迁移1）
+    MERGE_DUPLICATE_WORDS = ()
+    # 最初版本的学习记录表，之后的字段和索引由迁移添加
+    CREATE_LEARNED_WORDS = None
+    # 导入脚本替换词汇表后把该表的版本号加一（原始DBAPI语句，见 init_db.CREATE_VOCABULARY_VERSIONS）
+    BUMP_VOCABULARY_VERSION = None
+    # 把用户的统计版本号加一并带回新的版本号（见 init_db 迁移7）
+    BUMP_STATS_VERSION = None
+
+    def database_name(self):
+        """用于日志和 /status 的数据库名"""
+        raise NotImplementedError
+
+    def create_engine(self, pool_options):
+        """创建带连接池的 SQLAlchemy 引擎"""
+        raise NotImplementedError
+
+    def create_database(self):
+        """创建数据库（如果不存在），失败时抛出异常"""
+        raise NotImplementedError
+
+    def connect(self):
+        """创建原始DBAPI连接，供批量导入使用"""
+        raise NotImplementedError
+
+    def table_exists(self, db_session, table_name):
+        raise NotImplementedError
+
+    def get_existing_indexes(self, db_session, table_name):
+        """表上已有的索引名（与 init_db 中索引定义的键一致），有主键时包含 PRIMARY"""
+        raise NotImplementedError
+
+    def index_statements(self, table_name, indexes):
+        """创建索引的语句；indexes 是 {索引名: (字段列表, 是否唯一)}"""
+        raise NotImplementedError
+
+    def drop_index_statements(self, table_name, names):
+        """删除索引的语句；names 中的索引必须存在"""
+        raise NotImplementedError
+
+    def add_column_statements(self, table_name, columns):
+        """添加字段的语句；columns 是 [(字段名, 定义, 注释)]"""
+        raise NotImplementedError
+
+    def partition_statements(self, db_session, table_name, column, partitions):
+        """把表按 column 哈希划分为 partitions 个分区的语句，已经是这样分区时返回空列表"""
+        return []
+
+    def analyze_statement(self, table_name):
+        """更新表统计信息的语句"""
+        raise NotImplementedError
+
+    def create_staging_table(self, cursor, staging):
+        """创建导入词汇表用的临时表，只带主键"""
+        raise NotImplementedError
+
+    def swap_in_table(self, cursor, table_name, staging, indexes):
+        """为临时表建好 indexes 中的索引后替换旧表"""
+        raise NotImplementedError
+
+    def upsert_learned_word(self, db_session, params):
+        """插入学习记录，该用户已有这个单词时复习次数加一、学习阶段取较大值
+
+        返回 (是否新插入, 新的复习次数, 更新前的阶段)，由调用方提交事务。
+        """
+        raise NotImplementedError
+
+    def begin_write(self, db_session):
+        """先读后写时在读取之前开始写事务（默认不需要）"""
+
+    def bump_stats_version(self, db_session, user_id):
+        """该用户的统计版本号加一，返回新的版本号，由调用方提交事务"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _check_stage(params):
+        # 阶段和复习次数编码在同一个整数中带回，阶段超出范围会破坏两者
+        stage = params["stage"]
+        if not isinstance(stage, int) or not 0 <= stage < STAGE_PACKING:
+            raise ValueError(f"学习阶段必须是小于 {STAGE_PACKING} 的非负整数: {stage!r}")
+
+
+class MySQLBackend(StorageBackend):
+    """MySQL（pymysql 驱动）"""
+
+    name = "mysql"
+    label = "MySQL"
+    supports_partitioning = True
+
+    UPSERT_DAILY_STAT = text("""
+        INSERT INTO daily_stats (user_id, day, metric, value) VALUES (:user_id, :day, :metric, :value)
+        ON DUPLICATE KEY UPDATE value = value + VALUES(value)
+    """)
+
+    # 新记录的 due_time 显式写入应用的本地时间，与 SQLite 一致（列默认值 CURRENT_TIMESTAMP 取的是数据库服务器的时区），
+    # 取词时与 datetime.now() 比较；已有的记录保留原来的复习计划
+    FLUSH_UPSERT = text("""
+        INSERT INTO learned_words
+            (user_id, word, translate, level, source_table, learn_time, review_count, last_review_time, learn_stage, due_time)
+        VALUES (:user_id, :word, :translate, :level, :source_table, :learn_time, :review_count, :last_review_time, :stage,
+                :learn_time)
+        ON DUPLICATE KEY UPDATE
+            review_count = COALESCE(review_count, 0) + VALUES(review_count),
+            last_review_time = GREATEST(COALESCE(last_review_time, VALUES(last_review_time)), VALUES(last_review_time)),
+            learn_stage = GREATEST(COALESCE(learn_stage, 0), VALUES(learn_stage))
+    """)
+
+    FLUSH_STAGE_UPDATE = text("""
+        UPDATE learned_words
+        SET learn_stage = GREATEST(COALESCE(learn_stage, 0), :stage),
+            last_review_time = GREATEST(COALESCE(last_review_time, :last_review_time), :last_review_time)
+        WHERE user_id = :user_id AND word = :word
+    """)
+
+    # 依赖 learned_words (user_id, word) 上的唯一键（见 init_db 迁移5）。
+    # LAST_INSERT_ID(expr) 把更新前的阶段和新的复习次数编码后带回客户端，
+    # 这样不需要再查询一次就能得到返回值。due_time 与 FLUSH_UPSERT 一样显式写入
+    UPSERT_LEARNED_WORD = text(f"""
+        INSERT INTO learned_words
+            (user_id, word, translate, level, source_table, learn_time, review_count, last_review_time, learn_stage, due_time)
+        VALUES (:user_id, :word, :translate, :level, :source_table, :now, 1, :now, :stage, :now)
+        ON DUPLICATE KEY UPDATE
+            review_count = LAST_INSERT_ID(
+                (COALESCE(review_count, 0) + 1) * {STAGE_PACKING} + COALESCE(learn_stage, 0)
+            ) DIV {STAGE_PACKING},
+            last_review_time = VALUES(last_review_time),
+            learn_stage = GREATEST(COALESCE(learn_stage, 0), VALUES(learn_stage))
+    """)
+
+    MERGE_DUPLICATE_WORDS = (
+        """
+        UPDATE learned_words keep
+        JOIN (
+            SELECT word, MIN(id) AS id, SUM(review_count) AS review_count,
+                   MAX(learn_stage) AS learn_stage, MAX(last_review_time) AS last_review_time
+            FROM learned_words
+            GROUP BY word
+            HAVING COUNT(*) > 1
+        ) dup ON keep.id = dup.id
+        SET keep.review_count = dup.review_count,
+            keep.learn_stage = dup.learn_stage,
+            keep.last_review_time = dup.last_review_time
+        """,
+        """
+        DELETE extra FROM learned_words extra
+        JOIN learned_words keep ON extra.word = keep.word AND extra.id > keep.id
+        """
+    )
+
+    CREATE_LEARNED_WORDS = """
+        CREATE TABLE IF NOT EXISTS learned_words (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            word VARCHAR(255) NOT NULL,
+            translate TEXT NOT NULL,
+            level VARCHAR(50),
+            source_table VARCHAR(50),
+            learn_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            review_count INT DEFAULT 0,
+            last_review_time DATETIME NULL,
+            learn_stage INT DEFAULT 1 COMMENT '学习阶段：1=认识，2=填空，3=盲打，4=复习完成'
+        )
+    """
+
+    BUMP_VOCABULARY_VERSION = """
+        INSERT INTO vocabulary_versions (table_name, version) VALUES (%s, 1)
+        ON DUPLICATE KEY UPDATE version = version + 1
+    """
+
+    BUMP_STATS_VERSION = text("""
+        INSERT INTO stats_versions (user_id, version) VALUES (:user_id, LAST_INSERT_ID(1))
+        ON DUPLICATE KEY UPDATE version = LAST_INSERT_ID(version + 1)
+    """)
+
+    def _connection_options(self):
+        # 每次读取环境变量，导入脚本和基准测试可以在运行时切换数据库
+        return {
+            "host": os.getenv("MYSQL_HOST", "localhost"),
+            "port": int(os.getenv("MYSQL_PORT", "3306")),
+            "user": os.getenv("MYSQL_USER", "root"),
+            "password": os.getenv("MYSQL_PASSWORD", "")
+        }
+
+    def database_name(self):
+        return os.getenv("MYSQL_DB", "english_practice")
+
+    def create_engine(self, pool_options):
+        options = self._connection_options()
+        db_url = (f"mysql+pymysql://{options['user']}:{options['password']}"
+                  f"@{options['host']}:{options['port']}/{self.database_name()}")
+        return create_engine(db_url, echo=False, **pool_options)
+
+    def create_database(self):
+        # 延迟导入：只使用 SQLite 时不需要安装 pymysql
+        import pymysql
+        conn = pymysql.connect(**self._connection_options())
+        try:
+            conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {self.database_name()} "
+                                  "DEFAULT CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci")
+        finally:
+            conn.close()
+
+    def connect(self):
+        import pymysql
+        return pymysql.connect(database=self.database_name(), charset='utf8mb4', autocommit=False,
+                               **self._connection_options())
+
+    def table_exists(self, db_session, table_name):
+        query = text("""
+            SELECT COUNT(*) FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+        """)
+        return db_session.execute(query, {"table": table_name}).scalar() > 0
+
+    def get_existing_indexes(self, db_session, table_name):
+        query = text("""
+            SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table
+        """)
+        return {row[0] for row in db_session.execute(query, {"table": table_name}).fetchall()}
+
+    def index_statements(self, table_name, indexes):
+        clauses = []
+        for name, (columns, unique) in indexes.items():
+            if name == 'PRIMARY':
+                # 导入的词汇表没有主键，补一个自增的代理主键
+                clauses.append(f"ADD COLUMN {columns} INT AUTO_INCREMENT PRIMARY KEY FIRST")
+            else:
+                clauses.append(f"ADD {'UNIQUE KEY' if unique else 'KEY'} {name} ({columns})")
+        return [f"ALTER TABLE {table_name} {', '.join(clauses)}"] if clauses else []
+
+    def drop_index_statements(self, table_name, names):
+        clauses = [f"DROP INDEX {name}" for name in names]
+        return [f"ALTER TABLE {table_name} {', '.join(clauses)}"] if clauses else []
+
+    def add_column_statements(self, table_name, columns):
+        clauses = [f"ADD COLUMN {name} {definition} COMMENT '{comment}'" for name, definition, comment in columns]
+        return [f"ALTER TABLE {table_name} {', '.join(clauses)}"] if clauses else []
+
+    def partition_statements(self, db_session, table_name, column, partitions):
+        current = db_session.execute(text("""
+            SELECT COUNT(*) FROM information_schema.PARTITIONS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL
+        """), {"table": table_name}).scalar()
+        if current == partitions:
+            return []
+        statements = []
+        primary_key = [row[0] for row in db_session.execute(text("""
+            SELECT COLUMN_NAME FROM information_schema.STATISTICS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND INDEX_NAME = 'PRIMARY'
+            ORDER BY SEQ_IN_INDEX
+        """), {"table": table_name}).fetchall()]
+        if column not in primary_key:
+            # 分区表的每个唯一键（包括主键）都必须包含分区字段；自增的 id 仍是主键的第一列
+            statements.append(f"ALTER TABLE {table_name} DROP PRIMARY KEY, "
+                              f"ADD PRIMARY KEY ({', '.join(primary_key + [column])})")
+        # user_id 是字符串，用 KEY 分区（MySQL 对字段值做哈希）；已分区的表会按新的分区数重新分布
+        statements.append(f"ALTER TABLE {table_name} PARTITION BY KEY ({column}) PARTITIONS {partitions}")
+        return statements
+
+    def analyze_statement(self, table_name):
+        return f"ANALYZE TABLE {table_name}"
+
+    def create_staging_table(self, cursor, staging):
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"""
+            CREATE TABLE {staging} (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                word VARCHAR(255) NULL,
+                translate TEXT NULL
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+        """)
+
+    def swap_in_table(self, cursor, table_name, staging, indexes):
+        # 建好索引后用 RENAME TABLE 原子地替换旧表，导入期间旧表仍可读
+        for statement in self.index_statements(staging, indexes):
+            cursor.execute(statement)
+
+        cursor.execute("SELECT COUNT(*) FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", (table_name,))
+        if cursor.fetchone()[0]:
+            cursor.execute(f"DROP TABLE IF EXISTS {table_name}__old")
+            cursor.execute(f"RENAME TABLE {table_name} TO {table_name}__old, {staging} TO {table_name}")
+            cursor.execute(f"DROP TABLE {table_name}__old")
+        else:
+            cursor.execute(f"RENAME TABLE {staging} TO {table_name}")
+
+    def upsert_learned_word(self, db_session, params):
+        self._check_stage(params)
+        result = db_session.execute(self.UPSERT_LEARNED_WORD, params)
+        # 受影响行数为1表示插入了新记录，为2表示更新了已有记录
+        if result.rowcount == 1:
+            return True, 1, None
+        review_count, old_stage = divmod(result.lastrowid, STAGE_PACKING)
+        return False, review_count, old_stage
+
+    def bump_stats_version(self, db_session, user_id):
+        # 新的版本号由 LAST_INSERT_ID(expr) 带回，不需要再查询一次
+        return db_session.execute(self.BUMP_STATS_VERSION, {"user_id": user_id}).lastrowid
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite（WAL 模式），适合单机部署和不依赖MySQL服务的测试
+
+    与 MySQL 的差异：
+      - 索引名在整个数据库内唯一，实际名称加上 "表名__" 前缀，读取时再去掉；
+      - 单词字段使用 NOCASE 排序规则，与 MySQL 的 utf8mb4_unicode_ci 一样不区分大小写；
+      - 时间按秒精度的 "YYYY-MM-DD HH:MM:SS" 文本保存，与 MySQL 的 DATETIME 一致，
+        这样分页游标中的时间可以直接比较；
+      - 同一时间只有一个写事务，导入词汇表时逐个文件写入；
+      - 不支持表分区，学习记录只按以 user_id 开头的索引划分。
+    """
+
+    name = "sqlite"
+    label = "SQLite"
+    parallel_import = False
+    placeholder = "?"
+
+    # 本地时间，与 datetime.now() 写入的时间一致（CURRENT_TIMESTAMP 是 UTC）
+    CURRENT_TIMESTAMP = "(datetime('now', 'localtime'))"
+
+    UPSERT_DAILY_STAT = text("""
+        INSERT INTO daily_stats (user_id, day, metric, value) VALUES (:user_id, :day, :metric, :value)
+        ON CONFLICT (user_id, day, metric) DO UPDATE SET value = value + excluded.value
+    """)
+
+    # MySQL 的 DATETIME DEFAULT CURRENT_TIMESTAMP 无法通过 ALTER TABLE 添加，
+    # 所以插入语句显式写入 due_time（见 add_column_statements）
+    FLUSH_UPSERT = text("""
+        INSERT INTO learned_words
+            (user_id, word, translate, level, source_table, learn_time, review_count, last_review_time, learn_stage, due_time)
+        VALUES (:user_id, :word, :translate, :level, :source_table, :learn_time, :review_count, :last_review_time, :stage, :learn_time)
+        ON CONFLICT (user_id, word) DO UPDATE SET
+            review_count = COALESCE(review_count, 0) + excluded.review_count,
+            last_review_time = MAX(COALESCE(last_review_time, excluded.last_review_time), excluded.last_review_time),
+            learn_stage = MAX(COALESCE(learn_stage, 0), excluded.learn_stage)
+    """)
+
+    FLUSH_STAGE_UPDATE = text("""
+        UPDATE learned_words
+        SET learn_stage = MAX(COALESCE(learn_stage, 0), :stage),
+            last_review_time = MAX(COALESCE(last_review_time, :last_review_time), :last_review_time)
+        WHERE user_id = :user_id AND word = :word
+    """)
+
+    # RETURNING 只能读到更新后的值，更新前的阶段由 SELECT_LEARN_STAGE 在同一个写事务中先读出
+    SELECT_LEARN_STAGE = text("SELECT COALESCE(learn_stage, 0) FROM learned_words WHERE user_id = :user_id AND word = :word")
+    UPSERT_LEARNED_WORD = text("""
+        INSERT INTO learned_words
+            (user_id, word, translate, level, source_table, learn_time, review_count, last_review_time, learn_stage, due_time)
+        VALUES (:user_id, :word, :translate, :level, :source_table, :now, 1, :now, :stage, :now)
+        ON CONFLICT (user_id, word) DO UPDATE SET
+            review_count = COALESCE(review_count, 0) + 1,
+            last_review_time = excluded.last_review_time,
+            learn_stage = MAX(COALESCE(learn_stage, 0), excluded.learn_stage)
+        RETURNING review_count
+    """)
+
+    MERGE_DUPLICATE_WORDS = (
+        """
+        UPDATE learned_words
+        SET review_count = dup.review_count,
+            learn_stage = dup.learn_stage,
+            last_review_time = dup.last_review_time
+        FROM (
+            SELECT word, MIN(id) AS id, SUM(review_count) AS review_count,
+                   MAX(learn_stage) AS learn_stage, MAX(last_review_time) AS last_review_time
+            FROM learned_words
+            GROUP BY word
+            HAVING COUNT(*) > 1
+        ) AS dup
+        WHERE learned_words.id = dup.id
+        """,
+        "DELETE FROM learned_words WHERE id NOT IN (SELECT MIN(id) FROM learned_words GROUP BY word)"
+    )
+
+    CREATE_LEARNED_WORDS = f"""
+        CREATE TABLE IF NOT EXISTS learned_words (
+            id INTEGER PRIMARY KEY,
+            word VARCHAR(255) NOT NULL COLLATE NOCASE,
+            translate TEXT NOT NULL,
+            level VARCHAR(50),
+            source_table VARCHAR(50),
+            learn_time DATETIME DEFAULT {CURRENT_TIMESTAMP},
+            review_count INT DEFAULT 0,
+            last_review_time DATETIME NULL,
+            learn_stage INT DEFAULT 1
+        )
+    """
+
+    BUMP_VOCABULARY_VERSION = """
+        INSERT INTO vocabulary_versions (table_name, version) VALUES (?, 1)
+        ON CONFLICT (table_name) DO UPDATE SET version = version + 1
+    """
+
+    BUMP_STATS_VERSION = text("""
+        INSERT INTO stats_versions (user_id, version) VALUES (:user_id, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+        RETURNING version
+    """)
+
+    # 连接参数：多线程共用连接池、等待写锁的时间，以及按声明类型把 DATETIME/DATE 转换为 datetime
+    BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("SQLITE_PATH", DEFAULT_SQLITE_PATH)
+        # sqlite3 的适配器是进程级的，只在选用 SQLite 时注册
+        sqlite3.register_adapter(datetime.datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+        sqlite3.register_converter("DATETIME", lambda value: datetime.datetime.fromisoformat(value.decode()))
+
+    def database_name(self):
+        return self.path
+
+    def _configure_connection(self, dbapi_connection, connection_record=None):
+        cursor = dbapi_connection.cursor()
+        # WAL 模式下读不阻塞写；synchronous=NORMAL 在 WAL 下只在检查点时同步，断电最多丢失最近的事务
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    def create_engine(self, pool_options):
+        # 文件数据库默认不使用连接池（NullPool），这里显式使用 QueuePool，
+        # 连接池配置和 /status 中的连接池指标与 MySQL 一致
+        engine = create_engine(
+            f"sqlite:///{self.path}", echo=False, poolclass=QueuePool,
+            connect_args={"check_same_thread": False, "timeout": self.BUSY_TIMEOUT,
+                          "detect_types": sqlite3.PARSE_DECLTYPES},
+            **pool_options
+        )
+        event.listen(engine, 'connect', self._configure_connection)
+        return engine
+
+    def create_database(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self.connect().close()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.BUSY_TIMEOUT)
+        self._configure_connection(conn)
+        return conn
+
+    def _index_name(self, table_name, name):
+        return f"{table_name}__{name}"
+
+    def table_exists(self, db_session, table_name):
+        query = text("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = :table")
+        return db_session.execute(query, {"table": table_name}).scalar() > 0
+
+    def get_existing_indexes(self, db_session, table_name):
+        prefix = self._index_name(table_name, "")
+        names = db_session.execute(
+            text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+            {"table": table_name}).fetchall()
+        existing = {name[len(prefix):] for (name,) in names if name.startswith(prefix)}
+        # INTEGER PRIMARY KEY 是 rowid 的别名，没有对应的索引
+        has_primary_key = db_session.execute(
+            text("SELECT COUNT(*) FROM pragma_table_info(:table) WHERE pk > 0"), {"table": table_name}).scalar()
+        if has_primary_key:
+            existing.add('PRIMARY')
+        return existing
+
+    def index_statements(self, table_name, indexes):
+        statements = []
+        for name, (columns, unique) in indexes.items():
+            if name == 'PRIMARY':
+                # SQLite 不能给已有的表加主键；词汇表由导入脚本建表时已带有主键
+                continue
+            statements.append(f"CREATE {'UNIQUE INDEX' if unique else 'INDEX'} IF NOT EXISTS "
+                              f"{self._index_name(table_name, name)} ON {table_name} ({columns})")
+        return statements
+
+    def drop_index_statements(self, table_name, names):
+        return [f"DROP INDEX IF EXISTS {self._index_name(table_name, name)}" for name in names]
+
+    def add_column_statements(self, table_name, columns):
+        statements = []
+        for name, definition, comment in columns:
+            if "DEFAULT CURRENT_TIMESTAMP" in definition:
+                # 添加的字段只能使用常量默认值：已有的记录设为当前时间，新记录由插入语句显式写入
+                definition = definition.replace("DEFAULT CURRENT_TIMESTAMP", "DEFAULT '1970-01-01 00:00:00'")
+                statements.append(f"ALTER TABLE {table_name} ADD COLUMN {name} {definition}")
+                statements.append(f"UPDATE {table_name} SET {name} = {self.CURRENT_TIMESTAMP}")
+            else:
+                statements.append(f"ALTER TABLE {table_name} ADD COLUMN {name} {definition}")
+        return statements
+
+    def analyze_statement(self, table_name):
+        return f"ANALYZE {table_name}"
+
+    def create_staging_table(self, cursor, staging):
+        cursor.execute(f"DROP TABLE IF EXISTS {staging}")
+        cursor.execute(f"""
+            CREATE TABLE {staging} (
+                id INTEGER PRIMARY KEY,
+                word VARCHAR(255) NULL COLLATE NOCASE,
+                translate TEXT NULL
+            )
+        """)
+
+    def swap_in_table(self, cursor, table_name, staging, indexes):
+        # 替换和建索引与之前写入的数据在同一个事务中，提交前其他连接仍读到旧表。
+        # 索引名带有表名前缀，必须在旧表删除、临时表改名之后再建
+        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+        cursor.execute(f"ALTER TABLE {staging} RENAME TO {table_name}")
+        for statement in self.index_statements(table_name, indexes):
+            cursor.execute(statement)
+
+    def begin_write(self, db_session):
+        # pysqlite 只在 INSERT/UPDATE/DELETE 之前隐式开始事务，先读后写时显式开始写事务，
+        # 读出的数据在提交之前不会被其他连接改变
+        dbapi_connection = db_session.connection().connection
+        if not dbapi_connection.in_transaction:
+            dbapi_connection.execute("BEGIN IMMEDIATE")
+
+    def bump_stats_version(self, db_session, user_id):
+        return db_session.execute(self.BUMP_STATS_VERSION, {"user_id": user_id}).scalar()
+
+    def upsert_learned_word(self, db_session, params):
+        self.begin_write(db_session)
+        old_stage = db_session.execute(self.SELECT_LEARN_STAGE, params).scalar()
+        review_count = db_session.execute(self.UPSERT_LEARNED_WORD, params).scalar()
+        return old_stage is None, review_count, old_stage
+
+
+BACKENDS = {
+    MySQLBackend.name: MySQLBackend,
+    SQLiteBackend.name: SQLiteBackend
+}
+
+
+def get_backend(name=None):
+    """按名称（默认取 DB_BACKEND，未设置时为 mysql）创建存储后端"""
+    name = (name or os.getenv("DB_BACKEND", MySQLBackend.name)).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的数据库后端: {name}，可选: {', '.join(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+# 当前使用的存储后端
+backend = get_backend()
@@ -0,0 +1,109 @@
+import json
+import time
+import pytest
+import answer_token
+from answer_token import InvalidToken
+
+
+def _payload(token):
+    return json.loads(answer_token._b64decode(token.split(".")[0]))
+
+
+def _resign(payload):
+    """用正确的密钥给改动过的内容重新签名（模拟能伪造签名以外的一切篡改）"""
+    encoded = answer_token._b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    signature = answer_token._b64encode(answer_token._mac(b"token", encoded.encode("ascii"))[:answer_token.SIGNATURE_BYTES])
+    return f"{encoded}.{signature}"
+
+
+def test_issue_and_check():
+    token = answer_token.issue("typing", 42, "Apple")
+    challenge = answer_token.verify(token, "typing")
+    assert challenge.word_id == 42
+    assert answer_token.check(challenge, "apple")
+    assert answer_token.check(challenge, " APPLE ")
+    assert not answer_token.check(challenge, "appel")
+
+
+def test_blanks_answer_and_positions():
+    token = answer_token.issue("blanks", 7, ["p", "l"], [1, 3])
+    challenge = answer_token.verify(token, "blanks")
+    assert challenge.positions == [1, 3]
+    assert answer_token.check(challenge, ["P", "l"])
+    assert not answer_token.check(challenge, ["l", "p"])
+
+
+def test_token_does_not_contain_the_answer():
+    token = answer_token.issue("typing", 1, "elephant")
+    assert "elephant" not in json.dumps(_payload(token))
+
+
+def test_same_answer_has_different_digests():
+    digests = {_payload(answer_token.issue("choice", None, 2))[5] for _ in range(20)}
+    assert len(digests) == 20
+
+
+def test_sealed_word_is_recoverable_but_not_readable():
+    token = answer_token.issue("typing", None, "elephant", sealed="elephant")
+    assert "elephant" not in json.dumps(_payload(token))
+    challenge = answer_token.verify(token, "typing")
+    assert answer_token.reveal(challenge) == "elephant"
+    assert answer_token.reveal(answer_token.verify(answer_token.issue("typing", 1, "apple"), "typing")) is None
+
+
+def test_expired_token_is_rejected():
+    token = answer_token.issue("typing", 1, "apple", ttl=-1)
+    with pytest.raises(InvalidToken):
+        answer_token.verify(token, "typing")
+
+
+def test_wrong_exercise_is_rejected():
+    token = answer_token.issue("typing", 1, "apple")
+    with pytest.raises(InvalidToken):
+        answer_token.verify(token, "blanks")
+
+
+@pytest.mark.parametrize("token", ["", "abc", "abc.def", "a.b.c", None])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(InvalidToken):
+        answer_token.verify(token, "typing")
+
+
+def test_tampered_payload_is_rejected():
+    token = answer_token.issue("typing", 1, "apple")
+    encoded, signature = token.split(".")
+    payload = _payload(token)
+    payload[1] = 2
+    forged = answer_token._b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    with pytest.raises(InvalidToken):
+        answer_token.verify(f"{forged}.{signature}", "typing")
+    with pytest.raises(InvalidToken):
+        answer_token.verify(f"{encoded}.{signature[:-2]}AA", "typing")
+
+
+def test_digest_is_bound_to_its_token():
+    donor = _payload(answer_token.issue("typing", 1, "apple"))
+    target = _payload(answer_token.issue("typing", 2, "banana"))
+    # 把一个令牌的答案摘要移到另一个令牌中，或改动单词id、过期时间后摘要不再匹配
+    for field, value in ((5, donor[5]), (1, 1), (4, target[4] + 60)):
+        payload = list(target)
+        payload[field] = value
+        challenge = answer_token.verify(_resign(payload), "typing")
+        assert not answer_token.check(challenge, "apple")
+        assert not answer_token.check(challenge, "banana")
+
+
+def test_token_can_be_redeemed_only_once():
+    challenge = answer_token.verify(answer_token.issue("typing", 1, "apple"), "typing")
+    answer_token.redeem(challenge)
+    with pytest.raises(InvalidToken):
+        answer_token.redeem(challenge)
+    other = answer_token.verify(answer_token.issue("typing", 1, "apple"), "typing")
+    answer_token.redeem(other)
+
+
+def test_expired_redemptions_are_forgotten():
+    challenge = answer_token.verify(answer_token.issue("typing", 1, "apple"), "typing")
+    answer_token.redeem(challenge._replace(expires=int(time.time()) - 1))
+    answer_token.redeem(answer_token.verify(answer_token.issue("typing", 1, "apple"), "typing"))
+    assert challenge.nonce not in answer_token._redeemed
@@ -0,0 +1,130 @@
+import datetime
+import pytest
+from sqlalchemy import text
+import init_db
+import storage
+import progress_writer
+import progress_stats
+import vocab_cache
+import app as app_module
+from models import WordModel
+from vocab_cache import LevelVocabulary
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """使用临时 SQLite 数据库的测试客户端，学习记录中有 12 个已到期、可以进入填空和盲打的单词"""
+    monkeypatch.setattr(storage, "backend", storage.SQLiteBackend(str(tmp_path / "test.db")))
+    monkeypatch.setattr(progress_writer, "queue", None)
+    monkeypatch.setattr(init_db, "session", None)
+    monkeypatch.setattr(init_db, "engine", None)
+    monkeypatch.setattr(init_db, "use_in_memory", False)
+    assert init_db.init_database()
+    progress_stats.stats.invalidate()
+    for i in range(12):
+        WordModel.add_learned_word({"word": f"word{i}", "meaning": "n.单词", "level": "初中"}, stage=2)
+    init_db.session.execute(text("UPDATE learned_words SET due_time = :due"),
+                            {"due": datetime.datetime.now() - datetime.timedelta(days=1)})
+    init_db.session.commit()
+    yield app_module.app.test_client()
+    init_db.session.remove()
+    init_db.engine.dispose()
+
+
+@pytest.mark.parametrize("url", ["/api/words-with-blanks", "/api/typing-words"])
+def test_refills_do_not_overlap(client, url):
+    first = client.get(f"{url}?count=5").json["words"]
+    again = client.get(f"{url}?count=5").json["words"]
+    # 不带 exclude 时到期的单词按固定顺序返回
+    assert [word["id"] for word in again] == [word["id"] for word in first]
+
+    buffered = [word["id"] for word in first]
+    second = client.get(f"{url}?count=5&exclude={','.join(map(str, buffered))}").json["words"]
+    assert len(second) == 5
+    assert not {word["id"] for word in second} & set(buffered)
+
+    buffered += [word["id"] for word in second]
+    third = client.get(f"{url}?count=5&exclude={','.join(map(str, buffered))}").json["words"]
+    assert len(third) == 2
+    assert not {word["id"] for word in third} & set(buffered)
+
+
+def test_invalid_exclude_is_rejected(client):
+    assert client.get("/api/typing-words?exclude=1,abc").status_code == 400
+
+
+def test_random_meaning_reveals_the_correct_word(client, monkeypatch):
+    # 随机释义取自词汇，单词没有学习记录id
+    monkeypatch.setattr(vocab_cache, "_snapshot_levels", {
+        "junior": LevelVocabulary.from_rows("junior", [("elephant", "n.大象"), ("relevant", "adj.相关的")])})
+    monkeypatch.setattr(WordModel, "get_random_word",
+                        lambda *args, **kwargs: {"word": "elephant", "meaning": "n.大象", "level": "初中"})
+    token = client.get("/api/random-meaning").json["token"]
+    result = client.post("/api/check-typing", json={"token": token, "answer": "elefant"}).json
+    assert result["is_correct"] is False
+    assert result["correct_word"] == "elephant"
+    assert result["distance"] == 2
+    assert result["schedule"] is None
+
+
+def test_answers_on_words_not_yet_due_still_count(client):
+    word_id = init_db.session.execute(text("SELECT MIN(id) FROM learned_words")).scalar()
+    first = WordModel.record_review(word_id, 5, "typing", True)
+    assert first["message"] == "已更新复习计划"
+    again = WordModel.record_review(word_id, 5, "typing", True)
+    # 没有到期时复习计划不变，但作答照样计入正确率
+    assert again["due_time"] == first["due_time"]
+    assert again["interval_days"] == first["interval_days"]
+    accuracy = progress_stats.stats.get(init_db.DEFAULT_USER_ID).summary()["accuracy"]["typing"]
+    assert accuracy["answered"] == 2
+    assert accuracy["correct"] == 2
+
+
+def test_upsert_returns_the_stage_before_the_update(client):
+    params = {"user_id": init_db.DEFAULT_USER_ID, "word": "fresh", "translate": "adj.新鲜的", "level": "初中",
+              "source_table": None, "now": datetime.datetime.now(), "stage": 2}
+    assert storage.backend.upsert_learned_word(init_db.session, params) == (True, 1, None)
+    init_db.session.commit()
+    assert storage.backend.upsert_learned_word(init_db.session, dict(params, stage=3)) == (False, 2, 2)
+    init_db.session.rollback()
+    assert storage.backend.upsert_learned_word(init_db.session, dict(params, stage=1)) == (False, 2, 2)
+    init_db.session.commit()
+
+
+def test_write_behind_flush_updates_stats_incrementally(client, monkeypatch):
+    user_stats = progress_stats.stats.get(init_db.DEFAULT_USER_ID)
+    assert user_stats.summary()["total"] == 12
+    queue = progress_writer.WriteBehindQueue()
+    monkeypatch.setattr(progress_writer, "queue", queue)
+    WordModel.add_learned_word({"word": "word0", "meaning": "n.单词", "level": "初中"}, stage=3)
+    WordModel.add_learned_word({"word": "word0", "meaning": "n.单词", "level": "初中"}, stage=1)
+    WordModel.add_learned_word({"word": "fresh", "meaning": "adj.新鲜的", "level": "高中"}, stage=1)
+    WordModel.update_word_stage_by_word("word1", 4)
+    assert queue.flush() == 3
+
+    seeds = []
+    monkeypatch.setattr(user_stats, "_seed", lambda: seeds.append(True))
+    summary = user_stats.summary()
+    # 批量写入的结果增量计入汇总，不需要重新汇总
+    assert not seeds
+    assert summary["total"] == 13
+    assert summary["by_level"] == {"初中": 12, "高中": 1}
+    assert summary["by_stage"] == {"1": 1, "2": 10, "3": 1, "4": 1}
+    assert summary["daily"][-1]["reviewed"] == 2
+    assert summary["daily"][-1]["learned"] == 13
+
+
+def test_writes_from_other_processes_reseed_the_stats(client):
+    user_stats = progress_stats.stats.get(init_db.DEFAULT_USER_ID)
+    assert user_stats.summary()["total"] == 12
+    # 模拟另一个进程：写入学习记录并在同一事务中把版本号加一，本进程内存中的汇总不知道这次写入
+    other = progress_stats.ProgressStats(init_db.DEFAULT_USER_ID)
+    WordModel.add_learned_word({"word": "word0", "meaning": "n.单词", "level": "初中"}, stage=4)
+    storage.backend.upsert_learned_word(init_db.session, {
+        "user_id": init_db.DEFAULT_USER_ID, "word": "other", "translate": "adj.其他的", "level": "高中",
+        "source_table": None, "now": datetime.datetime.now(), "stage": 1})
+    other.change()
+    init_db.session.commit()
+    summary = user_stats.summary()
+    assert summary["total"] == 13
+    assert summary["by_stage"] == {"1": 1, "2": 11, "4": 1}
@@ -0,0 +1,100 @@
+import random
+import pytest
+import vocab_cache
+import attribute_index
+from vocab_cache import LevelVocabulary
+
+ROWS = [
+    ("apple", "n.苹果"), ("run", "v.跑n.奔跑"), ("quick", "adj.快的"), ("a", "art.一个"),
+    ("international", "adj.国际的"), ("table", "n.桌子"), ("jump", "v.跳"), ("blue", "adj.蓝色的"),
+    ("incomprehensibilities", "n.不可理解的事物"), ("go", "v.去"), ("sky", "n.天空"), ("cat", "n.猫"),
+]
+
+
+def _vocabulary(table_name="junior", rows=ROWS):
+    return LevelVocabulary.from_rows(table_name, rows)
+
+
+def _brute_force(rows, pos=None, min_length=None, max_length=None):
+    matches = set()
+    for row, (word, meaning) in enumerate(rows):
+        tags = [tag for tag in ("n", "v", "adj", "art") if f"{tag}." in meaning]
+        if pos and not set(pos) & set(tags):
+            continue
+        if min_length is not None and len(word) < min_length:
+            continue
+        if max_length is not None and len(word) > max_length:
+            continue
+        matches.add(row)
+    return matches
+
+
+def _rows(bitmap):
+    return {row for row in range(bitmap.bit_length()) if bitmap >> row & 1}
+
+
+def test_select_finds_the_kth_set_bit():
+    rng = random.Random(1)
+    for _ in range(50):
+        rows = sorted(rng.sample(range(3000), rng.randint(1, 200)))
+        bitmap = attribute_index._bitmap(rows, 3000)
+        assert bitmap.bit_count() == len(rows)
+        for rank, row in enumerate(rows):
+            assert attribute_index.select(bitmap, rank) == row
+
+
+def test_select_single_and_edge_bits():
+    assert attribute_index.select(1, 0) == 0
+    assert attribute_index.select(1 << 100, 0) == 100
+    assert attribute_index.select(0b1011, 2) == 3
+
+
+@pytest.mark.parametrize("pos,min_length,max_length", [
+    (None, None, None), (["n"], None, None), (["v", "adj"], None, None), (None, 3, 5),
+    (["n"], 4, None), (None, None, 1), (None, 30, None), (["adj"], 1, 30), (["prep"], None, None), (None, 0, 0),
+])
+def test_candidates_match_brute_force(pos, min_length, max_length):
+    index = attribute_index.TableAttributeIndex(_vocabulary())
+    assert _rows(index.candidates(pos, min_length, max_length)) == _brute_force(ROWS, pos, min_length, max_length)
+
+
+def test_words_longer_than_the_bitmaps(monkeypatch):
+    monkeypatch.setattr(attribute_index, "MAX_LENGTH", 8)
+    index = attribute_index.TableAttributeIndex(_vocabulary())
+    assert _rows(index.candidates(min_length=9)) == {4, 8}
+    assert _rows(index.candidates(max_length=20)) == _brute_force(ROWS)
+
+
+@pytest.fixture
+def levels(monkeypatch):
+    levels = {"junior": _vocabulary("junior"), "high": _vocabulary("high", [("banana", "n.香蕉"), ("swim", "v.游泳")])}
+    monkeypatch.setattr(vocab_cache, "_snapshot_levels", levels)
+    return levels
+
+
+def test_sample_returns_distinct_matching_rows(levels):
+    for _ in range(20):
+        picked = attribute_index.sample(["junior", "high"], 4, pos=["n"], max_length=6)
+        assert len(picked) == len(set(picked)) == 4
+        for table_name, row in picked:
+            word = levels[table_name].word(row)
+            assert len(word) <= 6
+            assert "n." in levels[table_name].meaning(row)
+
+
+def test_sample_covers_every_match(levels):
+    expected = {("junior", row) for row in _brute_force(ROWS, ["v"])} | {("high", 1)}
+    assert set(attribute_index.sample(["junior", "high"], 100, pos=["v"])) == expected
+
+
+def test_sample_without_matches(levels):
+    assert attribute_index.sample(["junior", "high"], 3, pos=["prep"]) == []
+
+
+def test_index_is_rebuilt_when_the_vocabulary_changes(levels):
+    first = attribute_index.get_table_index("high")
+    assert attribute_index.get_table_index("high") is first
+    levels["high"] = _vocabulary("high", [("pear", "n.梨")])
+    rebuilt = attribute_index.get_table_index("high")
+    assert rebuilt is not first
+    assert len(rebuilt) == 1
@@ -0,0 +1,58 @@
+from deck_sampler import ShuffledDeck
+
+
+def test_one_round_is_a_permutation():
+    for size in (1, 2, 3, 10, 97, 1000, 4097):
+        deck = ShuffledDeck(size, seed=12345)
+        drawn = [deck.draw() for _ in range(size)]
+        assert sorted(drawn) == list(range(size))
+        assert deck.remaining() == 0
+
+
+def test_same_seed_gives_same_order():
+    first = ShuffledDeck(500, seed=7)
+    second = ShuffledDeck(500, seed=7)
+    assert [first.draw() for _ in range(500)] == [second.draw() for _ in range(500)]
+
+
+def test_different_seeds_shuffle_differently():
+    orders = {tuple(ShuffledDeck(200, seed=seed).peek(200)) for seed in range(5)}
+    assert len(orders) == 5
+
+
+def test_resume_from_state_continues_without_repeats():
+    deck = ShuffledDeck(300, seed=99)
+    seen = [deck.draw() for _ in range(120)]
+    # 状态存入会话后在另一个请求中恢复
+    resumed = ShuffledDeck.from_state(deck.state(), 300)
+    assert resumed.cursor == 120
+    seen += [resumed.draw() for _ in range(180)]
+    assert sorted(seen) == list(range(300))
+
+
+def test_state_for_a_different_size_reshuffles():
+    deck = ShuffledDeck(300, seed=99, cursor=50)
+    resumed = ShuffledDeck.from_state(deck.state(), 301)
+    assert resumed.size == 301
+    assert resumed.cursor == 0
+    assert ShuffledDeck.from_state(None, 10).cursor == 0
+    assert ShuffledDeck.from_state([1, 11, 10], 10).cursor == 0
+
+
+def test_next_round_reshuffles():
+    deck = ShuffledDeck(50, seed=3)
+    first_round = [deck.draw() for _ in range(50)]
+    second_round = [deck.draw() for _ in range(50)]
+    assert sorted(second_round) == list(range(50))
+    assert second_round != first_round
+
+
+def test_peek_does_not_move_the_cursor():
+    deck = ShuffledDeck(20, seed=5, cursor=3)
+    upcoming = deck.peek(4)
+    assert deck.cursor == 3
+    assert [deck.draw() for _ in range(4)] == upcoming
+
+
+def test_empty_deck():
+    assert ShuffledDeck(0).draw() is None
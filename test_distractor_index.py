@@ -0,0 +1,105 @@
+import pytest
+import distractor_index
+from vocab_cache import LevelVocabulary
+
+ROWS = [
+    ("apple", "n.苹果"), ("apply", "v.申请；应用"), ("ample", "adj.充足的"), ("maple", "n.枫树"),
+    ("table", "n.桌子"), ("cable", "n.电缆"), ("fable", "n.寓言"), ("able", "adj.能够的"),
+    ("banana", "n.香蕉"), ("orange", "n.橙子"), ("grape", "n.葡萄"), ("lemon", "n.柠檬"),
+    ("run", "v.跑"), ("jump", "v.跳"), ("walk", "v.走"), ("swim", "v.游泳"),
+]
+
+
+def _vocabulary(rows=ROWS):
+    return LevelVocabulary.from_rows("junior", rows)
+
+
+@pytest.fixture
+def loaded(tmp_path, monkeypatch):
+    vocabulary = _vocabulary()
+    path = str(tmp_path / "test.distractors")
+    distractor_index.write_index({"junior": (vocabulary, distractor_index.build_level(vocabulary, per_word=4))},
+                                 path, per_word=4)
+    index = distractor_index.DistractorIndex(path)
+    monkeypatch.setattr(distractor_index, "index", index)
+    yield vocabulary, index
+    index.close()
+
+
+def test_fingerprint_tracks_content():
+    assert distractor_index.fingerprint(_vocabulary()) == distractor_index.fingerprint(_vocabulary())
+    changed = list(ROWS)
+    changed[0] = ("apple", "n.苹果；苹果树")
+    assert distractor_index.fingerprint(_vocabulary(changed)) != distractor_index.fingerprint(_vocabulary())
+    assert distractor_index.fingerprint(_vocabulary(ROWS[::-1])) != distractor_index.fingerprint(_vocabulary())
+
+
+def test_built_distractors_are_other_words(loaded):
+    vocabulary, index = loaded
+    for row in range(len(vocabulary)):
+        candidates = index.get("junior", row)
+        assert candidates
+        assert row not in candidates
+        assert len(set(candidates)) == len(candidates)
+        assert all(0 <= candidate < len(vocabulary) for candidate in candidates)
+    # 拼写相近、词性相同的单词排在前面
+    assert index.get("junior", 4)[0] in (5, 6)
+
+
+def test_index_round_trip(loaded):
+    vocabulary, index = loaded
+    assert index.per_word == 4
+    rows, level_fingerprint, _ = index.levels["junior"]
+    assert rows == len(vocabulary)
+    assert level_fingerprint == distractor_index.fingerprint(vocabulary)
+    assert index.matches(vocabulary)
+
+
+def test_choose_uses_the_index(loaded, monkeypatch):
+    vocabulary, index = loaded
+    monkeypatch.setattr(distractor_index, "_random_distractors",
+                        lambda *args: pytest.fail("索引可用时不应随机选取"))
+    for _ in range(20):
+        chosen = distractor_index.choose(vocabulary, 0, 3)
+        assert len(chosen) == 3
+        assert set(chosen) <= set(index.get("junior", 0))
+
+
+def test_changed_vocabulary_falls_back_to_random(loaded):
+    _, index = loaded
+    changed = list(ROWS)
+    changed[4] = ("tablet", "n.药片")
+    vocabulary = _vocabulary(changed)
+    assert not index.matches(vocabulary)
+    for _ in range(20):
+        chosen = distractor_index.choose(vocabulary, 4, 3)
+        assert len(chosen) == 3
+        assert 4 not in chosen
+        assert len(set(chosen)) == 3
+
+
+def test_missing_level_falls_back_to_random(loaded):
+    _, index = loaded
+    vocabulary = LevelVocabulary.from_rows("high", ROWS)
+    assert not index.matches(vocabulary)
+    assert len(distractor_index.choose(vocabulary, 0, 3)) == 3
+
+
+def test_no_index_uses_random(monkeypatch):
+    monkeypatch.setattr(distractor_index, "index", None)
+    vocabulary = _vocabulary()
+    chosen = distractor_index.choose(vocabulary, 0, 3)
+    assert len(chosen) == 3
+    assert 0 not in chosen
+
+
+def test_load_missing_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(distractor_index, "index", None)
+    assert distractor_index.load(str(tmp_path / "missing.distractors")) is None
+
+
+def test_invalid_file_is_rejected(tmp_path):
+    path = tmp_path / "bad.distractors"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        distractor_index.DistractorIndex(str(path))
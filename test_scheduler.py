@@ -0,0 +1,44 @@
+import datetime
+import scheduler
+
+NOW = datetime.datetime(2024, 1, 1, 8, 0, 0)
+
+
+def test_first_two_correct_answers_use_fixed_intervals():
+    ease, interval, repetitions, due = scheduler.review(None, 0, 0, 5, NOW)
+    assert (interval, repetitions) == (scheduler.FIRST_INTERVAL_DAYS, 1)
+    assert due == NOW + datetime.timedelta(days=1)
+
+    ease, interval, repetitions, due = scheduler.review(ease, interval, repetitions, 5, NOW)
+    assert (interval, repetitions) == (scheduler.SECOND_INTERVAL_DAYS, 2)
+    assert due == NOW + datetime.timedelta(days=6)
+
+
+def test_later_intervals_grow_by_the_ease_factor():
+    ease, interval, repetitions, due = scheduler.review(2.5, 6, 2, 4, NOW)
+    assert interval == 15
+    assert repetitions == 3
+    assert ease == 2.5
+    assert due == NOW + datetime.timedelta(days=15)
+
+
+def test_ease_factor_follows_answer_quality():
+    assert scheduler.review(2.5, 0, 0, 5, NOW)[0] == 2.6
+    assert scheduler.review(2.5, 0, 0, 4, NOW)[0] == 2.5
+    assert scheduler.review(2.5, 0, 0, 3, NOW)[0] == 2.36
+    # 难度系数不低于下限
+    assert scheduler.review(scheduler.MIN_EASE, 0, 0, 0, NOW)[0] == scheduler.MIN_EASE
+
+
+def test_wrong_answer_restarts_and_comes_back_soon():
+    ease, interval, repetitions, due = scheduler.review(2.5, 15, 3, scheduler.QUALITY_TYPING_WRONG, NOW)
+    assert repetitions == 0
+    assert interval == scheduler.FIRST_INTERVAL_DAYS
+    assert due == NOW + scheduler.RELEARN_DELAY
+    assert ease < 2.5
+
+
+def test_almost_correct_counts_as_remembered():
+    _, interval, repetitions, _ = scheduler.review(2.5, 6, 2, scheduler.QUALITY_TYPING_ALMOST, NOW)
+    assert repetitions == 3
+    assert interval == 15
@@ -0,0 +1,71 @@
+import pytest
+import vocab_cache
+import spelling_index
+from vocab_cache import LevelVocabulary
+
+WORDS = ["apple", "apply", "ample", "maple", "banana", "bandana", "cat", "cart", "chart", "act", "at",
+         "Receive", "deceive", "believe", "a", "I", "elephant", "relevant", "apple"]
+
+
+def _vocabulary(table_name, words):
+    return LevelVocabulary.from_rows(table_name, [(word, "n.释义") for word in words])
+
+
+@pytest.fixture
+def vocabulary(monkeypatch):
+    levels = {"junior": _vocabulary("junior", WORDS), "high": _vocabulary("high", ["apples", "cast", "banana"])}
+    monkeypatch.setattr(vocab_cache, "_snapshot_levels", levels)
+    return levels
+
+
+def _brute_force(word, words, radius):
+    return sorted({(spelling_index.edit_distance(word, candidate), candidate)
+                   for candidate in {w.lower() for w in words}
+                   if spelling_index.edit_distance(word, candidate) <= radius})
+
+
+def test_edit_distance():
+    assert spelling_index.edit_distance("kitten", "sitting") == 3
+    assert spelling_index.edit_distance("", "abc") == 3
+    assert spelling_index.edit_distance("same", "same") == 0
+    assert spelling_index.edit_distance("abcdef", "a", limit=2) == 3
+
+
+def test_deletes():
+    assert spelling_index.deletes("abc", 1) == {"abc", "ab", "ac", "bc"}
+    assert "" in spelling_index.deletes("ab", 2)
+
+
+def test_typo_tolerance():
+    assert spelling_index.typo_tolerance(2) == 0
+    assert spelling_index.typo_tolerance(5) == 1
+    assert spelling_index.typo_tolerance(12) == spelling_index.MAX_TYPOS
+
+
+@pytest.mark.parametrize("query", ["appel", "aple", "bananna", "cta", "recieve", "elefant", "zzz", "a"])
+@pytest.mark.parametrize("radius", [1, 2])
+def test_search_matches_brute_force(query, radius):
+    index = spelling_index.TableSpellingIndex(_vocabulary("junior", WORDS))
+    assert sorted(index.search(query, radius)) == _brute_force(query, WORDS, radius)
+
+
+def test_index_deduplicates_and_lowercases():
+    index = spelling_index.TableSpellingIndex(_vocabulary("junior", WORDS))
+    assert len(index) == len({word.lower() for word in WORDS})
+    assert (0, "receive") in index.search("receive", 1)
+
+
+def test_nearest_merges_tables(vocabulary):
+    results = spelling_index.nearest("aple", limit=None)
+    assert results == [(1, "ample"), (1, "apple"), (1, "maple")]
+    assert spelling_index.nearest("banan", limit=None) == [(1, "banana")]
+    # 只在指定的表中查找
+    assert (1, "apples") not in spelling_index.nearest("apple", tables=["junior"], limit=None)
+    assert (1, "apples") in spelling_index.nearest("apple", limit=None)
+
+
+def test_nearest_limits_and_defaults(vocabulary):
+    assert spelling_index.nearest("") == []
+    assert spelling_index.nearest("apple", limit=1) == [(0, "apple")]
+    # 两个字母以内的单词不允许拼写错误
+    assert spelling_index.nearest("aa", limit=None) == []
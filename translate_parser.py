@@ -0,0 +1,55 @@
+import re
+
+# 释义中出现的词性标记，如 n. adj. vt.；前面是小写字母时不算（避免匹配单词内部）
+POS_MARKERS = ("abbr", "interj", "modal", "prep", "pron", "conj", "adj", "adv", "aux", "num",
+               "art", "det", "int", "vt", "vi", "pl", "ad", "n", "v", "a")
+POS_PATTERN = re.compile(r"(?<![a-z])(" + "|".join(POS_MARKERS) + r")\.")
+
+# 同一词性的不同写法，统一为前者：vt. vi. 都算动词，a. 即 adj.，ad. 即 adv.
+POS_ALIASES = {"vt": "v", "vi": "v", "a": "adj", "ad": "adv", "int": "interj"}
+# 统一写法后的全部词性
+POS_TAGS = tuple(dict.fromkeys(POS_ALIASES.get(marker, marker) for marker in POS_MARKERS))
+
+# 义项之间的分隔符
+SENSE_SEPARATOR_PATTERN = re.compile(r"[；;，,、]")
+
+# 方括号、圆括号等注释（如 [脊椎]、(美)、[过去式...]），建立义项时去掉
+ANNOTATION_PATTERN = re.compile(r"\[[^\]]*\]|\([^)]*\)|（[^）]*）|〔[^〕]*〕|【[^】]*】|<[^>]*>|〈[^〉]*〉")
+
+
+def split_pos(translate):
+    """按词性标记切分释义，返回 [(词性, 该词性下的释义文本)]，没有词性标记的部分词性为空字符串"""
+    if not translate:
+        return []
+    segments = []
+    position = 0
+    pos = ""
+    for match in POS_PATTERN.finditer(translate):
+        if match.start() > position:
+            segments.append((pos, translate[position:match.start()]))
+        pos = match.group(1)
+        position = match.end()
+    if position < len(translate):
+        segments.append((pos, translate[position:]))
+    return segments
+
+
+def split_senses(translate):
+    """把释义切分为 [(词性, 义项)]，义项已去掉注释和首尾空白"""
+    senses = []
+    for pos, segment in split_pos(translate):
+        for sense in SENSE_SEPARATOR_PATTERN.split(ANNOTATION_PATTERN.sub("", segment)):
+            sense = sense.strip()
+            if sense:
+                senses.append((pos, sense))
+    return senses
+
+
+def parts_of_speech(translate):
+    """释义中的词性（统一写法），按出现顺序去重，第一个为主要词性；没有词性标记时返回空列表"""
+    tags = []
+    for pos, _ in split_pos(translate):
+        pos = POS_ALIASES.get(pos, pos)
+        if pos and pos not in tags:
+            tags.append(pos)
+    return tags
@@ -0,0 +1,407 @@
+import os
+import hashlib
+import tempfile
+import threading
+import collections
+from urllib.parse import quote
+import requests
+from requests.adapters import HTTPAdapter
+
+# 音频缓存目录和大小上限
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "audio_cache")
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+DEFAULT_VOICE = "Amy"
+DEFAULT_FORMAT = "mp3"
+MIMETYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg"}
+
+# 上游请求的连接/读取超时（秒）、HTTP连接池大小，以及转发音频时每块的大小
+CONNECT_TIMEOUT = float(os.getenv("TTS_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("TTS_READ_TIMEOUT", "10"))
+HTTP_POOL_SIZE = int(os.getenv("TTS_HTTP_POOL_SIZE", "10"))
+CHUNK_SIZE = 16 * 1024
+
+# 等待其他请求合成同一段语音的最长时间（秒）
+WAIT_TIMEOUT = float(os.getenv("TTS_WAIT_TIMEOUT", "30"))
+
+
+class TTSError(Exception):
+    """语音合成失败"""
+
+
+class TTSProvider:
+    """语音合成服务接口，子类实现 fetch"""
+
+    name = "base"
+
+    def fetch(self, text, voice, audio_format):
+        """返回合成好的音频字节，失败时抛出 TTSError"""
+        raise NotImplementedError
+
+    def stream(self, text, voice, audio_format):
+        """逐块返回音频，默认一次性取回；支持流式下载的服务应覆盖此方法"""
+        yield self.fetch(text, voice, audio_format)
+
+
+class VoiceRSSProvider(TTSProvider):
+    """Voicerss 在线语音合成"""
+
+    name = "voicerss"
+    CODECS = {"mp3": "MP3", "wav": "WAV", "ogg": "OGG"}
+
+    def __init__(self, api_key, language="en-us"):
+        self.api_key = api_key
+        self.language = language
+        # 复用 HTTPS 连接，避免每次合成都重新握手
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE))
+        self.session.headers['User-Agent'] = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                                              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+    def _request(self, text, voice, audio_format, stream):
+        codec = self.CODECS.get(audio_format, "MP3")
+        url = (f"https://api.voicerss.org/?key={self.api_key}&hl={self.language}&v={quote(voice)}"
+               f"&c={codec}&f=16khz_16bit_stereo&src={quote(text)}")
+        try:
+            response = self.session.get(url, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=stream)
+        except requests.RequestException as e:
+            raise TTSError(f"请求语音合成服务失败: {e}")
+        if response.status_code != 200:
+            response.close()
+            raise TTSError(f"获取音频失败，状态码: {response.status_code}")
+        return response
+
+    @staticmethod
+    def _check(data):
+        # Voicerss 出错时也返回200，正文是以 ERROR 开头的文本
+        if data.startswith(b"ERROR"):
+            raise TTSError(f"获取音频失败: {data[:100].decode('utf-8', 'replace')}")
+
+    def fetch(self, text, voice, audio_format):
+        response = self._request(text, voice, audio_format, stream=False)
+        self._check(response.content)
+        return response.content
+
+    def stream(self, text, voice, audio_format):
+        response = self._request(text, voice, audio_format, stream=True)
+        try:
+            first = True
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if first:
+                    self._check(chunk)
+                    first = False
+                yield chunk
+        except requests.RequestException as e:
+            raise TTSError(f"读取音频失败: {e}")
+        finally:
+            response.close()
+
+
+class StubProvider(TTSProvider):
+    """本地占位实现，不访问网络，用于测试和离线环境"""
+
+    name = "stub"
+
+    def __init__(self):
+        self.calls = 0
+
+    def fetch(self, text, voice, audio_format):
+        self.calls += 1
+        return f"STUB-AUDIO|{voice}|{audio_format}|{text}".encode("utf-8")
+
+
+def cache_key(text, voice=DEFAULT_VOICE, audio_format=DEFAULT_FORMAT):
+    """按 (文本, 发音人, 格式) 计算内容地址"""
+    return hashlib.sha256(f"{text}\0{voice}\0{audio_format}".encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """以内容哈希为文件名的磁盘音频缓存，超过容量时按最近最少使用淘汰"""
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # 键 -> 文件大小，按最近使用时间从旧到新排列
+        self._entries = collections.OrderedDict()
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key, audio_format):
+        return os.path.join(self.directory, key[:2], f"{key}.{audio_format}")
+
+    def _scan(self):
+        """启动时按修改时间恢复 LRU 顺序"""
+        found = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith("."):
+                    # 未完成的临时文件
+                    os.unlink(os.path.join(root, name))
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                found.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(found):
+            self._entries[name] = size
+            self._total_bytes += size
+
+    def get(self, key, audio_format=DEFAULT_FORMAT):
+        """命中时返回文件路径并标记为最近使用，否则返回 None"""
+        name = f"{key}.{audio_format}"
+        path = self._path(key, audio_format)
+        with self._lock:
+            if name not in self._entries:
+                return None
+            if not os.path.exists(path):
+                self._total_bytes -= self._entries.pop(name)
+                return None
+            self._entries.move_to_end(name)
+        # 更新修改时间，重启后仍能恢复使用顺序
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def writer(self, key, audio_format=DEFAULT_FORMAT):
+        """分块写入一个缓存文件，commit 之前其他请求看不到它"""
+        return _CacheWriter(self, key, audio_format)
+
+    def put(self, key, data, audio_format=DEFAULT_FORMAT):
+        """原子地写入缓存（先写临时文件再重命名），返回文件路径"""
+        writer = self.writer(key, audio_format)
+        try:
+            writer.write(data)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def _add(self, name, size):
+        with self._lock:
+            if name in self._entries:
+                self._total_bytes -= self._entries.pop(name)
+            self._entries[name] = size
+            self._total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未使用的文件，直到总大小不超过上限（调用方持有锁）"""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            name, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            key, audio_format = name.rsplit(".", 1)
+            try:
+                os.unlink(self._path(key, audio_format))
+            except OSError:
+                pass
+
+    def stats(self):
+        """缓存文件数和总大小"""
+        with self._lock:
+            return {"files": len(self._entries), "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+
+class _CacheWriter:
+    """写入临时文件，提交时重命名为正式的缓存文件"""
+
+    def __init__(self, cache, key, audio_format):
+        self.cache = cache
+        self.name = f"{key}.{audio_format}"
+        self.path = cache._path(key, audio_format)
+        directory = os.path.dirname(self.path)
+        os.makedirs(directory, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(prefix=".", dir=directory)
+        self.file = os.fdopen(fd, "wb")
+        self.size = 0
+
+    def write(self, data):
+        self.file.write(data)
+        self.size += len(data)
+
+    def commit(self):
+        try:
+            self.file.close()
+            os.replace(self.temp_path, self.path)
+        except Exception:
+            self.abort()
+            raise
+        self.cache._add(self.name, self.size)
+        return self.path
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+
+def create_provider(name=None):
+    """根据名称（或环境变量 TTS_PROVIDER）创建语音合成服务"""
+    name = (name or os.getenv("TTS_PROVIDER", "voicerss")).strip().lower()
+    if name == "stub":
+        return StubProvider()
+    # 示例密钥，实际使用时请在 .env 中设置 TTS_API_KEY
+    return VoiceRSSProvider(os.getenv("TTS_API_KEY", "c6c9f5b5c8f34d7b8e5a3c7d9b8a7c5d"))
+
+
+_cache = None
+_provider = None
+_init_lock = threading.Lock()
+
+
+def get_cache():
+    """全局音频缓存，首次使用时按环境变量创建"""
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = AudioCache(
+                    os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR),
+                    int(os.getenv("TTS_CACHE_MAX_BYTES", str(DEFAULT_MAX_BYTES)))
+                )
+    return _cache
+
+
+def get_provider():
+    """全局语音合成服务"""
+    global _provider
+    if _provider is None:
+        with _init_lock:
+            if _provider is None:
+                _provider = create_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """替换语音合成服务（测试时可换成 StubProvider）"""
+    global _provider
+    _provider = provider
+
+
+class _Flight:
+    """一次正在进行的上游合成，其他请求同一语音的线程在 done 上等待"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        # 开始传输前就失败时的错误信息，等待者直接报告同样的错误
+        self.error = None
+
+
+# 缓存键 -> 正在进行的合成，同一段语音同时只向上游请求一次
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def _land(key, flight):
+    with _flights_lock:
+        if _flights.get(key) is flight:
+            del _flights[key]
+    flight.done.set()
+
+
+class AudioStream:
+    """边从上游读取音频块边返回给调用方，同时写入缓存
+
+    读完后提交缓存文件；中途关闭或出错时丢弃临时文件。两种情况都会唤醒等待同一语音的请求。
+    """
+
+    def __init__(self, key, flight, first, chunks, writer):
+        self.key = key
+        self.path = None
+        self._flight = flight
+        self._pending = first
+        self._chunks = chunks
+        self._writer = writer
+        self._finished = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._finished:
+            raise StopIteration
+        try:
+            if self._pending is not None:
+                chunk, self._pending = self._pending, None
+            else:
+                chunk = next(self._chunks)
+            self._writer.write(chunk)
+        except StopIteration:
+            self.path = self._writer.commit()
+            self._finish()
+            raise
+        except Exception:
+            self.close()
+            raise
+        return chunk
+
+    def _finish(self):
+        self._finished = True
+        self._chunks.close()
+        _land(self.key, self._flight)
+
+    def close(self):
+        """结束传输；未读完时丢弃已写入的部分"""
+        if not self._finished:
+            self._writer.abort()
+            self._finish()
+
+
+def _lead(key, flight, text, voice, audio_format):
+    """作为第一个请求向上游取音频，先读到第一块再返回，这样开始传输前的错误可以直接报告"""
+    chunks = None
+    try:
+        chunks = get_provider().stream(text, voice, audio_format)
+        first = next(chunks, b"")
+        if not first:
+            raise TTSError("语音合成服务返回了空的音频")
+        writer = get_cache().writer(key, audio_format)
+    except Exception as e:
+        if chunks is not None:
+            chunks.close()
+        flight.error = str(e)
+        _land(key, flight)
+        raise
+    return AudioStream(key, flight, first, chunks, writer)
+
+
+def open_audio(text, voice=DEFAULT_VOICE, audio_format=DEFAULT_FORMAT):
+    """返回 (缓存键, 文件路径, AudioStream)
+
+    缓存命中时返回文件路径，流为 None；未命中时本线程负责向上游请求，返回一个边读边缓存的流，路径为 None。
+    如果另一个线程正在合成同一段语音，则等它完成后从缓存读取，不会重复请求上游。
+    """
+    key = cache_key(text, voice, audio_format)
+    cache = get_cache()
+    # 正在合成的请求中途被客户端断开时不会写入缓存，等待者重新争取合成
+    for _ in range(3):
+        path = cache.get(key, audio_format)
+        if path is not None:
+            return key, path, None
+        with _flights_lock:
+            flight = _flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _flights[key] = _Flight()
+        if leader:
+            return key, None, _lead(key, flight, text, voice, audio_format)
+        if not flight.done.wait(WAIT_TIMEOUT):
+            raise TTSError("等待语音合成超时")
+        if flight.error is not None:
+            raise TTSError(flight.error)
+    raise TTSError("语音合成没有完成")
+
+
+def get_audio(text, voice=DEFAULT_VOICE, audio_format=DEFAULT_FORMAT):
+    """返回 (缓存键, 音频文件路径)，未命中时调用语音合成服务并写入缓存"""
+    key, path, stream = open_audio(text, voice, audio_format)
+    if stream is not None:
+        try:
+            for _ in stream:
+                pass
+        finally:
+            stream.close()
+        path = stream.path
+    return key, path
@@ -0,0 +1,196 @@
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import init_db
+import vocab_cache
+import tts_cache
+from init_db import VOCABULARY_TABLES
+from deck_sampler import ShuffledDeck
+
+logger = logging.getLogger(__name__)
+
+# 预生成进度文件，记录每个表下次开始的行号
+DEFAULT_PROGRESS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tts_warm_progress.json")
+
+
+class RateLimiter:
+    """令牌桶限速器，多个线程共享，每秒最多放行 rate 次"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取一个令牌，不够时等待"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _load_progress(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_progress(path, progress):
+    """原子地保存进度"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def synthesize(word, limiter=None, voice=tts_cache.DEFAULT_VOICE, audio_format=tts_cache.DEFAULT_FORMAT):
+    """确保单词的音频在缓存中，返回是否调用了语音合成服务"""
+    key = tts_cache.cache_key(word, voice, audio_format)
+    if tts_cache.get_cache().get(key, audio_format) is not None:
+        return False
+    if limiter is not None:
+        limiter.acquire()
+    tts_cache.get_audio(word, voice, audio_format)
+    return True
+
+
+def warm_level(table_name, workers=4, rate=5.0, limit=None, progress_file=DEFAULT_PROGRESS_FILE):
+    """为一个级别的所有单词预生成音频，可中断后从上次的位置继续
+
+    按 workers * 4 个单词一组并发合成，每组完成后保存进度。
+    """
+    vocabulary = vocab_cache.get_level(table_name)
+    progress = _load_progress(progress_file)
+    start = progress.get(table_name, 0)
+    end = len(vocabulary) if limit is None else min(len(vocabulary), start + limit)
+    limiter = RateLimiter(rate)
+    chunk_size = max(1, workers * 4)
+    stats = {"table": table_name, "synthesized": 0, "cached": 0, "failed": 0}
+
+    logger.info("开始预生成 %s 的音频：第 %s 到 %s 个单词，并发 %s，限速 %s 次/秒", table_name, start, end, workers, rate)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for chunk_start in range(start, end, chunk_size):
+            words = [vocabulary.word(row) for row in range(chunk_start, min(end, chunk_start + chunk_size))]
+            futures = [executor.submit(synthesize, word, limiter) for word in words]
+            for word, future in zip(words, futures):
+                try:
+                    stats["synthesized" if future.result() else "cached"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.warning("预生成 %s 的音频失败: %s", word, e)
+            progress[table_name] = chunk_start + len(words)
+            _save_progress(progress_file, progress)
+
+    elapsed = time.perf_counter() - started
+    logger.info("%s 预生成完成：新合成 %s，已缓存 %s，失败 %s，耗时 %.1f 秒",
+                table_name, stats["synthesized"], stats["cached"], stats["failed"], elapsed)
+    return stats
+
+
+# 在线预热用户接下来要看到的单词：有界线程池 + 限速，同一个单词只提交一次
+_prefetch_executor = None
+_prefetch_limiter = None
+_prefetch_inflight = set()
+_prefetch_lock = threading.Lock()
+
+
+def _prefetch_one(word):
+    try:
+        synthesize(word, _prefetch_limiter)
+    except Exception as e:
+        logger.warning("预热 %s 的音频失败: %s", word, e)
+    finally:
+        with _prefetch_lock:
+            _prefetch_inflight.discard(word)
+
+
+def warm_words(words):
+    """在后台为给定的单词预生成音频，返回实际提交的数量"""
+    global _prefetch_executor, _prefetch_limiter
+    submitted = 0
+    with _prefetch_lock:
+        if _prefetch_executor is None:
+            _prefetch_executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv("TTS_PREFETCH_WORKERS", "2")), thread_name_prefix="tts-prefetch")
+            _prefetch_limiter = RateLimiter(float(os.getenv("TTS_PREFETCH_RATE", "5")))
+        for word in words:
+            if word in _prefetch_inflight:
+                continue
+            _prefetch_inflight.add(word)
+            _prefetch_executor.submit(_prefetch_one, word)
+            submitted += 1
+    return submitted
+
+
+def warm_upcoming(deck_state, table_name, count):
+    """在后台为牌堆中接下来的 count 个单词预生成音频，不移动游标"""
+    if count <= 0 or not deck_state or table_name not in deck_state:
+        return 0
+    vocabulary = vocab_cache.get_level(table_name)
+    deck = ShuffledDeck.from_state(deck_state[table_name], len(vocabulary))
+    return warm_words([vocabulary.word(row) for row in deck.peek(count)])
+
+
+def _resolve_tables(names):
+    """把命令行中的表名或中文级别名转换为表名"""
+    if not names or "all" in names:
+        return list(VOCABULARY_TABLES.keys())
+    tables = []
+    for name in names:
+        for table_name, level_name in VOCABULARY_TABLES.items():
+            if name in (table_name, level_name):
+                tables.append(table_name)
+                break
+        else:
+            raise SystemExit(f"未知的级别: {name}")
+    return tables
+
+
+def main():
+    """命令行入口：按级别预生成单词音频"""
+    parser = argparse.ArgumentParser(description="预生成单词发音音频")
+    parser.add_argument("levels", nargs="*", help="表名或中文级别名，默认全部")
+    parser.add_argument("--workers", type=int, default=4, help="并发数")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒最多调用语音合成服务的次数")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多处理的单词数")
+    parser.add_argument("--progress-file", default=DEFAULT_PROGRESS_FILE, help="进度文件")
+    parser.add_argument("--reset", action="store_true", help="忽略已保存的进度，从头开始")
+    parser.add_argument("--snapshot", default=os.getenv("VOCAB_SNAPSHOT"), help="从词汇快照读取单词，不连接MySQL")
+    args = parser.parse_args()
+    # 进度和错误都通过 logging 输出，命令行下直接显示
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.snapshot:
+        import vocab_snapshot
+        vocab_snapshot.activate(args.snapshot)
+    elif not init_db.init_database():
+        raise SystemExit("无法连接数据库，可以使用 --snapshot 指定词汇快照")
+
+    tables = _resolve_tables(args.levels)
+    if args.reset:
+        progress = _load_progress(args.progress_file)
+        for table_name in tables:
+            progress.pop(table_name, None)
+        _save_progress(args.progress_file, progress)
+
+    for table_name in tables:
+        warm_level(table_name, args.workers, args.rate, args.limit, args.progress_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import os
+import array
+import random
+import logging
+import threading
+import time
+from sqlalchemy import text
+import init_db
+from init_db import VOCABULARY_TABLES
+
+logger = logging.getLogger(__name__)
+
+# 每隔多少秒检查一次词汇表版本（导入脚本在其他进程中替换表后重新加载），0 表示不检查
+VERSION_CHECK_INTERVAL = float(os.getenv("VOCAB_VERSION_CHECK_INTERVAL", "10"))
+
+
+class LevelVocabulary:
+    """单个级别的紧凑词汇数组：UTF-8字符串池 + 偏移数组"""
+
+    __slots__ = ("table_name", "level", "_arena", "_offsets")
+
+    def __init__(self, table_name, arena, offsets):
+        self.table_name = table_name
+        self.level = VOCABULARY_TABLES.get(table_name, "未知")
+        # 第i个单词位于 offsets[2i]:offsets[2i+1]，释义位于 offsets[2i+1]:offsets[2i+2]
+        self._arena = arena
+        self._offsets = offsets
+
+    @classmethod
+    def from_rows(cls, table_name, rows):
+        """根据 (word, translate) 行构建紧凑数组"""
+        buffer = bytearray()
+        offsets = array.array("I", [0])
+        for word, meaning in rows:
+            if not word:
+                continue
+            buffer += word.encode("utf-8")
+            offsets.append(len(buffer))
+            buffer += (meaning or "").encode("utf-8")
+            offsets.append(len(buffer))
+        return cls(table_name, bytes(buffer), offsets)
+
+    def __len__(self):
+        return (len(self._offsets) - 1) // 2
+
+    def _string(self, slot):
+        start, end = self._offsets[slot], self._offsets[slot + 1]
+        return str(self._arena[start:end], "utf-8")
+
+    def word(self, index):
+        """获取第index个单词"""
+        return self._string(2 * index)
+
+    def meaning(self, index):
+        """获取第index个单词的释义"""
+        return self._string(2 * index + 1)
+
+    def meaning_size(self, index):
+        """第index个单词释义的UTF-8字节数（无需解码）"""
+        return self._offsets[2 * index + 2] - self._offsets[2 * index + 1]
+
+    def get(self, index):
+        """以 WordModel 的字典格式返回第index个单词"""
+        return {
+            "word": self.word(index),
+            "meaning": self.meaning(index),
+            "level": self.level,
+            "source_table": self.table_name
+        }
+
+    def random_index(self):
+        """O(1) 随机选取一个下标"""
+        return random.randrange(len(self))
+
+    def buffers(self):
+        """返回底层的字符串池和偏移数组（供快照写入使用）"""
+        return self._arena, self._offsets
+
+
+# 已加载的级别，键是表名
+_levels = {}
+# 已加载的级别对应的版本号（见 init_db.CREATE_VOCABULARY_VERSIONS）
+_versions = {}
+_lock = threading.Lock()
+# 缓存的代数：任何一个级别被加载、替换或移除时加一，依赖全部级别的索引据此判断是否需要重建
+_generation = 0
+# 表被重新加载后调用的函数，参数是表名（用于在后台重建依赖该表的索引）
+_reload_listeners = []
+# 预编译快照中的级别，安装后直接使用，不再访问数据库
+_snapshot_levels = None
+
+
+def _load_level(table_name):
+    """从数据库读取一个词汇表"""
+    query = text(f"SELECT word, translate FROM {table_name}")
+    rows = init_db.session.execute(query).fetchall()
+    level = LevelVocabulary.from_rows(table_name, rows)
+    logger.info("已缓存词汇表: %s，包含 %s 个单词", table_name, len(level))
+    return level
+
+
+def table_versions():
+    """数据库中各词汇表的版本号 {表名: 版本号}；版本表还不存在时返回空字典"""
+    try:
+        rows = init_db.session.execute(text("SELECT table_name, version FROM vocabulary_versions")).fetchall()
+    except Exception as e:
+        # 查询失败不影响当前事务（MySQL 和 SQLite 都不会因此中止事务）
+        logger.debug("读取词汇表版本时出错: %s", e)
+        return {}
+    return {table_name: version for table_name, version in rows}
+
+
+def install_snapshot(levels):
+    """使用预编译快照中的级别作为词汇来源"""
+    global _snapshot_levels, _generation
+    with _lock:
+        _snapshot_levels = levels
+        _levels.clear()
+        _generation += 1
+
+def available_tables():
+    """可用的词汇表名列表：快照模式下为快照中的表"""
+    if _snapshot_levels is not None:
+        return list(_snapshot_levels.keys())
+    return list(VOCABULARY_TABLES.keys())
+
+def generation():
+    """当前缓存的代数，没有变化说明所有级别仍是同一批 LevelVocabulary"""
+    return _generation
+
+def get_level(table_name):
+    """获取某个表的缓存，首次使用时加载"""
+    global _generation
+    if _snapshot_levels is not None:
+        level = _snapshot_levels.get(table_name)
+        if level is None:
+            raise KeyError(f"快照中没有词汇表: {table_name}")
+        return level
+    level = _levels.get(table_name)
+    if level is not None:
+        return level
+    if table_name not in VOCABULARY_TABLES:
+        raise KeyError(f"未知的词汇表: {table_name}")
+    with _lock:
+        level = _levels.get(table_name)
+        if level is None:
+            # 先读版本号再读数据：读取期间表被替换时，下次检查会再加载一次
+            _versions[table_name] = table_versions().get(table_name, 0)
+            level = _load_level(table_name)
+            _levels[table_name] = level
+            _generation += 1
+    return level
+
+
+def load_all():
+    """启动时预加载所有词汇表"""
+    for table_name in VOCABULARY_TABLES.keys():
+        try:
+            get_level(table_name)
+        except Exception as e:
+            logger.error("缓存词汇表 %s 时出错: %s", table_name, e)
+
+
+def invalidate(table_name=None):
+    """使缓存失效，下次使用时重新加载；不指定表名则清空全部"""
+    global _generation
+    with _lock:
+        _generation += 1
+        if table_name is None:
+            _levels.clear()
+            _versions.clear()
+        else:
+            _levels.pop(table_name, None)
+            _versions.pop(table_name, None)
+
+
+def reload(table_name=None):
+    """立即重新加载缓存"""
+    invalidate(table_name)
+    if table_name is None:
+        load_all()
+    else:
+        get_level(table_name)
+
+
+def cached_tables():
+    """返回已加载的表及其单词数"""
+    levels = _snapshot_levels if _snapshot_levels is not None else _levels
+    return {name: len(level) for name, level in levels.items()}
+
+
+def add_reload_listener(listener):
+    """注册表被 refresh() 重新加载后调用的函数 listener(table_name)"""
+    _reload_listeners.append(listener)
+
+
+def refresh():
+    """重新加载版本号已变化（被其他进程重新导入）的表，返回这些表名
+
+    新的词汇加载完成后才替换旧的，加载期间的请求继续使用旧词汇；替换后依次调用重新加载监听函数。
+    快照模式下词汇不会变化，不做任何操作。
+    """
+    global _generation
+    if _snapshot_levels is not None or init_db.session is None:
+        return []
+    versions = table_versions()
+    changed = [table_name for table_name, version in versions.items()
+               if table_name in _levels and _versions.get(table_name) != version]
+    for table_name in changed:
+        level = _load_level(table_name)
+        with _lock:
+            _levels[table_name] = level
+            _versions[table_name] = versions[table_name]
+            _generation += 1
+        logger.info("词汇表 %s 已被重新导入（版本 %s），已重新加载", table_name, versions[table_name])
+        for listener in _reload_listeners:
+            try:
+                listener(table_name)
+            except Exception as e:
+                logger.error("重新加载 %s 后更新索引时出错: %s", table_name, e)
+    return changed
+
+
+def _watch(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            refresh()
+        except Exception as e:
+            logger.error("检查词汇表版本时出错: %s", e)
+        finally:
+            if init_db.session is not None:
+                init_db.session.remove()
+
+
+_watcher = None
+
+
+def start_watcher(interval=VERSION_CHECK_INTERVAL):
+    """启动后台线程，每 interval 秒检查一次词汇表版本；interval 为 0 或快照模式下不启动"""
+    global _watcher
+    if interval <= 0 or _snapshot_levels is not None or _watcher is not None:
+        return None
+    _watcher = threading.Thread(target=_watch, args=(interval,), name="vocab-watcher", daemon=True)
+    _watcher.start()
+    logger.info("每 %s 秒检查一次词汇表是否被重新导入", interval)
+    return _watcher
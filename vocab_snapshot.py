@@ -0,0 +1,149 @@
+import os
+import sys
+import mmap
+import array
+import struct
+import logging
+import argparse
+import init_db
+import vocab_cache
+from init_db import VOCABULARY_TABLES
+from vocab_cache import LevelVocabulary
+
+logger = logging.getLogger(__name__)
+
+# 快照文件格式（小端）：
+#   文件头   magic(4) version(u32) 级别数(u32)
+#   目录项   表名(32字节，UTF-8补零) 单词数(u32) 偏移数组位置(u64) 字符串池位置(u64) 字符串池长度(u64)
+#   数据区   每个级别的 u32 偏移数组和 UTF-8 字符串池，均按8字节对齐
+MAGIC = b"EPVS"
+VERSION = 1
+HEADER = struct.Struct("<4sII")
+ENTRY = struct.Struct("<32sIQQQ")
+ALIGNMENT = 8
+
+# 默认快照位置
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "vocabulary.snapshot")
+
+
+def _align(position):
+    return (position + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def write_snapshot(levels, output_path):
+    """把若干 LevelVocabulary 写成快照文件（先写临时文件再原子替换）"""
+    if sys.byteorder != "little" or array.array("I").itemsize != 4:
+        raise RuntimeError("快照格式要求小端和4字节的无符号整数")
+
+    entries = []
+    position = _align(HEADER.size + ENTRY.size * len(levels))
+    for table_name, level in levels.items():
+        arena, offsets = level.buffers()
+        offsets_position = position
+        arena_position = _align(offsets_position + len(offsets) * offsets.itemsize)
+        position = _align(arena_position + len(arena))
+        entries.append((table_name, level, offsets_position, arena_position))
+
+    temp_path = f"{output_path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+        for table_name, level, offsets_position, arena_position in entries:
+            arena, _ = level.buffers()
+            f.write(ENTRY.pack(table_name.encode("utf-8"), len(level), offsets_position, arena_position, len(arena)))
+        for table_name, level, offsets_position, arena_position in entries:
+            arena, offsets = level.buffers()
+            f.seek(offsets_position)
+            f.write(offsets.tobytes())
+            f.seek(arena_position)
+            f.write(arena)
+        f.truncate(position)
+    os.replace(temp_path, output_path)
+
+
+def build_snapshot(output_path=DEFAULT_PATH, sql_files=None):
+    """把导出的SQL文件编译为快照，返回 {表名: 单词数}"""
+    # 延迟导入：只有构建快照时才需要解析导出文件
+    import import_sql
+
+    rows_by_table = {}
+    for file_path in sql_files or import_sql.find_sql_files():
+        for table_name, word, translate in import_sql.parse_sql_file(file_path):
+            rows_by_table.setdefault(table_name, []).append((word, translate))
+
+    levels = {}
+    for table_name in VOCABULARY_TABLES.keys():
+        if table_name in rows_by_table:
+            levels[table_name] = LevelVocabulary.from_rows(table_name, rows_by_table[table_name])
+    write_snapshot(levels, output_path)
+    return {table_name: len(level) for table_name, level in levels.items()}
+
+
+class VocabularySnapshot:
+    """内存映射的只读词汇快照"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, version, count = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"不是有效的词汇快照: {path}")
+
+        self.levels = {}
+        for i in range(count):
+            raw_name, rows, offsets_position, arena_position, arena_size = ENTRY.unpack_from(view, HEADER.size + i * ENTRY.size)
+            table_name = raw_name.rstrip(b"\0").decode("utf-8")
+            offsets = view[offsets_position:offsets_position + 4 * (2 * rows + 1)].cast("I")
+            arena = view[arena_position:arena_position + arena_size]
+            self.levels[table_name] = LevelVocabulary(table_name, arena, offsets)
+
+    def close(self):
+        """释放内存映射"""
+        self.levels = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # 仍有单词视图在使用时由垃圾回收负责释放
+            pass
+        self._file.close()
+
+
+# 当前生效的快照
+snapshot = None
+
+
+def activate(path=DEFAULT_PATH):
+    """加载快照并让 WordModel 的词汇读取全部走快照"""
+    global snapshot
+    snapshot = VocabularySnapshot(path)
+    vocab_cache.install_snapshot(snapshot.levels)
+    init_db.use_in_memory = True
+    total = sum(len(level) for level in snapshot.levels.values())
+    logger.info("已加载词汇快照: %s，%s 个级别，共 %s 个单词", path, len(snapshot.levels), total)
+    return snapshot
+
+
+def main():
+    """命令行入口：build 编译快照，info 查看快照内容"""
+    parser = argparse.ArgumentParser(description="预编译词汇快照")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("path", nargs="?", default=os.getenv("VOCAB_SNAPSHOT", DEFAULT_PATH))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = build_snapshot(args.path)
+        for table_name, count in counts.items():
+            print(f"{table_name}（{VOCABULARY_TABLES[table_name]}）: {count} 个单词")
+        print(f"已生成词汇快照: {args.path}，{os.path.getsize(args.path)} 字节")
+    else:
+        loaded = VocabularySnapshot(args.path)
+        for table_name, level in loaded.levels.items():
+            print(f"{table_name}（{level.level}）: {len(level)} 个单词")
+        loaded.close()
+
+
+if __name__ == "__main__":
+    main()
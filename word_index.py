@@ -0,0 +1,77 @@
+import bisect
+import logging
+import threading
+import vocab_cache
+
+logger = logging.getLogger(__name__)
+
+
+class WordIndex:
+    """所有级别的单词哈希索引：小写单词 -> [(表名, 行号)]，另有有序键列表用于前缀匹配"""
+
+    def __init__(self, vocabularies, generation):
+        # 建索引时词汇缓存的代数，缓存变化（任何一个表被加载或替换）后需要重建
+        self.generation = generation
+        entries = {}
+        for table_name, vocabulary in vocabularies.items():
+            for row in range(len(vocabulary)):
+                locations = entries.setdefault(vocabulary.word(row).lower(), [])
+                # 同一个表里重复收录的单词只保留第一条
+                if not locations or locations[-1][0] != table_name:
+                    locations.append((table_name, row))
+        self.entries = {key: tuple(locations) for key, locations in entries.items()}
+        self.sorted_keys = sorted(self.entries)
+
+    def lookup(self, word_text):
+        """不区分大小写地查找单词出现的所有位置"""
+        return self.entries.get(word_text.lower(), ())
+
+    def prefix(self, prefix, limit=10):
+        """返回以 prefix 开头的小写单词，按字母顺序"""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.sorted_keys, prefix)
+        keys = []
+        for key in self.sorted_keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """获取全局单词索引，每一代词汇缓存只建立一次，查找时只比较代数"""
+    global _index
+    index = _index
+    if index is not None and index.generation == vocab_cache.generation():
+        return index
+    with _lock:
+        if _index is None or _index.generation != vocab_cache.generation():
+            vocabularies = {table_name: vocab_cache.get_level(table_name)
+                            for table_name in vocab_cache.available_tables()}
+            # 取完词汇（可能触发加载）之后再记录代数
+            _index = WordIndex(vocabularies, vocab_cache.generation())
+            logger.info("已建立单词索引，共 %s 个不同的单词", len(_index.entries))
+        return _index
+
+
+def lookup(word_text, tables=None):
+    """查找单词在各级别中的位置，可以只保留指定的表"""
+    locations = get_index().lookup(word_text)
+    if tables is not None:
+        locations = tuple(location for location in locations if location[0] in tables)
+    return locations
+
+
+def suggest(prefix, limit=10):
+    """前缀补全，返回小写单词列表"""
+    if not prefix:
+        return []
+    return get_index().prefix(prefix, limit)
+
+
+# 词汇表被其他进程重新导入后，由 vocab_cache 的后台检查线程立即重建
+vocab_cache.add_reload_listener(lambda table_name: get_index())